@@ -0,0 +1,92 @@
+# Priority-aware admission control for the Saudi Arabian CTAS Triage System
+#
+# All workers draw from one token bucket, kept in an anonymous shared memory
+# map created before gunicorn forks (preload_app). The bucket refills at
+# `rate` requests per second up to `burst`. Each priority may only take a
+# token while at least its reserve would remain, so as a surge drains the
+# bucket, static pages are refused first, then the public self-assessment,
+# and the last part of the bucket is left to clinician triage. A refused
+# request is answered at once with 503 and Retry-After instead of waiting in
+# the listen backlog for a sync worker.
+
+import math
+import mmap
+import multiprocessing
+import struct
+import time
+
+# Most important first
+PRIORITIES = ('clinical', 'public', 'static')
+# tokens, last refill (time.monotonic, which is system-wide on Linux)
+BUCKET = struct.Struct('<dd')
+# admitted and rejected per priority
+COUNTER = struct.Struct('<Q')
+# A worker killed while holding the lock must not stall the others; on a
+# timeout the request is admitted
+LOCK_TIMEOUT = 0.01
+
+class AdmissionController:
+    """Token bucket shared across forked workers, with a reserve per priority."""
+
+    def __init__(self, rate, burst=None, reserves=None):
+        """`reserves` maps a priority to the fraction of `burst` it must leave for higher priorities."""
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, 2 * self.rate))
+        reserves = reserves or {}
+        self.reserves = {priority: reserves.get(priority, 0.0) * self.burst for priority in PRIORITIES}
+        self._counters = {
+            priority: (BUCKET.size + 2 * i * COUNTER.size, BUCKET.size + (2 * i + 1) * COUNTER.size)
+            for i, priority in enumerate(PRIORITIES)
+        }
+        self._buffer = mmap.mmap(-1, BUCKET.size + 2 * len(PRIORITIES) * COUNTER.size)
+        BUCKET.pack_into(self._buffer, 0, self.burst, time.monotonic())
+        self._lock = multiprocessing.Lock()
+
+    def _count(self, offset):
+        COUNTER.pack_into(self._buffer, offset, COUNTER.unpack_from(self._buffer, offset)[0] + 1)
+
+    def admit(self, priority):
+        """Take a token for a request of `priority`.
+
+        Returns 0 when the request is admitted, otherwise the seconds until a
+        token is available to that priority (for Retry-After).
+        """
+        reserve = self.reserves[priority]
+        admitted, rejected = self._counters[priority]
+        if not self._lock.acquire(timeout=LOCK_TIMEOUT):
+            return 0.0
+        try:
+            tokens, refilled_at = BUCKET.unpack_from(self._buffer, 0)
+            now = time.monotonic()
+            tokens = min(self.burst, tokens + (now - refilled_at) * self.rate)
+            if tokens - 1 >= reserve:
+                BUCKET.pack_into(self._buffer, 0, tokens - 1, now)
+                self._count(admitted)
+                return 0.0
+            BUCKET.pack_into(self._buffer, 0, tokens, now)
+            self._count(rejected)
+            return (reserve + 1 - tokens) / self.rate
+        finally:
+            self._lock.release()
+
+    def retry_after(self, wait):
+        """Retry-After value (whole seconds, at least 1) for a wait from admit()."""
+        return max(1, math.ceil(wait))
+
+    def stats(self):
+        """Bucket level and admitted/rejected counts for all workers since startup."""
+        tokens, refilled_at = BUCKET.unpack_from(self._buffer, 0)
+        tokens = min(self.burst, tokens + (time.monotonic() - refilled_at) * self.rate)
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'tokens': round(tokens, 2),
+            'priorities': {
+                priority: {
+                    'reserve': round(self.reserves[priority], 2),
+                    'admitted': COUNTER.unpack_from(self._buffer, admitted)[0],
+                    'rejected': COUNTER.unpack_from(self._buffer, rejected)[0],
+                }
+                for priority, (admitted, rejected) in self._counters.items()
+            },
+        }
@@ -1,14 +1,38 @@
 # Import necessary libraries
 # Added render_template
-from flask import Flask, render_template, request, jsonify, Response, session
+from flask import Flask, g, render_template, request, jsonify, redirect, Response, stream_with_context, send_from_directory, url_for
+from flask.sessions import SessionInterface
 import csv
+import inspect
 import io
-from datetime import datetime
+import json
+import marshal
+import mimetypes
+from bisect import bisect_right
+from datetime import datetime, timedelta
 import os
 import secrets
+import time
+import numpy as np
 import logging
-from logging.handlers import RotatingFileHandler
+from flask.logging import default_handler
 from dotenv import load_dotenv
+try:
+    import msgpack
+except ImportError:  # optional: /api/v2 then speaks JSON only
+    msgpack = None
+from assessment_store import iter_assessments, open_store
+from triage_queue import TriageQueue
+from reassessment_scheduler import ReassessmentScheduler
+from live_board import BoardEvents, format_sse
+from triage_cache import SharedTriageCache
+from admission import AdmissionController
+import triage_table
+from page_shells import CACHE_CONTROL as PAGE_CACHE_CONTROL, PageShellCache
+from static_assets import IMMUTABLE_CACHE_CONTROL, load_manifest, pick_variant
+import metrics
+from request_profiler import RequestProfiler
+from structured_logging import JsonLinesFormatter, QueueLogHandler, SharedRotatingFileHandler
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,44 +42,178 @@ app = Flask(__name__)
 
 # Production configuration using environment variables
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
-app.config['SESSION_COOKIE_SECURE'] = os.environ.get('SESSION_COOKIE_SECURE', 'True').lower() == 'true'
-app.config['SESSION_COOKIE_HTTPONLY'] = os.environ.get('SESSION_COOKIE_HTTPONLY', 'True').lower() == 'true'
-app.config['SESSION_COOKIE_SAMESITE'] = os.environ.get('SESSION_COOKIE_SAMESITE', 'Lax')
-app.config['PERMANENT_SESSION_LIFETIME'] = int(os.environ.get('PERMANENT_SESSION_LIFETIME', '3600'))
+
+class NoSessionInterface(SessionInterface):
+    """The app keeps no session state: the language comes from the URL or the
+    request. Skipping the signed cookie saves its HMAC check on every request
+    and keeps responses free of Set-Cookie, so proxies may cache the pages."""
+
+    def open_session(self, app, request):
+        return self.make_null_session(app)
+
+    def save_session(self, app, session, response):
+        pass
+
+app.session_interface = NoSessionInterface()
 
 # Application settings
 DEFAULT_LANGUAGE = os.environ.get('DEFAULT_LANGUAGE', 'ar')
 SUPPORTED_LANGUAGES = os.environ.get('SUPPORTED_LANGUAGES', 'ar,en').split(',')
-
-# Setup logging for production
+BATCH_MAX_RECORDS = int(os.environ.get('BATCH_MAX_RECORDS', '100000'))
+INCIDENT_MAX_RECORDS = int(os.environ.get('INCIDENT_MAX_RECORDS', '1000'))
+FACILITY_ID = os.environ.get('FACILITY_ID', '')
+
+# Assessment history (SQLite, written in batches by a background thread)
+ASSESSMENT_STORE_ENABLED = os.environ.get('ASSESSMENT_STORE_ENABLED', 'True').lower() == 'true'
+ASSESSMENT_DB = os.environ.get('ASSESSMENT_DB', 'data/assessments.db')
+EXPORT_CHUNK_ROWS = 500  # rows buffered per chunk of a streamed CSV export
+# Bearer token for /export_csv; the export is disabled while it is unset
+EXPORT_TOKEN = os.environ.get('EXPORT_TOKEN', '')
+
+# Waiting-room queue, shared by all workers through SQLite
+QUEUE_DB = os.environ.get('QUEUE_DB', ASSESSMENT_DB)
+triage_queue = TriageQueue(QUEUE_DB)
+
+# Live board event log, shared by all workers (see live_board.py)
+BOARD_EVENTS_ENABLED = os.environ.get('BOARD_EVENTS_ENABLED', 'True').lower() == 'true'
+BOARD_RETRY_MS = int(os.environ.get('BOARD_RETRY_MS', '2000'))
+board_events = BoardEvents(
+    QUEUE_DB, retention=float(os.environ.get('BOARD_EVENT_RETENTION_HOURS', '24')) * 3600
+) if BOARD_EVENTS_ENABLED else None
+REASSESSMENT_SCHEDULER_ENABLED = os.environ.get('REASSESSMENT_SCHEDULER_ENABLED', 'True').lower() == 'true'
+assessment_store = open_store(ASSESSMENT_DB) if ASSESSMENT_STORE_ENABLED else None
+
+# Triage result cache, created before gunicorn forks so all workers share it
+TRIAGE_CACHE_ENABLED = os.environ.get('TRIAGE_CACHE_ENABLED', 'True').lower() == 'true'
+TRIAGE_CACHE_SIZE = int(os.environ.get('TRIAGE_CACHE_SIZE', '4096'))
+TRIAGE_CACHE_TTL = float(os.environ.get('TRIAGE_CACHE_TTL', '3600'))
+triage_cache = SharedTriageCache(TRIAGE_CACHE_SIZE, TRIAGE_CACHE_TTL) if TRIAGE_CACHE_ENABLED else None
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+# Seconds browsers and proxies may reuse a page without revalidating (0 = always revalidate)
+PAGE_MAX_AGE = int(os.environ.get('PAGE_MAX_AGE', '0'))
+
+# Admission control, shared by all workers: off unless ADMISSION_RATE (requests/s) is set
+ADMISSION_RATE = float(os.environ.get('ADMISSION_RATE', '0'))
+admission = AdmissionController(
+    ADMISSION_RATE,
+    burst=float(os.environ.get('ADMISSION_BURST') or '0') or None,
+    reserves={
+        'public': float(os.environ.get('ADMISSION_RESERVE_PUBLIC', '0.3')),
+        'static': float(os.environ.get('ADMISSION_RESERVE_STATIC', '0.5')),
+    },
+) if ADMISSION_RATE > 0 else None
+
+# Opt-in profiling: a fraction of requests under cProfile, and/or stacks of requests slower than PROFILE_SLOW_MS
+request_profiler = RequestProfiler(
+    os.environ.get('PROFILE_DIR', os.path.join('logs', 'profiles')),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    slow_ms=float(os.environ.get('PROFILE_SLOW_MS', '0')),
+    interval_ms=float(os.environ.get('PROFILE_INTERVAL_MS', '5')),
+)
+
+# Self-hosted CSS/JS bundles built by build_assets.py; without a build the
+# templates fall back to the Tailwind, Google Fonts and Font Awesome CDNs
+ASSET_DIST_DIR = os.path.join(app.static_folder, 'dist')
+asset_manifest = load_manifest(ASSET_DIST_DIR)
+if asset_manifest:
+    CONTENT_SECURITY_POLICY = "default-src 'self'; style-src 'self' 'unsafe-inline'; script-src 'self' 'unsafe-inline'; font-src 'self';"
+else:
+    CONTENT_SECURITY_POLICY = "default-src 'self' https://cdn.tailwindcss.com https://fonts.googleapis.com https://fonts.gstatic.com https://cdnjs.cloudflare.com; style-src 'self' 'unsafe-inline' https://cdn.tailwindcss.com https://fonts.googleapis.com https://cdnjs.cloudflare.com; script-src 'self' 'unsafe-inline' https://cdn.tailwindcss.com; font-src 'self' https://fonts.gstatic.com https://cdnjs.cloudflare.com;"
+
+# Setup logging for production: log calls only enqueue, a listener thread per
+# worker writes JSON lines to logs/<LOG_FILE> and the console (see structured_logging.py)
 flask_env = os.environ.get('FLASK_ENV', 'production')
 if flask_env == 'production':
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
+    os.makedirs('logs', exist_ok=True)
     
     log_file = os.environ.get('LOG_FILE', 'app.log')
     log_level = os.environ.get('LOG_LEVEL', 'INFO')
     
-    file_handler = RotatingFileHandler(
+    file_handler = SharedRotatingFileHandler(
         f"logs/{log_file}", 
-        maxBytes=10240000, 
-        backupCount=10
+        max_bytes=10240000, 
+        backup_count=10
     )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
+    file_handler.setFormatter(JsonLinesFormatter())
     file_handler.setLevel(getattr(logging, log_level))
-    app.logger.addHandler(file_handler)
+    # Every logger (app, assessment store, scheduler) goes through the queue
+    app.logger.removeHandler(default_handler)
+    logging.getLogger().addHandler(QueueLogHandler([file_handler, default_handler]))
+    logging.getLogger().setLevel(getattr(logging, log_level))
     app.logger.setLevel(getattr(logging, log_level))
     app.logger.info('CTAS Triage System startup - Production Mode')
 
+# Profile whole requests (session, dispatch, after-request hooks) when enabled
+if request_profiler.enabled:
+    app.wsgi_app = request_profiler.wrap(app.wsgi_app, app.url_map)
+
+# Request metrics (see metrics.py)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+# Admission priority by endpoint; anything not listed is 'static'. Monitoring is never shed.
+ENDPOINT_PRIORITIES = {
+    'index': 'clinical',
+    'index_redirect': 'clinical',
+    'calculate_ctas_route': 'clinical',
+    'calculate_ctas_batch_route': 'clinical',
+    'api_v2_triage_route': 'clinical',
+    'incident_intake_route': 'clinical',
+    'download_csv_route': 'clinical',
+    'export_csv_route': 'clinical',
+    'queue_list_route': 'clinical',
+    'queue_enqueue_route': 'clinical',
+    'queue_pop_route': 'clinical',
+    'queue_retriage_route': 'clinical',
+    'queue_remove_route': 'clinical',
+    'queue_overdue_route': 'clinical',
+    'self_diagnosis_page': 'public',
+    'self_diagnosis_redirect': 'public',
+    'calculate_self_assessment_route': 'public',
+    'download_self_assessment_csv_route': 'public',
+    'health_check': None,
+    'metrics_route': None,
+    # EventSource gives up for good on a 503, and each poll is one indexed read
+    'board_events_route': None,
+}
+
+@app.before_request
+def admit_request():
+    if admission is None:
+        return None
+    priority = ENDPOINT_PRIORITIES.get(request.endpoint, 'static')
+    if priority is None:
+        return None
+    wait = admission.admit(priority)
+    if not wait:
+        return None
+    # Not logged per request: a surge would flood the log (see /metrics instead)
+    retry_after = admission.retry_after(wait)
+    lang = request_language()
+    response = jsonify({
+        'error': 'النظام مشغول حالياً، يرجى المحاولة بعد قليل' if lang == 'ar' else 'The system is busy, please try again shortly',
+        'error_code': 'OVERLOADED',
+        'details': {'priority': priority, 'retry_after': retry_after}
+    })
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
 # Security headers middleware
 @app.after_request
 def set_security_headers(response):
     response.headers['X-Content-Type-Options'] = 'nosniff'
     response.headers['X-Frame-Options'] = 'DENY'
     response.headers['X-XSS-Protection'] = '1; mode=block'
-    response.headers['Content-Security-Policy'] = "default-src 'self' https://cdn.tailwindcss.com https://fonts.googleapis.com https://fonts.gstatic.com https://cdnjs.cloudflare.com; style-src 'self' 'unsafe-inline' https://cdn.tailwindcss.com https://fonts.googleapis.com https://cdnjs.cloudflare.com; script-src 'self' 'unsafe-inline' https://cdn.tailwindcss.com; font-src 'self' https://fonts.gstatic.com https://cdnjs.cloudflare.com;"
+    response.headers['Content-Security-Policy'] = CONTENT_SECURITY_POLICY
     response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
     response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
     return response
@@ -78,16 +236,20 @@ def handle_exception(e):
 
 def safe_int(value):
     """Helper function to safely convert to int or return None."""
+    if value is None or value == '':
+        return None
     try:
         return int(value)
-    except (ValueError, TypeError):
+    except (ValueError, TypeError, OverflowError):  # OverflowError: a JSON number such as 1e999 (inf)
         return None
 
 def safe_float(value):
     """Helper function to safely convert to float or return None."""
+    if value is None or value == '':
+        return None
     try:
         return float(value)
-    except (ValueError, TypeError):
+    except (ValueError, TypeError, OverflowError):  # OverflowError: an integer such as 10**400
         return None
 
 # Medical validation ranges (extreme but clinically possible values)
@@ -104,174 +266,407 @@ MEDICAL_RANGES = {
     'glucose': {'min': 1, 'max': 50, 'unit': 'mmol/L'}
 }
 
+MEDICAL_RANGE_ORDER = {field: i for i, field in enumerate(MEDICAL_RANGES)}
+
 def validate_medical_ranges(data):
     """Validate input data against medical ranges."""
-    warnings = []
-    
-    for field, range_info in MEDICAL_RANGES.items():
-        if field in data and data[field]:
-            try:
-                value = float(data[field])
-                if value < range_info['min'] or value > range_info['max']:
-                    warnings.append({
-                        'field': field,
-                        'value': value,
-                        'range': f"{range_info['min']}-{range_info['max']} {range_info['unit']}",
-                        'message': f"{field} ({value}) outside normal range"
-                    })
-            except (ValueError, TypeError):
-                continue
-    
-    return warnings
+    return parse_triage_input(data).warnings
+
+# --- CTAS rule tables ---
+# The CTAS I-V criteria are declared here as data and compiled once at import
+# into lookups and evaluators (see _compile_ctas_rules). Adding a complaint or
+# a band does not add a branch to the hot path.
+
+# Age group bands (Saudi pediatric ranges): the first upper bound the age is
+# below wins; anything else (including a missing age) is an adult.
+AGE_GROUP_BANDS = (
+    (1 / 12, 'newborn'),  # < 1 month
+    (1, 'infant'),
+    (3, 'toddler'),
+    (5, 'preschool'),
+    (12, 'school_age'),
+    (18, 'adolescent'),
+)
+
+# CTAS I critical vital signs per age group: values outside (min, max) are
+# critical. A bound of None means that side is not checked.
+CTAS1_VITAL_LIMITS = {
+    'newborn': {'heart_rate': (120, 200), 'resp_rate': (30, 80)},
+    'infant': {'heart_rate': (100, 200), 'resp_rate': (25, 70)},
+    'toddler': {'heart_rate': (90, 180), 'resp_rate': (20, 50)},
+    'preschool': {'heart_rate': (80, 160), 'resp_rate': (20, 40)},
+    'school_age': {'heart_rate': (70, 140), 'resp_rate': (15, 35)},
+    'adolescent': {'heart_rate': (60, 140), 'resp_rate': (12, 30)},
+    'adult': {'heart_rate': (40, 140), 'resp_rate': (8, 35), 'bp_systolic': (80, None)},
+}
 
-def calculate_ctas_logic(data):
-    """Calculate CTAS level using Canadian Triage and Acuity Scale as implemented in Saudi Arabia."""
-    
-    # --- Get Input Data ---
-    age = safe_float(data.get('patient_age'))
-    complaint = data.get('chief_complaint', '')
-    hr = safe_int(data.get('heart_rate'))
-    rr = safe_int(data.get('resp_rate'))
-    spo2 = safe_int(data.get('spo2'))
-    bp_sys = safe_int(data.get('bp_systolic'))
-    temp = safe_float(data.get('temperature'))
-    gcs = safe_int(data.get('gcs_score'))
-    avpu = data.get('avpu')
-    pain = safe_int(data.get('pain_score', 0))
-    resp_distress = data.get('respiratory_distress', 'none')
-    bleeding = data.get('bleeding', 'none')
-    moi = data.get('mechanism_injury', 'none')
-    glucose = safe_float(data.get('glucose'))
-    dehydration = data.get('dehydration', 'none')
-    is_frail = data.get('is_frail') == 'true'
-    symptom_onset_time = safe_float(data.get('symptom_onset_time'))
-    
-    # Saudi-specific factors
-    heat_exposure = data.get('heat_exposure', 'no')
-    diabetes_status = data.get('has_diabetes', 'no')
-    time_waiting = safe_int(data.get('time_waiting', 0))
+# Chief complaints by the CTAS level they assign
+CTAS_COMPLAINT_LEVELS = {
+    1: {'cardiac_arrest', 'resp_arrest', 'shock', 'major_trauma', 'anaphylaxis', 'seizure_active'},
+    2: {'chest_pain_cardiac', 'stroke', 'sepsis', 'overdose', 'severe_pain', 'head_injury_moderate',
+        'vaginal_bleeding_heavy', 'fever_infant', 'psych_severe'},
+    3: {'abdominal_pain_severe'},
+    4: {'minor_trauma', 'vomiting_diarrhea_mild'},
+}
 
-    # Use AVPU if GCS is not provided
-    loc_indicator = gcs if gcs is not None else avpu
+# Categorical modifiers: field -> {value: CTAS level}
+CTAS_CATEGORY_LEVELS = {
+    'respiratory_distress': {'severe': 1, 'moderate': 2, 'mild': 3},
+    'bleeding': {'severe': 1, 'moderate': 3, 'minor': 4},
+    'dehydration': {'severe': 2, 'moderate': 3, 'mild': 4},
+    'mechanism_injury': {'significant': 2},
+}
 
-    ctas_level = 5  # Default to CTAS V (Non-urgent)
+# AVPU levels, only used when no GCS score is given
+AVPU_LEVELS = {'U': 1, 'P': 1, 'V': 2}
 
-    # --- Determine Age Group (Saudi pediatric ranges) ---
-    age_group = 'adult'  # Default
-    if age is not None:
-        if age < 1/12: age_group = 'newborn'  # < 1 month
-        elif age < 1: age_group = 'infant'
-        elif age < 3: age_group = 'toddler'
-        elif age < 5: age_group = 'preschool'
-        elif age < 12: age_group = 'school_age'
-        elif age < 18: age_group = 'adolescent'
-
-    # --- Saudi-specific heat illness check (HIGH PRIORITY) ---
-    if heat_exposure == 'yes' and temp is not None and temp >= 40.0:
-        return 1, get_reassessment_interval(1)
-    elif heat_exposure == 'yes' and (temp is not None and temp >= 38.5) and dehydration in ['moderate', 'severe']:
-        return 2, get_reassessment_interval(2)
-
-    # --- CTAS I: Resuscitation (Immediate) ---
-    is_ctas1 = False
-    
-    # Critical LOC
-    if (gcs is not None and gcs < 9) or (gcs is None and avpu in ['U', 'P']):
-        is_ctas1 = True
-    
-    # Life-threatening conditions
-    elif complaint in ['cardiac_arrest', 'resp_arrest'] or \
-         resp_distress == 'severe' or \
-         (spo2 is not None and spo2 < 90) or \
-         bleeding == 'severe' or \
-         complaint in ['shock', 'major_trauma', 'anaphylaxis', 'seizure_active']:
-        is_ctas1 = True
-    
-    # Critical vital signs (Saudi pediatric ranges)
-    elif age_group == 'newborn' and ((hr is not None and (hr < 120 or hr > 200)) or (rr is not None and (rr < 30 or rr > 80))):
-        is_ctas1 = True
-    elif age_group == 'infant' and ((hr is not None and (hr < 100 or hr > 200)) or (rr is not None and (rr < 25 or rr > 70))):
-        is_ctas1 = True
-    elif age_group == 'toddler' and ((hr is not None and (hr < 90 or hr > 180)) or (rr is not None and (rr < 20 or rr > 50))):
-        is_ctas1 = True
-    elif age_group == 'preschool' and ((hr is not None and (hr < 80 or hr > 160)) or (rr is not None and (rr < 20 or rr > 40))):
-        is_ctas1 = True
-    elif age_group == 'school_age' and ((hr is not None and (hr < 70 or hr > 140)) or (rr is not None and (rr < 15 or rr > 35))):
-        is_ctas1 = True
-    elif age_group == 'adolescent' and ((hr is not None and (hr < 60 or hr > 140)) or (rr is not None and (rr < 12 or rr > 30))):
-        is_ctas1 = True
-    elif age_group == 'adult' and ((hr is not None and (hr < 40 or hr > 140)) or (rr is not None and (rr < 8 or rr > 35)) or (bp_sys is not None and bp_sys < 80)):
-        is_ctas1 = True
-
-    if is_ctas1: return 1, get_reassessment_interval(1)
-
-    # --- CTAS II: Emergent (≤15 minutes) ---
-    is_ctas2 = False
-    
-    # Time-Sensitive CVA Modifier
-    if complaint == 'stroke' and symptom_onset_time is not None and symptom_onset_time < 4.5:
-        is_ctas2 = True
+# Numeric bands: (lower bound, level) steps in ascending order. A value takes
+# the level of the last bound it reaches; None means no criterion fires.
+CTAS_NUMERIC_BANDS = {
+    'gcs_score': ((float('-inf'), 1), (9, 2), (14, 3), (15, None)),
+    'spo2': ((float('-inf'), 1), (90, 2), (92, None)),
+    'pain_score': ((2, 4), (4, 3), (8, 2)),
+    'temperature': ((38.0, 4), (39.0, 3)),
+}
 
-    # Altered LOC
-    if (gcs is not None and 9 <= gcs <= 13) or (gcs is None and avpu == 'V'):
-        is_ctas2 = True
-    
-    # High-risk conditions
-    if complaint in ['chest_pain_cardiac', 'stroke', 'sepsis', 'overdose'] or \
-         resp_distress == 'moderate' or \
-         (pain is not None and pain >= 8) or \
-         complaint in ['severe_pain', 'head_injury_moderate', 'vaginal_bleeding_heavy', 'fever_infant', 'psych_severe'] or \
-         dehydration == 'severe' or moi == 'significant':
-        is_ctas2 = True
-    
+# Modifier rules layered on top of the base criteria
+CTAS_MODIFIER_RULES = {
+    # Saudi-specific heat illness check. These override every other criterion.
+    'heat_illness': (
+        {'min_temp': 40.0, 'dehydration': None, 'level': 1},
+        {'min_temp': 38.5, 'dehydration': {'moderate', 'severe'}, 'level': 2},
+    ),
+    # Time-sensitive CVA modifier
+    'cva_onset': {'complaint': 'stroke', 'max_onset_hours': 4.5, 'level': 2},
     # Diabetic emergency (high prevalence in Saudi Arabia)
-    if diabetes_status == 'yes' and glucose is not None and (glucose < 3.0 or glucose > 20.0):
-        is_ctas2 = True
-    
-    # Concerning vital signs
-    if (spo2 is not None and 90 <= spo2 < 92):
-        is_ctas2 = True
-        
-    # Paediatric Fever Logic
-    if age is not None and age >= 0.25 and age <= 1.5 and temp is not None and temp >= 38.5: # 3-18 months
-        is_ctas2 = True
+    'diabetic_glucose': {'limits': (3.0, 20.0), 'level': 2},
+    # Paediatric fever logic (3-18 months)
+    'paediatric_fever': {'min_age': 0.25, 'max_age': 1.5, 'min_temp': 38.5, 'level': 2},
+    # Time-based upgrade for patients waiting too long
+    'waiting_time': {'max_wait': 120, 'level': 3},
+    # Frailty modifier: CTAS IV/V patients are seen as CTAS III
+    'frailty': {'level': 3},
+}
 
-    if is_ctas2: return 2, get_reassessment_interval(2)
+def _outside(value, limits):
+    low, high = limits
+    return (low is not None and value < low) or (high is not None and value > high)
+
+def _compile_band(steps):
+    return tuple(bound for bound, _ in steps), (None,) + tuple(level for _, level in steps)
+
+def _compile_ctas_rules():
+    """Compile the rule tables into evaluators used by calculate_ctas_logic.
+
+    Returns (overrides, lookups, bands, criteria). Overrides are checked in
+    order and the first match decides the level. Otherwise the most urgent
+    (lowest) level among the lookups, bands and criteria wins.
+    """
+    overrides = []
+    for heat_rule in CTAS_MODIFIER_RULES['heat_illness']:
+        def heat_illness(inputs, min_temp=heat_rule['min_temp'],
+                         dehydration=heat_rule['dehydration'], level=heat_rule['level']):
+            temp = inputs.temperature
+            if inputs.heat_exposure != 'yes' or temp is None or not temp >= min_temp:
+                return None
+            if dehydration is not None and inputs.dehydration not in dehydration:
+                return None
+            return level
+        overrides.append(heat_illness)
+
+    # Categorical fields become a single dict lookup each
+    complaint_levels = {}
+    for level in sorted(CTAS_COMPLAINT_LEVELS, reverse=True):
+        complaint_levels.update(dict.fromkeys(CTAS_COMPLAINT_LEVELS[level], level))
+    lookups = [('chief_complaint', complaint_levels)]
+    lookups += [(field, dict(levels)) for field, levels in CTAS_CATEGORY_LEVELS.items()]
+
+    # Numeric bands become a bisect over their bounds (GCS is handled with AVPU below)
+    bands = [(field,) + _compile_band(steps) for field, steps in CTAS_NUMERIC_BANDS.items()
+             if field != 'gcs_score']
+
+    criteria = []
+    gcs_bounds, gcs_levels = _compile_band(CTAS_NUMERIC_BANDS['gcs_score'])
+
+    def level_of_consciousness(inputs):
+        gcs = inputs.gcs_score
+        if gcs is not None:
+            return gcs_levels[bisect_right(gcs_bounds, gcs)]
+        return AVPU_LEVELS.get(inputs.avpu)
+    criteria.append(level_of_consciousness)
+
+    age_bounds = [bound for bound, _ in AGE_GROUP_BANDS]
+    vital_limits = [tuple(CTAS1_VITAL_LIMITS[group].items()) for _, group in AGE_GROUP_BANDS]
+    vital_limits.append(tuple(CTAS1_VITAL_LIMITS['adult'].items()))
+
+    def critical_vitals(inputs):
+        age = inputs.patient_age
+        limits = vital_limits[bisect_right(age_bounds, age) if age is not None else -1]
+        for field, field_limits in limits:
+            value = getattr(inputs, field)
+            if value is not None and _outside(value, field_limits):
+                return 1
+        return None
+    criteria.append(critical_vitals)
 
-    # --- CTAS III: Urgent (≤30 minutes) ---
-    is_ctas3 = False
-    
-    if gcs is not None and gcs == 14:
-        is_ctas3 = True
-    
-    if resp_distress == 'mild' or \
-         (pain is not None and 4 <= pain <= 7) or \
-         complaint == 'abdominal_pain_severe' or \
-         bleeding == 'moderate' or dehydration == 'moderate' or \
-         (temp is not None and temp >= 39.0):
-        is_ctas3 = True
-    
-    # Time-based upgrade for patients waiting too long
-    if time_waiting is not None and time_waiting > 120:
-        is_ctas3 = True
+    cva = CTAS_MODIFIER_RULES['cva_onset']
 
-    if is_ctas3: ctas_level = 3
+    def cva_onset(inputs, complaint=cva['complaint'], max_onset=cva['max_onset_hours'], level=cva['level']):
+        onset = inputs.symptom_onset_time
+        if inputs.chief_complaint == complaint and onset is not None and onset < max_onset:
+            return level
+        return None
+    criteria.append(cva_onset)
 
-    # --- CTAS IV: Less Urgent (≤60 minutes) ---
-    is_ctas4 = False
-    if complaint in ['minor_trauma', 'vomiting_diarrhea_mild'] or \
-       (pain is not None and 2 <= pain <= 3) or \
-       bleeding == 'minor' or dehydration == 'mild' or \
-       (temp is not None and temp >= 38.0):
-        is_ctas4 = True
+    glucose_rule = CTAS_MODIFIER_RULES['diabetic_glucose']
 
-    if is_ctas4 and ctas_level == 5: ctas_level = 4
+    def diabetic_glucose(inputs, limits=glucose_rule['limits'], level=glucose_rule['level']):
+        glucose = inputs.glucose
+        if inputs.has_diabetes == 'yes' and glucose is not None and _outside(glucose, limits):
+            return level
+        return None
+    criteria.append(diabetic_glucose)
+
+    fever = CTAS_MODIFIER_RULES['paediatric_fever']
 
-    # Frailty Modifier
-    if is_frail and ctas_level in [4, 5]:
-        ctas_level = 3
+    def paediatric_fever(inputs, min_age=fever['min_age'], max_age=fever['max_age'],
+                         min_temp=fever['min_temp'], level=fever['level']):
+        age, temp = inputs.patient_age, inputs.temperature
+        if age is not None and min_age <= age <= max_age and temp is not None and temp >= min_temp:
+            return level
+        return None
+    criteria.append(paediatric_fever)
 
-    return ctas_level, get_reassessment_interval(ctas_level)
+    waiting = CTAS_MODIFIER_RULES['waiting_time']
+
+    def waiting_time(inputs, max_wait=waiting['max_wait'], level=waiting['level']):
+        time_waiting = inputs.time_waiting
+        if time_waiting is not None and time_waiting > max_wait:
+            return level
+        return None
+    criteria.append(waiting_time)
+
+    def frailty(inputs, level=CTAS_MODIFIER_RULES['frailty']['level']):
+        return level if inputs.is_frail else None
+    criteria.append(frailty)
+
+    return tuple(overrides), tuple(lookups), tuple(bands), tuple(criteria)
+
+CTAS_OVERRIDE_RULES, CTAS_LOOKUP_RULES, CTAS_BAND_RULES, CTAS_CRITERIA_RULES = _compile_ctas_rules()
+
+# Reason codes: one bit per rule, for the rules that set a result's level.
+# Stored with every assessment, so only ever append to this list. Lookups and
+# bands are named by their field, the other rules by their evaluator
+# (critical_vitals holds the age-banded HR/RR/SpO2/BP limits).
+CTAS_REASON_CODES = (
+    'heat_illness',
+    'chief_complaint',
+    'respiratory_distress',
+    'bleeding',
+    'dehydration',
+    'mechanism_injury',
+    'spo2',
+    'pain_score',
+    'temperature',
+    'level_of_consciousness',
+    'critical_vitals',
+    'cva_onset',
+    'diabetic_glucose',
+    'paediatric_fever',
+    'waiting_time',
+    'frailty',
+)
+CTAS_REASON_BITS = {code: 1 << i for i, code in enumerate(CTAS_REASON_CODES)}
+# The compiled rules paired with their bit
+CTAS_OVERRIDE_REASONS = tuple((rule, CTAS_REASON_BITS[rule.__name__]) for rule in CTAS_OVERRIDE_RULES)
+CTAS_LOOKUP_REASONS = tuple((field, levels, CTAS_REASON_BITS[field]) for field, levels in CTAS_LOOKUP_RULES)
+CTAS_BAND_REASONS = tuple((field, bounds, levels, CTAS_REASON_BITS[field]) for field, bounds, levels in CTAS_BAND_RULES)
+CTAS_CRITERIA_REASONS = tuple((rule, CTAS_REASON_BITS[rule.__name__]) for rule in CTAS_CRITERIA_RULES)
+
+def parse_flag(value):
+    return value == 'true'
+
+# Triage form fields the server reads: (field, parser, default). A parser of
+# None keeps the raw value.
+TRIAGE_INPUT_FIELDS = (
+    ('patient_age', safe_float, None),
+    ('chief_complaint', None, ''),
+    ('heart_rate', safe_int, None),
+    ('resp_rate', safe_int, None),
+    ('spo2', safe_int, None),
+    ('bp_systolic', safe_int, None),
+    ('bp_diastolic', safe_int, None),
+    ('temperature', safe_float, None),
+    ('gcs_score', safe_int, None),
+    ('avpu', None, None),
+    ('pain_score', safe_int, 0),
+    ('respiratory_distress', None, 'none'),
+    ('bleeding', None, 'none'),
+    ('mechanism_injury', None, 'none'),
+    ('glucose', safe_float, None),
+    ('dehydration', None, 'none'),
+    ('is_frail', parse_flag, None),
+    ('symptom_onset_time', safe_float, None),
+    # Saudi-specific factors
+    ('heat_exposure', None, 'no'),
+    ('has_diabetes', None, 'no'),
+    ('time_waiting', safe_int, 0),
+)
+# The same table split by parser, with each field's MEDICAL_RANGES entry, so
+# parse_triage_input converts ints and floats inline instead of calling them
+TRIAGE_TEXT_FIELDS = tuple((field, default) for field, parser, default in TRIAGE_INPUT_FIELDS if parser is None)
+TRIAGE_INT_FIELDS = tuple((field, default, MEDICAL_RANGES.get(field))
+                          for field, parser, default in TRIAGE_INPUT_FIELDS if parser is safe_int)
+TRIAGE_FLOAT_FIELDS = tuple((field, default, MEDICAL_RANGES.get(field))
+                            for field, parser, default in TRIAGE_INPUT_FIELDS if parser is safe_float)
+TRIAGE_FLAG_FIELDS = tuple((field, default) for field, parser, default in TRIAGE_INPUT_FIELDS if parser is parse_flag)
+
+# Fields the CTAS rules read, i.e. everything a CTAS result depends on
+# (bp_diastolic is only range-checked)
+CTAS_INPUT_FIELDS = tuple(field for field, _, _ in TRIAGE_INPUT_FIELDS if field != 'bp_diastolic')
+
+class TriageInput:
+    """A triage form parsed once per request by parse_triage_input.
+
+    One attribute per TRIAGE_INPUT_FIELDS entry, typed, plus `warnings`
+    (the validate_medical_ranges result). Range checks and the CTAS rules
+    both read it, so no field is converted twice, and a slotted record is
+    less than half the size of the dict it replaces.
+    """
+    __slots__ = tuple(field for field, _, _ in TRIAGE_INPUT_FIELDS) + ('warnings',)
+
+def range_warning(field, raw, limits):
+    """The validate_medical_ranges warning for an out-of-range field."""
+    try:
+        value = float(raw)
+    except OverflowError:  # an integer too large for a float, e.g. 10**400
+        value = float('inf') if raw > 0 else float('-inf')
+    return {
+        'field': field,
+        'value': value,
+        'range': f"{limits['min']}-{limits['max']} {limits['unit']}",
+        'message': f"{field} ({value}) outside normal range"
+    }
+
+def parse_triage_input(data):
+    """Coerce and range-check raw form data in a single pass.
+
+    Numbers are converted as safe_int/safe_float would. A range-checked int
+    field that parses is compared as is; only values int() rejects (such as
+    "72.5") go through float() for the range check. A JSON list or object in
+    a text field becomes None: it matches no rule, and the rule lookups hash
+    the value.
+    """
+    inputs = TriageInput()
+    warnings = []
+    get = data.get
+    for field, default in TRIAGE_TEXT_FIELDS:
+        value = get(field, default)
+        if value.__hash__ is None:
+            value = None
+        setattr(inputs, field, value)
+    for field, default, limits in TRIAGE_INT_FIELDS:
+        raw = get(field, default)
+        value = None
+        if raw is not None and raw != '':
+            try:
+                value = int(raw)
+            except (ValueError, TypeError, OverflowError):
+                pass
+        setattr(inputs, field, value)
+        if limits is not None and raw:
+            # A JSON integer too large for a float is compared as the int it parsed to
+            number = value if value is not None and type(raw) in (str, int) else safe_float(raw)
+            if number is not None and (number < limits['min'] or number > limits['max']):
+                warnings.append(range_warning(field, raw, limits))
+    for field, default, limits in TRIAGE_FLOAT_FIELDS:
+        raw = get(field, default)
+        value = None
+        number = None
+        if raw is not None and raw != '':
+            try:
+                value = number = float(raw)
+            except (ValueError, TypeError):
+                pass
+            except OverflowError:  # an integer such as 10**400: missing, but still out of range
+                number = raw
+        setattr(inputs, field, value)
+        if limits is not None and raw and number is not None and (number < limits['min'] or number > limits['max']):
+            warnings.append(range_warning(field, raw, limits))
+    for field, default in TRIAGE_FLAG_FIELDS:
+        setattr(inputs, field, parse_flag(get(field, default)))
+    # Warnings in MEDICAL_RANGES order, as validate_medical_ranges always returned them
+    if len(warnings) > 1:
+        warnings.sort(key=lambda warning: MEDICAL_RANGE_ORDER[warning['field']])
+    inputs.warnings = warnings
+    return inputs
+
+def calculate_ctas_logic(data):
+    """Calculate CTAS level using Canadian Triage and Acuity Scale as implemented in Saudi Arabia."""
+    return evaluate_ctas_inputs(parse_triage_input(data))
+
+def cached_ctas_logic(data, inputs=None):
+    """(level, reassessment interval, reasons) for raw form data, through the shared result cache.
+
+    The key is the raw values of the fields the rules read, in a fixed order,
+    so the patient's name, ID and free-text details never split the cache.
+    A cache hit skips parsing; pass `inputs` when the caller has already
+    parsed `data` (for its range warnings) so a miss does not parse again.
+    """
+    if triage_cache is None:
+        return evaluate_ctas_rules(inputs or parse_triage_input(data))
+    try:
+        key = marshal.dumps(tuple(map(data.get, CTAS_INPUT_FIELDS)))
+    except ValueError:  # a JSON body with values marshal cannot encode
+        return evaluate_ctas_rules(inputs or parse_triage_input(data))
+    result = triage_cache.get(key)
+    if result is None:
+        result = evaluate_ctas_rules(inputs or parse_triage_input(data))
+        triage_cache.put(key, result)
+    return result
+
+def evaluate_ctas_rules(inputs):
+    """Apply the CTAS rule tables to a TriageInput.
+
+    Returns (level, reassessment interval, reasons). reasons has the
+    CTAS_REASON_BITS of the deciding override, or of every rule giving the
+    final level; 0 means the level is the CTAS V default.
+    """
+    for rule, bit in CTAS_OVERRIDE_REASONS:
+        level = rule(inputs)
+        if level is not None:
+            return level, get_reassessment_interval(level), bit
+
+    ctas_level = 5  # Default to CTAS V (Non-urgent)
+    reasons = 0
+    for field, levels, bit in CTAS_LOOKUP_REASONS:
+        level = levels.get(getattr(inputs, field))
+        if level is not None and level <= ctas_level:
+            reasons = reasons | bit if level == ctas_level else bit
+            ctas_level = level
+    for field, bounds, levels, bit in CTAS_BAND_REASONS:
+        value = getattr(inputs, field)
+        if value is not None and value == value:  # skip missing and NaN
+            level = levels[bisect_right(bounds, value)]
+            if level is not None and level <= ctas_level:
+                reasons = reasons | bit if level == ctas_level else bit
+                ctas_level = level
+    # Run every criterion, even at CTAS I, so the reasons are complete
+    for rule, bit in CTAS_CRITERIA_REASONS:
+        level = rule(inputs)
+        if level is not None and level <= ctas_level:
+            reasons = reasons | bit if level == ctas_level else bit
+            ctas_level = level
+
+    return ctas_level, get_reassessment_interval(ctas_level), reasons
+
+def evaluate_ctas_inputs(inputs):
+    """(level, reassessment interval) for a TriageInput."""
+    return evaluate_ctas_rules(inputs)[:2]
+
+def ctas_reason_names(reasons):
+    """Reason codes for a reasons bitmask, in rule order (e.g. ['chief_complaint', 'cva_onset'])."""
+    return [code for code in CTAS_REASON_CODES if reasons & CTAS_REASON_BITS[code]]
 
 def get_reassessment_interval(ctas_level):
     if ctas_level == 1:
@@ -285,240 +680,717 @@ def get_reassessment_interval(ctas_level):
     else:
         return 120
 
-# Simple function to get text representation from value (for selects)
-# This needs the actual mapping from the HTML, stored here for convenience
-# In a real app, this mapping might be better placed elsewhere (config, db)
-def get_text_from_value(field_id, value, tool_type='professional', lang='ar'):
-    """Gets text representation for select/radio values from different forms."""
+# --- Quantized outcome table (see triage_table.py) ---
+# Every threshold and value the rule tables compare against, per field. A
+# field's bins give the same answer to every rule, so one representative per
+# bin combination is enough to enumerate all outcomes.
+CTAS_TABLE_FIELDS = {
+    'patient_age': triage_table.NumericBins(
+        [bound for bound, _ in AGE_GROUP_BANDS] +
+        [CTAS_MODIFIER_RULES['paediatric_fever']['min_age'], CTAS_MODIFIER_RULES['paediatric_fever']['max_age']]),
+    **{field: triage_table.NumericBins(
+        limit for limits in CTAS1_VITAL_LIMITS.values() for limit in limits.get(field, ()) if limit is not None)
+       for field in ('heart_rate', 'resp_rate', 'bp_systolic')},
+    **{field: triage_table.NumericBins(bound for bound, _ in steps) for field, steps in CTAS_NUMERIC_BANDS.items()
+       if field != 'temperature'},
+    'temperature': triage_table.NumericBins(
+        [bound for bound, _ in CTAS_NUMERIC_BANDS['temperature']] +
+        [rule['min_temp'] for rule in CTAS_MODIFIER_RULES['heat_illness']] +
+        [CTAS_MODIFIER_RULES['paediatric_fever']['min_temp']]),
+    'glucose': triage_table.NumericBins(CTAS_MODIFIER_RULES['diabetic_glucose']['limits']),
+    'symptom_onset_time': triage_table.NumericBins([CTAS_MODIFIER_RULES['cva_onset']['max_onset_hours']]),
+    'time_waiting': triage_table.NumericBins([CTAS_MODIFIER_RULES['waiting_time']['max_wait']]),
+    'chief_complaint': triage_table.CategoryBins(
+        [complaint for complaints in CTAS_COMPLAINT_LEVELS.values() for complaint in complaints] +
+        [CTAS_MODIFIER_RULES['cva_onset']['complaint']], other=''),
+    'avpu': triage_table.CategoryBins(AVPU_LEVELS),
+    **{field: triage_table.CategoryBins(levels, other='none') for field, levels in CTAS_CATEGORY_LEVELS.items()
+       if field != 'dehydration'},
+    'dehydration': triage_table.CategoryBins(
+        [*CTAS_CATEGORY_LEVELS['dehydration'],
+         *(value for rule in CTAS_MODIFIER_RULES['heat_illness'] for value in rule['dehydration'] or ())],
+        other='none'),
+    # Yes/no fields the rules test against one value
+    'heat_exposure': triage_table.CategoryBins(['yes'], other='no'),
+    'has_diabetes': triage_table.CategoryBins(['yes'], other='no'),
+    'is_frail': triage_table.CategoryBins([True], other=False),
+}
 
-    # Mappings specific to professional tool - Arabic versions
-    professional_mapping_ar = {
-        'patient-gender': {
-            'male': 'ذكر', 'female': 'أنثى', '': 'اختر'
-        },
-        'chief-complaint': {
-             'cardiac_arrest': 'توقف القلب', 'resp_arrest': 'توقف التنفس',
-             'major_trauma': 'إصابة بليغة', 'chest_pain_cardiac': 'ألم في الصدر (يشتبه بالقلب)',
-             'resp_distress_severe': 'ضيق تنفس حاد', 'shock': 'صدمة',
-             'loc_decreased': 'انخفاض مستوى الوعي', 'seizure_active': 'تشنج نشط',
-             'stroke': 'جلطة دماغية', 'anaphylaxis': 'حساسية مفرطة',
-             'overdose': 'جرعة زائدة', 'sepsis': 'تسمم الدم',
-             'severe_pain': 'ألم شديد', 'resp_distress_moderate': 'ضيق تنفس متوسط',
-             'abdominal_pain_severe': 'ألم بطن شديد', 'head_injury_moderate': 'إصابة رأس متوسطة',
-             'vaginal_bleeding_heavy': 'نزيف مهبلي غزير', 'fever_infant': 'حمى (رضيع < 3 أشهر)',
-             'psych_severe': 'حالة نفسية حادة', 'minor_trauma': 'إصابة طفيفة',
-             'mild_pain': 'ألم خفيف', 'vomiting_diarrhea_mild': 'قيء/إسهال خفيف',
-             'rash': 'طفح جلدي', 'other': 'أخرى', '': '-- اختر الشكوى --'
-        },
-        'respiratory-distress': {
-            'none': 'لا يوجد', 'mild': 'خفيف', 'moderate': 'متوسط', 'severe': 'شديد'
-        },
-        'bleeding': {
-            'none': 'لا يوجد', 'minor': 'طفيف', 'moderate': 'متوسط / كبير يمكن السيطرة عليه', 'severe': 'شديد / غير مسيطر عليه'
-        },
-        'mechanism-injury': {
-            'none': 'لا يوجد/غير مطبق', 'minor': 'آلية بسيطة', 'significant': 'آلية خطرة', 'other': 'أخرى'
-        },
-        'dehydration': {
-             'none': 'لا يوجد', 'mild': 'خفيف', 'moderate': 'متوسط', 'severe': 'شديد'
-        }
+# Groups of fields such that every rule reads the fields of one group only
+CTAS_TABLE_FACTORS = (
+    # Heat illness, temperature band, paediatric fever, dehydration
+    ('patient_age', 'temperature', 'heat_exposure', 'dehydration'),
+    # Critical vital signs by age group
+    ('patient_age', 'heart_rate', 'resp_rate', 'bp_systolic'),
+    # Chief complaint and the CVA onset window
+    ('chief_complaint', 'symptom_onset_time'),
+    # Level of consciousness
+    ('gcs_score', 'avpu'),
+    # SpO2 and pain bands, diabetic glucose
+    ('spo2', 'pain_score', 'glucose', 'has_diabetes'),
+    # Single-field modifiers
+    ('respiratory_distress', 'bleeding', 'mechanism_injury', 'time_waiting', 'is_frail'),
+)
+
+def _ctas_table_digest():
+    """Fingerprint of everything a table's entries depend on, including the evaluator's code."""
+    return triage_table.fingerprint(
+        AGE_GROUP_BANDS, CTAS1_VITAL_LIMITS, CTAS_COMPLAINT_LEVELS, CTAS_CATEGORY_LEVELS, AVPU_LEVELS,
+        CTAS_NUMERIC_BANDS, CTAS_MODIFIER_RULES, CTAS_REASON_CODES, CTAS_TABLE_FACTORS,
+        {field: repr(vars(bins)) for field, bins in CTAS_TABLE_FIELDS.items()},
+        inspect.getsource(_compile_ctas_rules), inspect.getsource(evaluate_ctas_rules),
+    )
+
+def _neutral_triage_input():
+    """A form with every field at its default, for which no rule fires."""
+    return parse_triage_input({})
+
+def open_ctas_table(path):
+    """Map the outcome table at `path`, building it from evaluate_ctas_rules if missing or stale."""
+    neutral = _neutral_triage_input()
+    if evaluate_ctas_rules(neutral) != (5, get_reassessment_interval(5), 0):
+        raise RuntimeError('A CTAS rule fires on an empty form; the outcome table cannot be factored')
+    return triage_table.open_table(
+        path, CTAS_TABLE_FIELDS, CTAS_TABLE_FACTORS, _ctas_table_digest(),
+        lambda inputs: evaluate_ctas_rules(inputs)[::2], _neutral_triage_input,
+        CTAS_REASON_BITS['heat_illness'],
+    )
+
+# Mapped before gunicorn forks (preload_app), so every worker reads the same pages
+TRIAGE_TABLE_ENABLED = os.environ.get('TRIAGE_TABLE_ENABLED', 'True').lower() == 'true'
+TRIAGE_TABLE_PATH = os.environ.get('TRIAGE_TABLE_PATH', 'data/triage_table.bin')
+ctas_table = open_ctas_table(TRIAGE_TABLE_PATH) if TRIAGE_TABLE_ENABLED else None
+
+# Numeric fields read by calculate_ctas_batch: (field, parser, default)
+CTAS_BATCH_NUMERIC_FIELDS = (
+    ('patient_age', safe_float, None),
+    ('heart_rate', safe_int, None),
+    ('resp_rate', safe_int, None),
+    ('spo2', safe_int, None),
+    ('bp_systolic', safe_int, None),
+    ('temperature', safe_float, None),
+    ('gcs_score', safe_int, None),
+    ('pain_score', safe_int, 0),
+    ('glucose', safe_float, None),
+    ('symptom_onset_time', safe_float, None),
+    ('time_waiting', safe_int, 0),
+)
+
+# Categorical fields read by calculate_ctas_batch: (field, default)
+CTAS_BATCH_CATEGORY_FIELDS = (
+    ('chief_complaint', ''),
+    ('avpu', None),
+    ('respiratory_distress', 'none'),
+    ('bleeding', 'none'),
+    ('mechanism_injury', 'none'),
+    ('dehydration', 'none'),
+    ('is_frail', None),
+    ('heat_exposure', 'no'),
+    ('has_diabetes', 'no'),
+)
+
+REASSESSMENT_INTERVALS = np.array([0, 0, 15, 30, 60, 120])  # indexed by CTAS level
+
+def _parse_column(values, parser):
+    """Parse a raw column into floats, with NaN for missing values.
+
+    Triage inputs are mostly discrete, so each distinct raw value is parsed once.
+    """
+    try:
+        parsed = {value: parser(value) for value in set(values)}
+    except TypeError:  # unhashable values, parse one by one
+        parsed_values = [parser(value) for value in values]
+    else:
+        parsed_values = [parsed[value] for value in values]
+    try:
+        return np.array([np.nan if value is None else value for value in parsed_values], dtype=float)
+    except OverflowError:  # an int too large for a float (e.g. 10**400): compare it as infinity
+        return np.array([np.nan if value is None else _column_float(value) for value in parsed_values], dtype=float)
+
+def _column_float(value):
+    try:
+        return float(value)
+    except OverflowError:
+        return float('inf') if value > 0 else float('-inf')
+
+def _batch_raw(records):
+    """(count, raw) where raw(field, default) is that field's raw values for every record.
+
+    Accepts a list of records or a dict of equal-length columns.
+    """
+    if isinstance(records, dict):
+        count = len(next(iter(records.values()), ()))
+
+        def raw(field, default):
+            return records[field] if field in records else [default] * count
+    else:
+        count = len(records)
+
+        def raw(field, default):
+            return [record.get(field, default) for record in records]
+    return count, raw
+
+def _batch_columns(records):
+    """Hold the fields read by the CTAS rules as NumPy columns.
+
+    Accepts a list of records or a dict of equal-length columns. Numeric
+    columns are floats with NaN for missing values, which fails every
+    comparison exactly like the None checks in calculate_ctas_logic.
+    """
+    count, raw = _batch_raw(records)
+    columns = {}
+    for field, parser, default in CTAS_BATCH_NUMERIC_FIELDS:
+        columns[field] = _parse_column(raw(field, default), parser)
+    for field, default in CTAS_BATCH_CATEGORY_FIELDS:
+        column = np.empty(count, dtype=object)
+        column[:] = raw(field, default)
+        columns[field] = column
+    return count, columns
+
+def _value_bin(bins, value):
+    try:
+        return bins.index(value)
+    except TypeError:  # an unhashable value (e.g. a JSON list) matches no rule
+        return 0
+
+def _batch_bins(records):
+    """Each CTAS_TABLE_FIELDS field's bin for every record, as int arrays.
+
+    Raw values are parsed as parse_triage_input would, once per distinct
+    value, and mapped straight to their bin; no float columns are built.
+    """
+    count, raw = _batch_raw(records)
+    bins = {}
+    for field, parser, default in TRIAGE_INPUT_FIELDS:
+        field_bins = CTAS_TABLE_FIELDS.get(field)
+        if field_bins is None:
+            continue
+        values = raw(field, default)
+        parse = parser or (lambda value: value)
+        try:
+            codes = {value: field_bins.index(parse(value)) for value in set(values)}
+        except TypeError:  # unhashable values, bin by bin
+            bins[field] = np.fromiter((_value_bin(field_bins, parse(value)) for value in values),
+                                      dtype=np.intp, count=count)
+        else:
+            bins[field] = np.fromiter(map(codes.__getitem__, values), dtype=np.intp, count=count)
+    return count, bins
+
+def _batch_outside(values, limits):
+    low, high = limits
+    mask = np.zeros(values.shape, dtype=bool)
+    if low is not None:
+        mask |= values < low
+    if high is not None:
+        mask |= values > high
+    return mask
+
+def _batch_band(values, bounds, levels):
+    """Vectorized band lookup; 0 where no criterion fires."""
+    codes = np.array([0 if level is None else level for level in levels])
+    result = codes[np.searchsorted(bounds, values, side='right')]
+    result[np.isnan(values)] = 0
+    return result
+
+def calculate_ctas_batch(records):
+    """Calculate CTAS levels for many records at once with NumPy.
+
+    Takes a list of records (dicts of form fields) or a dict of columns.
+    With the outcome table each record costs a few indexed reads; without it
+    the same rule tables as calculate_ctas_logic are applied as masked array
+    operations. Returns (levels, reassessment_intervals) as integer arrays.
+    """
+    if ctas_table is not None:
+        count, bins = _batch_bins(records)
+        levels, _ = ctas_table.lookup_bins(bins, count)
+        return levels, REASSESSMENT_INTERVALS[levels]
+    count, columns = _batch_columns(records)
+    levels = np.full(count, 5)
+
+    def apply(mask, level):
+        np.minimum(levels, np.where(mask, level, 5), out=levels)
+
+    # Categorical lookups
+    for level, complaints in CTAS_COMPLAINT_LEVELS.items():
+        for complaint in complaints:
+            apply(columns['chief_complaint'] == complaint, level)
+    for field, field_levels in CTAS_CATEGORY_LEVELS.items():
+        for value, level in field_levels.items():
+            apply(columns[field] == value, level)
+
+    # Numeric bands
+    for field, bounds, band_levels in CTAS_BAND_RULES:
+        band = _batch_band(columns[field], bounds, band_levels)
+        apply(band > 0, band)
+
+    # Level of consciousness: GCS, or AVPU when no GCS is given
+    gcs = columns['gcs_score']
+    gcs_missing = np.isnan(gcs)
+    band = _batch_band(gcs, *_compile_band(CTAS_NUMERIC_BANDS['gcs_score']))
+    apply(band > 0, band)
+    for value, level in AVPU_LEVELS.items():
+        apply(gcs_missing & (columns['avpu'] == value), level)
+
+    # Critical vital signs by age group
+    age = columns['patient_age']
+    group_index = np.searchsorted([bound for bound, _ in AGE_GROUP_BANDS], age, side='right')
+    groups = [group for _, group in AGE_GROUP_BANDS] + ['adult']
+    for index, group in enumerate(groups):
+        in_group = group_index == index
+        for field, limits in CTAS1_VITAL_LIMITS[group].items():
+            apply(in_group & _batch_outside(columns[field], limits), 1)
+
+    # Modifier rules
+    temp = columns['temperature']
+    cva = CTAS_MODIFIER_RULES['cva_onset']
+    apply((columns['chief_complaint'] == cva['complaint']) &
+          (columns['symptom_onset_time'] < cva['max_onset_hours']), cva['level'])
+
+    glucose_rule = CTAS_MODIFIER_RULES['diabetic_glucose']
+    apply((columns['has_diabetes'] == 'yes') &
+          _batch_outside(columns['glucose'], glucose_rule['limits']), glucose_rule['level'])
+
+    fever = CTAS_MODIFIER_RULES['paediatric_fever']
+    apply((age >= fever['min_age']) & (age <= fever['max_age']) & (temp >= fever['min_temp']),
+          fever['level'])
+
+    waiting = CTAS_MODIFIER_RULES['waiting_time']
+    apply(columns['time_waiting'] > waiting['max_wait'], waiting['level'])
+
+    apply(columns['is_frail'] == 'true', CTAS_MODIFIER_RULES['frailty']['level'])
+
+    # Heat illness overrides everything else; the first matching rule wins
+    heat = columns['heat_exposure'] == 'yes'
+    decided = np.zeros(count, dtype=bool)
+    for rule in CTAS_MODIFIER_RULES['heat_illness']:
+        mask = heat & (temp >= rule['min_temp']) & ~decided
+        if rule['dehydration'] is not None:
+            dehydrated = np.zeros(count, dtype=bool)
+            for value in rule['dehydration']:
+                dehydrated |= columns['dehydration'] == value
+            mask &= dehydrated
+        levels[mask] = rule['level']
+        decided |= mask
+
+    return levels, REASSESSMENT_INTERVALS[levels]
+
+# --- Bilingual label catalog ---
+# Text for select/radio values, wait times and recommendations, loaded once at
+# import. The same catalog is exposed to the templates (see inject_label_catalog)
+# so the form options and the summaries/CSV exports never drift apart.
+
+# Mappings specific to professional tool - Arabic versions
+PROFESSIONAL_LABELS_AR = {
+    'patient-gender': {
+        'male': 'ذكر', 'female': 'أنثى', '': 'اختر'
+    },
+    'chief-complaint': {
+         'cardiac_arrest': 'توقف القلب', 'resp_arrest': 'توقف التنفس',
+         'major_trauma': 'إصابة بليغة', 'chest_pain_cardiac': 'ألم في الصدر (يشتبه بالقلب)',
+         'resp_distress_severe': 'ضيق تنفس حاد', 'shock': 'صدمة',
+         'loc_decreased': 'انخفاض مستوى الوعي', 'seizure_active': 'تشنج نشط',
+         'stroke': 'جلطة دماغية', 'anaphylaxis': 'حساسية مفرطة',
+         'overdose': 'جرعة زائدة', 'sepsis': 'تسمم الدم',
+         'severe_pain': 'ألم شديد', 'resp_distress_moderate': 'ضيق تنفس متوسط',
+         'abdominal_pain_severe': 'ألم بطن شديد', 'head_injury_moderate': 'إصابة رأس متوسطة',
+         'vaginal_bleeding_heavy': 'نزيف مهبلي غزير', 'fever_infant': 'حمى (رضيع < 3 أشهر)',
+         'psych_severe': 'حالة نفسية حادة', 'minor_trauma': 'إصابة طفيفة',
+         'mild_pain': 'ألم خفيف', 'vomiting_diarrhea_mild': 'قيء/إسهال خفيف',
+         'rash': 'طفح جلدي', 'other': 'أخرى', '': '-- اختر الشكوى --'
+    },
+    'respiratory-distress': {
+        'none': 'لا يوجد', 'mild': 'خفيف', 'moderate': 'متوسط', 'severe': 'شديد'
+    },
+    'bleeding': {
+        'none': 'لا يوجد', 'minor': 'طفيف', 'moderate': 'متوسط / كبير يمكن السيطرة عليه', 'severe': 'شديد / غير مسيطر عليه'
+    },
+    'mechanism-injury': {
+        'none': 'لا يوجد/غير مطبق', 'minor': 'آلية بسيطة', 'significant': 'آلية خطرة', 'other': 'أخرى'
+    },
+    'dehydration': {
+         'none': 'لا يوجد', 'mild': 'خفيف', 'moderate': 'متوسط', 'severe': 'شديد'
+    },
+    'heat-exposure': {
+        'no': 'لا', 'yes': 'نعم'
+    },
+    'has-diabetes': {
+        'no': 'لا', 'yes': 'نعم'
     }
+}
 
-    # Mappings specific to professional tool - English versions
-    professional_mapping_en = {
-        'patient-gender': {
-            'male': 'Male', 'female': 'Female', '': 'Select'
-        },
-        'chief-complaint': {
-             'cardiac_arrest': 'Cardiac Arrest / VSA', 'resp_arrest': 'Respiratory Arrest',
-             'major_trauma': 'Major Trauma', 'chest_pain_cardiac': 'Chest Pain - Cardiac?',
-             'resp_distress_severe': 'Resp Distress - Severe', 'shock': 'Shock',
-             'loc_decreased': 'LOC Decreased', 'seizure_active': 'Seizure - Active',
-             'stroke': 'Stroke / CVA', 'anaphylaxis': 'Anaphylaxis',
-             'overdose': 'Overdose', 'sepsis': 'Sepsis',
-             'severe_pain': 'Severe Pain', 'resp_distress_moderate': 'Resp Distress - Moderate',
-             'abdominal_pain_severe': 'Abdominal Pain - Severe', 'head_injury_moderate': 'Head Injury - Moderate',
-             'vaginal_bleeding_heavy': 'Vaginal Bleeding - Heavy', 'fever_infant': 'Fever - Infant < 3mo',
-             'psych_severe': 'Psychiatric - Severe', 'minor_trauma': 'Minor Trauma',
-             'mild_pain': 'Mild Pain', 'vomiting_diarrhea_mild': 'Vomiting/Diarrhea - Mild',
-             'rash': 'Rash', 'other': 'Other - specify below', '': '-- Select Complaint --'
-        },
-        'respiratory-distress': {
-            'none': 'None', 'mild': 'Mild', 'moderate': 'Moderate', 'severe': 'Severe'
-        },
-        'bleeding': {
-            'none': 'None', 'minor': 'Minor', 'moderate': 'Moderate / Significant Controlled', 'severe': 'Severe / Uncontrolled'
-        },
-        'mechanism-injury': {
-            'none': 'None/NA', 'minor': 'Minor Mechanism', 'significant': 'Significant Mechanism - e.g., high fall/speed, rollover, penetrating', 'other': 'Other'
-        },
-        'dehydration': {
-             'none': 'None', 'mild': 'Mild - e.g., thirsty', 'moderate': 'Moderate - e.g., dry mucous membranes', 'severe': 'Severe - e.g., poor turgor, lethargy'
-        }
+# Mappings specific to professional tool - English versions
+PROFESSIONAL_LABELS_EN = {
+    'patient-gender': {
+        'male': 'Male', 'female': 'Female', '': 'Select'
+    },
+    'chief-complaint': {
+         'cardiac_arrest': 'Cardiac Arrest / VSA', 'resp_arrest': 'Respiratory Arrest',
+         'major_trauma': 'Major Trauma', 'chest_pain_cardiac': 'Chest Pain - Cardiac?',
+         'resp_distress_severe': 'Resp Distress - Severe', 'shock': 'Shock',
+         'loc_decreased': 'LOC Decreased', 'seizure_active': 'Seizure - Active',
+         'stroke': 'Stroke / CVA', 'anaphylaxis': 'Anaphylaxis',
+         'overdose': 'Overdose', 'sepsis': 'Sepsis',
+         'severe_pain': 'Severe Pain', 'resp_distress_moderate': 'Resp Distress - Moderate',
+         'abdominal_pain_severe': 'Abdominal Pain - Severe', 'head_injury_moderate': 'Head Injury - Moderate',
+         'vaginal_bleeding_heavy': 'Vaginal Bleeding - Heavy', 'fever_infant': 'Fever - Infant < 3mo',
+         'psych_severe': 'Psychiatric - Severe', 'minor_trauma': 'Minor Trauma',
+         'mild_pain': 'Mild Pain', 'vomiting_diarrhea_mild': 'Vomiting/Diarrhea - Mild',
+         'rash': 'Rash', 'other': 'Other - specify below', '': '-- Select Complaint --'
+    },
+    'respiratory-distress': {
+        'none': 'None', 'mild': 'Mild', 'moderate': 'Moderate', 'severe': 'Severe'
+    },
+    'bleeding': {
+        'none': 'None', 'minor': 'Minor', 'moderate': 'Moderate / Significant Controlled', 'severe': 'Severe / Uncontrolled'
+    },
+    'mechanism-injury': {
+        'none': 'None/NA', 'minor': 'Minor Mechanism', 'significant': 'Significant Mechanism - e.g., high fall/speed, rollover, penetrating', 'other': 'Other'
+    },
+    'dehydration': {
+         'none': 'None', 'mild': 'Mild - e.g., thirsty', 'moderate': 'Moderate - e.g., dry mucous membranes', 'severe': 'Severe - e.g., poor turgor, lethargy'
+    },
+    'heat-exposure': {
+        'no': 'No', 'yes': 'Yes'
+    },
+    'has-diabetes': {
+        'no': 'No', 'yes': 'Yes'
     }
+}
 
-    # Mappings specific to self-assessment tool - Arabic versions
-    self_assessment_mapping_ar = {
-        'patient-gender': {
-            'male': 'ذكر', 'female': 'أنثى', '': 'اختر'
-        },
-        'has-diabetes': {
-            'no': 'لا', 'yes': 'نعم', 'unsure': 'غير متأكد'
-        },
-        'main-symptom': {
-            'cannot_breathe': 'لا أستطيع التنفس / غصة شديدة',
-            'severe_chest_pain': 'ألم شديد أو ضغط في الصدر',
-            'severe_breathing_difficulty': 'صعوبة شديدة في التنفس',
-            'severe_bleeding': 'نزيف حاد لا يتوقف',
-            'not_responding': 'فقدان الوعي / صعوبة شديدة في الإفاقة',
-            'active_seizure': 'نوبة تشنج مستمرة الآن',
-            'stroke_signs': 'علامات جلطة دماغية (مثل: تدلي الوجه، ضعف ذراع، صعوبة كلام)',
-            'severe_allergic_reaction': 'رد فعل تحسسي شديد (تورم، صعوبة تنفس)',
-            'confusion_severe': 'تشوش ذهني حاد / ارتباك شديد',
-            'severe_pain_other': 'ألم شديد جداً (غير الصدر)',
-            'moderate_breathing_difficulty': 'صعوبة متوسطة في التنفس',
-            'poison_overdose': 'اشتباه تسمم أو جرعة زائدة',
-            'moderate_bleeding': 'نزيف متوسط (يحتاج ضغط)',
-            'fever_very_high': 'حمى شديدة جداً',
-            'severe_headache': 'صداع شديد جداً ومفاجئ',
-            'severe_abdominal_pain': 'ألم شديد في البطن',
-            'moderate_pain': 'ألم متوسط',
-            'mild_breathing_difficulty': 'صعوبة خفيفة في التنفس',
-            'vomiting_diarrhea': 'قيء أو إسهال',
-            'fever_mild_moderate': 'حمى خفيفة أو متوسطة',
-            'minor_injury': 'إصابة طفيفة',
-            'mild_pain_symptoms': 'ألم خفيف / أعراض خفيفة أخرى',
-            'other': 'شيء آخر',
-            '': '-- اختر العرض الأهم --'
-        },
-        'alertness': {
-            'A': 'طبيعي وواعي تماماً',
-            'V': 'أشعر بالنعاس أو الارتباك قليلاً',
-            'P': 'مرتبك جداً / يصعب إيقاظي',
-            'U': 'لا أستجيب / فاقد الوعي'
-        },
-        'breathing-difficulty': {
-            'none': 'لا توجد صعوبة', 'mild': 'صعوبة خفيفة',
-            'moderate': 'صعوبة متوسطة', 'severe': 'صعوبة شديدة',
-            'cannot_breathe': 'لا أستطيع التنفس'
-        },
-        'bleeding': {
-            'none': 'لا يوجد', 'minor': 'نزيف خفيف (يتوقف بسهولة)',
-            'moderate': 'نزيف متوسط (يحتاج ضغط)',
-            'severe': 'نزيف شديد (يصعب إيقافه)'
-        },
-        'dehydration': {
-            'none': 'لا', 'mild': 'قليلاً',
-            'moderate': 'نعم، بشكل متوسط', 'severe': 'نعم، بشكل شديد'
-        },
-        'feverish': {
-            'no': 'لا', 'yes_mild_mod': 'نعم، خفيفة أو متوسطة',
-            'yes_high': 'نعم، عالية', 'unsure': 'غير متأكد'
-        },
-        'trauma_occurred': {
-            'no': 'لا', 'yes_minor': 'نعم، إصابة بسيطة',
-            'yes_significant': 'نعم، حادث أو إصابة خطيرة'
-        }
+# Mappings specific to self-assessment tool - Arabic versions
+SELF_ASSESSMENT_LABELS_AR = {
+    'patient-gender': {
+        'male': 'ذكر', 'female': 'أنثى', '': 'اختر'
+    },
+    'has-diabetes': {
+        'no': 'لا', 'yes': 'نعم', 'unsure': 'غير متأكد'
+    },
+    'main-symptom': {
+        'cannot_breathe': 'لا أستطيع التنفس / غصة شديدة',
+        'severe_chest_pain': 'ألم شديد أو ضغط في الصدر',
+        'severe_breathing_difficulty': 'صعوبة شديدة في التنفس',
+        'severe_bleeding': 'نزيف حاد لا يتوقف',
+        'not_responding': 'فقدان الوعي / صعوبة شديدة في الإفاقة',
+        'active_seizure': 'نوبة تشنج مستمرة الآن',
+        'stroke_signs': 'علامات جلطة دماغية (مثل: تدلي الوجه، ضعف ذراع، صعوبة كلام)',
+        'severe_allergic_reaction': 'رد فعل تحسسي شديد (تورم، صعوبة تنفس)',
+        'confusion_severe': 'تشوش ذهني حاد / ارتباك شديد',
+        'severe_pain_other': 'ألم شديد جداً (غير الصدر)',
+        'moderate_breathing_difficulty': 'صعوبة متوسطة في التنفس',
+        'poison_overdose': 'اشتباه تسمم أو جرعة زائدة',
+        'moderate_bleeding': 'نزيف متوسط (يحتاج ضغط)',
+        'fever_very_high': 'حمى شديدة جداً',
+        'severe_headache': 'صداع شديد جداً ومفاجئ',
+        'severe_abdominal_pain': 'ألم شديد في البطن',
+        'moderate_pain': 'ألم متوسط',
+        'mild_breathing_difficulty': 'صعوبة خفيفة في التنفس',
+        'vomiting_diarrhea': 'قيء أو إسهال',
+        'fever_mild_moderate': 'حمى خفيفة أو متوسطة',
+        'minor_injury': 'إصابة طفيفة',
+        'mild_pain_symptoms': 'ألم خفيف / أعراض خفيفة أخرى',
+        'other': 'شيء آخر',
+        '': '-- اختر العرض الأهم --'
+    },
+    'alertness': {
+        'A': 'طبيعي وواعي تماماً',
+        'V': 'أشعر بالنعاس أو الارتباك قليلاً',
+        'P': 'مرتبك جداً / يصعب إيقاظي',
+        'U': 'لا أستجيب / فاقد الوعي'
+    },
+    'breathing-difficulty': {
+        'none': 'لا توجد صعوبة', 'mild': 'صعوبة خفيفة',
+        'moderate': 'صعوبة متوسطة', 'severe': 'صعوبة شديدة',
+        'cannot_breathe': 'لا أستطيع التنفس'
+    },
+    'bleeding': {
+        'none': 'لا يوجد', 'minor': 'نزيف خفيف (يتوقف بسهولة)',
+        'moderate': 'نزيف متوسط (يحتاج ضغط)',
+        'severe': 'نزيف شديد (يصعب إيقافه)'
+    },
+    'dehydration': {
+        'none': 'لا', 'mild': 'قليلاً',
+        'moderate': 'نعم، بشكل متوسط', 'severe': 'نعم، بشكل شديد'
+    },
+    'feverish': {
+        'no': 'لا', 'yes_mild_mod': 'نعم، خفيفة أو متوسطة',
+        'yes_high': 'نعم، عالية', 'unsure': 'غير متأكد'
+    },
+    'trauma_occurred': {
+        'no': 'لا', 'yes_minor': 'نعم، إصابة بسيطة',
+        'yes_significant': 'نعم، حادث أو إصابة خطيرة'
     }
+}
 
-    # Mappings specific to self-assessment tool - English versions
-    self_assessment_mapping_en = {
-        'patient-gender': {
-            'male': 'Male', 'female': 'Female', '': 'Select'
-        },
-        'has-diabetes': {
-            'no': 'No', 'yes': 'Yes', 'unsure': 'Unsure'
-        },
-        'main-symptom': {
-            'cannot_breathe': 'Cannot breathe / Severe choking',
-            'severe_chest_pain': 'Severe chest pain or pressure',
-            'severe_breathing_difficulty': 'Severe difficulty breathing',
-            'severe_bleeding': 'Severe bleeding that won\'t stop',
-            'not_responding': 'Unconscious / Very difficult to wake up',
-            'active_seizure': 'Ongoing seizure now',
-            'stroke_signs': 'Stroke signs',
-            'severe_allergic_reaction': 'Severe allergic reaction',
-            'confusion_severe': 'Severe confusion',
-            'severe_pain_other': 'Very severe pain - non-chest',
-            'moderate_breathing_difficulty': 'Moderate difficulty breathing',
-            'poison_overdose': 'Suspected poisoning or overdose',
-            'moderate_bleeding': 'Moderate bleeding - needs pressure',
-            'fever_very_high': 'Very high fever',
-            'severe_headache': 'Very severe, sudden headache',
-            'severe_abdominal_pain': 'Severe abdominal pain',
-            'moderate_pain': 'Moderate pain',
-            'mild_breathing_difficulty': 'Mild difficulty breathing',
-            'vomiting_diarrhea': 'Vomiting or diarrhea',
-            'fever_mild_moderate': 'Mild or moderate fever',
-            'minor_injury': 'Minor injury',
-            'mild_pain_symptoms': 'Mild pain / Other mild symptoms',
-            'other': 'Something else - describe below',
-            '': '-- Select Main Symptom --'
-        },
-        'alertness': {
-            'A': 'Fully awake and alert',
-            'V': 'Drowsy or a bit confused, but respond',
-            'P': 'Very confused / Difficult to wake up',
-            'U': 'Unresponsive / Unconscious'
-        },
-        'breathing-difficulty': {
-            'none': 'No trouble', 'mild': 'Mild trouble',
-            'moderate': 'Moderate trouble', 'severe': 'Severe trouble',
-            'cannot_breathe': 'Cannot breathe at all'
-        },
-        'bleeding': {
-            'none': 'None', 'minor': 'Minor - stops easily',
-            'moderate': 'Moderate - needs pressure',
-            'severe': 'Severe - hard to stop'
-        },
-        'dehydration': {
-            'none': 'No', 'mild': 'A little',
-            'moderate': 'Yes, moderately', 'severe': 'Yes, severely'
-        },
-        'feverish': {
-            'no': 'No', 'yes_mild_mod': 'Yes, mild/moderate',
-            'yes_high': 'Yes, high', 'unsure': 'Unsure'
-        },
-        'trauma_occurred': {
-            'no': 'No', 'yes_minor': 'Yes, minor injury',
-            'yes_significant': 'Yes, serious accident/injury'
-        }
+# Mappings specific to self-assessment tool - English versions
+SELF_ASSESSMENT_LABELS_EN = {
+    'patient-gender': {
+        'male': 'Male', 'female': 'Female', '': 'Select'
+    },
+    'has-diabetes': {
+        'no': 'No', 'yes': 'Yes', 'unsure': 'Unsure'
+    },
+    'main-symptom': {
+        'cannot_breathe': 'Cannot breathe / Severe choking',
+        'severe_chest_pain': 'Severe chest pain or pressure',
+        'severe_breathing_difficulty': 'Severe difficulty breathing',
+        'severe_bleeding': 'Severe bleeding that won\'t stop',
+        'not_responding': 'Unconscious / Very difficult to wake up',
+        'active_seizure': 'Ongoing seizure now',
+        'stroke_signs': 'Stroke signs',
+        'severe_allergic_reaction': 'Severe allergic reaction',
+        'confusion_severe': 'Severe confusion',
+        'severe_pain_other': 'Very severe pain - non-chest',
+        'moderate_breathing_difficulty': 'Moderate difficulty breathing',
+        'poison_overdose': 'Suspected poisoning or overdose',
+        'moderate_bleeding': 'Moderate bleeding - needs pressure',
+        'fever_very_high': 'Very high fever',
+        'severe_headache': 'Very severe, sudden headache',
+        'severe_abdominal_pain': 'Severe abdominal pain',
+        'moderate_pain': 'Moderate pain',
+        'mild_breathing_difficulty': 'Mild difficulty breathing',
+        'vomiting_diarrhea': 'Vomiting or diarrhea',
+        'fever_mild_moderate': 'Mild or moderate fever',
+        'minor_injury': 'Minor injury',
+        'mild_pain_symptoms': 'Mild pain / Other mild symptoms',
+        'other': 'Something else - describe below',
+        '': '-- Select Main Symptom --'
+    },
+    'alertness': {
+        'A': 'Fully awake and alert',
+        'V': 'Drowsy or a bit confused, but respond',
+        'P': 'Very confused / Difficult to wake up',
+        'U': 'Unresponsive / Unconscious'
+    },
+    'breathing-difficulty': {
+        'none': 'No trouble', 'mild': 'Mild trouble',
+        'moderate': 'Moderate trouble', 'severe': 'Severe trouble',
+        'cannot_breathe': 'Cannot breathe at all'
+    },
+    'bleeding': {
+        'none': 'None', 'minor': 'Minor - stops easily',
+        'moderate': 'Moderate - needs pressure',
+        'severe': 'Severe - hard to stop'
+    },
+    'dehydration': {
+        'none': 'No', 'mild': 'A little',
+        'moderate': 'Yes, moderately', 'severe': 'Yes, severely'
+    },
+    'feverish': {
+        'no': 'No', 'yes_mild_mod': 'Yes, mild/moderate',
+        'yes_high': 'Yes, high', 'unsure': 'Unsure'
+    },
+    'trauma_occurred': {
+        'no': 'No', 'yes_minor': 'Yes, minor injury',
+        'yes_significant': 'Yes, serious accident/injury'
     }
+}
 
-    # Select the correct mapping based on tool_type and language
-    if tool_type == 'professional':
-        mapping_to_use = professional_mapping_ar if lang == 'ar' else professional_mapping_en
-    else:
-        mapping_to_use = self_assessment_mapping_ar if lang == 'ar' else self_assessment_mapping_en
-    
-    return mapping_to_use.get(field_id, {}).get(value, value) # Return original value if not found
+LABELS = {
+    ('professional', 'ar'): PROFESSIONAL_LABELS_AR,
+    ('professional', 'en'): PROFESSIONAL_LABELS_EN,
+    ('self_assessment', 'ar'): SELF_ASSESSMENT_LABELS_AR,
+    ('self_assessment', 'en'): SELF_ASSESSMENT_LABELS_EN,
+}
+
+# Flattened (tool, lang, field, value) -> text index, so a lookup is one dict access
+LABEL_CATALOG = {
+    (tool, lang, field, value): text
+    for (tool, lang), fields in LABELS.items()
+    for field, values in fields.items()
+    for value, text in values.items()
+}
+
+WAIT_TIME_LABELS = {
+    'ar': {
+        1: "فوري",
+        2: "≤ 15 دقيقة",
+        3: "≤ 30 دقيقة",
+        4: "≤ 60 دقيقة",
+        5: "≤ 120 دقيقة"
+    },
+    'en': {
+        1: "Immediate",
+        2: "≤ 15 minutes",
+        3: "≤ 30 minutes",
+        4: "≤ 60 minutes",
+        5: "≤ 120 minutes"
+    },
+}
+
+# Recommendation shown with a self-assessment result, per language and CTAS level
+RECOMMENDATION_HTML = {
+    'ar': {
+        1: """
+            <div class="bg-red-100 border-l-4 border-red-500 text-red-700 p-4 rounded-md">
+                <p class="font-bold text-lg">🚨 CTAS I - حالة طارئة</p>
+                <p>هذه الأعراض تشير إلى حالة طبية طارئة تتطلب رعاية فورية.</p>
+                <p class="font-bold mt-2">يجب تقييم المريض فوراً من قبل الطبيب - أولوية قصوى</p>
+            </div>
+            """,
+        2: """
+            <div class="bg-orange-100 border-l-4 border-orange-500 text-orange-700 p-4 rounded-md">
+                <p class="font-bold text-lg">⚠️ CTAS II - حالة عاجلة</p>
+                <p>هذه الأعراض تشير إلى حالة طبية عاجلة تتطلب تقييم سريع.</p>
+                <p class="font-bold mt-2">يجب رؤية الطبيب خلال 15 دقيقة</p>
+            </div>
+            """,
+        3: """
+            <div class="bg-amber-100 border-l-4 border-amber-500 text-amber-700 p-4 rounded-md">
+                <p class="font-bold text-lg">⚠️ CTAS III - حالة مستعجلة</p>
+                <p>هذه الأعراض تشير إلى حالة تتطلب تقييم طبي خلال 30 دقيقة.</p>
+                <p class="font-bold mt-2">يرجى الانتظار في منطقة الانتظار - ستتم رؤية المريض قريباً</p>
+            </div>
+            """,
+        4: """
+            <div class="bg-green-100 border-l-4 border-green-500 text-green-700 p-4 rounded-md">
+                <p class="font-bold text-lg">ℹ️ CTAS IV - أقل استعجالاً</p>
+                <p>هذه الأعراض تشير إلى حالة تتطلب تقييم طبي خلال 60 دقيقة.</p>
+                <p class="font-bold mt-2">يرجى الانتظار - الوقت المتوقع للانتظار أقل من ساعة</p>
+            </div>
+            """,
+        5: """
+            <div class="bg-blue-100 border-l-4 border-blue-500 text-blue-700 p-4 rounded-md">
+                <p class="font-bold text-lg">ℹ️ CTAS V - غير عاجل</p>
+                <p>هذه الأعراض لا تشير إلى حالة طارئة في الوقت الحالي.</p>
+                <p class="font-bold mt-2">يرجى الانتظار - الوقت المتوقع للانتظار أقل من ساعتين</p>
+            </div>
+            """,
+    },
+    'en': {
+        1: """
+            <div class="bg-red-100 border-l-4 border-red-500 text-red-700 p-4 rounded-md">
+                <p class="font-bold text-lg">🚨 CTAS I - Resuscitation</p>
+                <p>These symptoms indicate a medical emergency requiring immediate care.</p>
+                <p class="font-bold mt-2">Patient requires immediate physician assessment - highest priority</p>
+            </div>
+            """,
+        2: """
+            <div class="bg-orange-100 border-l-4 border-orange-500 text-orange-700 p-4 rounded-md">
+                <p class="font-bold text-lg">⚠️ CTAS II - Emergent</p>
+                <p>These symptoms indicate an urgent medical condition requiring prompt care.</p>
+                <p class="font-bold mt-2">Patient should be seen by physician within 15 minutes</p>
+            </div>
+            """,
+        3: """
+            <div class="bg-amber-100 border-l-4 border-amber-500 text-amber-700 p-4 rounded-md">
+                <p class="font-bold text-lg">⚠️ CTAS III - Urgent</p>
+                <p>These symptoms indicate a condition requiring medical assessment within 30 minutes.</p>
+                <p class="font-bold mt-2">Please wait in waiting area - patient will be seen soon</p>
+            </div>
+            """,
+        4: """
+            <div class="bg-green-100 border-l-4 border-green-500 text-green-700 p-4 rounded-md">
+                <p class="font-bold text-lg">ℹ️ CTAS IV - Less Urgent</p>
+                <p>These symptoms indicate a condition requiring medical assessment within 60 minutes.</p>
+                <p class="font-bold mt-2">Please wait - expected wait time less than one hour</p>
+            </div>
+            """,
+        5: """
+            <div class="bg-blue-100 border-l-4 border-blue-500 text-blue-700 p-4 rounded-md">
+                <p class="font-bold text-lg">ℹ️ CTAS V - Non-Urgent</p>
+                <p>These symptoms do not indicate an emergency at this time.</p>
+                <p class="font-bold mt-2">Please wait - expected wait time less than two hours</p>
+            </div>
+            """,
+    },
+}
+
+def get_text_from_value(field_id, value, tool_type='professional', lang='ar'):
+    """Gets text representation for select/radio values from different forms."""
+    tool = 'professional' if tool_type == 'professional' else 'self_assessment'
+    return LABEL_CATALOG.get((tool, 'ar' if lang == 'ar' else 'en', field_id, value), value)  # Return original value if not found
+
+def get_label_options(field_id, tool_type='professional', lang='ar'):
+    """(value, text) pairs for a select field, without the empty placeholder."""
+    tool = 'professional' if tool_type == 'professional' else 'self_assessment'
+    values = LABELS[(tool, 'ar' if lang == 'ar' else 'en')].get(field_id, {})
+    return [(value, text) for value, text in values.items() if value != '']
+
+@app.context_processor
+def inject_label_catalog():
+    return {'label': get_text_from_value, 'label_options': get_label_options}
+
+def asset_url(name):
+    """URL of a built bundle (e.g. 'app.css'), or None when the assets have not been built."""
+    filename = asset_manifest.get(name)
+    return url_for('static', filename=f'dist/{filename}') if filename else None
+
+@app.context_processor
+def inject_asset_url():
+    return {'asset_url': asset_url}
+
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    """Serve a fingerprinted bundle with immutable caching, pre-compressed when possible."""
+    encoding, suffix = pick_variant(ASSET_DIST_DIR, filename, request.accept_encodings)
+    response = send_from_directory(ASSET_DIST_DIR, filename + suffix,
+                                   mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+def render_page_shell(template, lang):
+    with app.test_request_context():
+        return render_template(template, lang=lang)
+
+page_shells = PageShellCache(render_page_shell)
+
+def serve_page_shell(template, lang):
+    """Serve a pre-rendered page, compressed if the browser accepts it, or 304 if unchanged."""
+    shell = page_shells.get(template, lang)
+    encoding = shell.negotiate(request.accept_encodings)
+    response = app.response_class(shell.variants[encoding], mimetype='text/html')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(shell.etags[encoding])
+    response.headers['Cache-Control'] = f'public, max-age={PAGE_MAX_AGE}' if PAGE_MAX_AGE else PAGE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+def request_language():
+    """Language of this request: a supported ?lang=, else the best Accept-Language match."""
+    lang = request.args.get('lang')
+    if lang in SUPPORTED_LANGUAGES:
+        return lang
+    return request.accept_languages.best_match(SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE)
+
+# Pages live under a language prefix (/ar/, /en/reference, ...), so every URL
+# has exactly one rendering and shared caches can store it. Unprefixed URLs
+# redirect to the browser's language.
+LANGUAGE_PREFIX = f"/<any({', '.join(SUPPORTED_LANGUAGES)}):lang>"
+
+def redirect_to_language(path):
+    response = redirect(f'/{request_language()}{path}')
+    response.vary.add('Accept-Language')
+    return response
 
 @app.route('/')
-def index():
-    # Get language preference from session or default
-    lang = session.get('language', DEFAULT_LANGUAGE)
-    return render_template('professional_triage.html', lang=lang)
+def index_redirect():
+    return redirect_to_language('/')
 
 @app.route('/reference')
-def reference_page():
-    """Serves the vital sign reference page."""
-    lang = session.get('language', DEFAULT_LANGUAGE)
-    return render_template('reference.html', lang=lang)
+def reference_redirect():
+    return redirect_to_language('/reference')
 
 @app.route('/self_diagnosis')
-def self_diagnosis_page():
-    """Serves the patient self-diagnosis page."""
-    lang = session.get('language', DEFAULT_LANGUAGE)
-    return render_template('self_assessment.html', lang=lang)
+def self_diagnosis_redirect():
+    return redirect_to_language('/self_diagnosis')
 
-@app.route('/set_language', methods=['POST'])
-def set_language():
-    """Set user's language preference."""
-    lang = request.json.get('language', DEFAULT_LANGUAGE)
-    if lang in SUPPORTED_LANGUAGES:
-        session['language'] = lang
-        return jsonify({'status': 'success', 'language': lang})
-    return jsonify({'status': 'error', 'message': 'Unsupported language'}), 400
+@app.route(f'{LANGUAGE_PREFIX}/')
+def index(lang):
+    return serve_page_shell('professional_triage.html', lang)
+
+@app.route(f'{LANGUAGE_PREFIX}/reference')
+def reference_page(lang):
+    """Serves the vital sign reference page."""
+    return serve_page_shell('reference.html', lang)
+
+@app.route(f'{LANGUAGE_PREFIX}/self_diagnosis')
+def self_diagnosis_page(lang):
+    """Serves the patient self-diagnosis page."""
+    return serve_page_shell('self_assessment.html', lang)
 
 class CTASError(Exception):
     """Base class for CTAS-specific errors."""
@@ -540,11 +1412,73 @@ class DataMissingError(CTASError):
     """Error for missing required clinical data."""
     pass
 
+class AuthorizationError(CTASError):
+    """Error for a request without the credential an endpoint requires."""
+    pass
+
+# Localized error messages and status codes for CTAS errors: (ar, en, status)
+CTAS_ERROR_RESPONSES = {
+    DataMissingError: ('بيانات مطلوبة مفقودة', 'Required data missing', 400),
+    ValidationError: ('خطأ في التحقق من البيانات', 'Data validation error', 400),
+    CalculationError: ('خطأ في حساب مستوى الفرز', 'Triage calculation error', 500),
+    AuthorizationError: ('غير مصرح بالوصول', 'Not authorized', 401),
+}
+
+def count_ctas_error(e):
+    """Count a CTASError where a route handles it (constructing one counts nothing)."""
+    metrics.CTAS_ERRORS.labels(type(e).__name__, e.error_code).inc()
+
+def log_ctas_error(e, status):
+    """Log a CTASError a route is answering with `status`, and count it."""
+    count_ctas_error(e)
+    if status >= 500:
+        app.logger.error(f"{type(e).__name__}: {e.error_code} - {e.message}")
+    else:
+        app.logger.warning(f"{type(e).__name__}: {e.error_code} - {e.message}")
+
+def ctas_error_response(e, lang):
+    """Build the JSON error response for a CTASError, logging it like the triage routes do."""
+    message_ar, message_en, status = CTAS_ERROR_RESPONSES.get(
+        type(e), ('حدث خطأ غير متوقع', 'An unexpected error occurred', 500)
+    )
+    log_ctas_error(e, status)
+    return jsonify({
+        'error': message_ar if lang == 'ar' else message_en,
+        'error_code': e.error_code,
+        'details': e.details
+    }), status
+
+def record_assessment(kind, data, ctas_level, reassessment_interval, lang, reasons=None):
+    """Queue an assessment for the history store and the live board; returns its id (or None if disabled).
+
+    `reasons` is the bitmask from evaluate_ctas_rules; it is counted per rule
+    and stored with the assessment.
+    """
+    metrics.TRIAGE_LEVELS.labels(kind, str(ctas_level)).inc()
+    if reasons is not None:
+        metrics.observe_reasons(ctas_reason_names(reasons))
+    facility = data.get('facility') or FACILITY_ID
+    assessment_id = None
+    if assessment_store is not None:
+        assessment_id = assessment_store.record(
+            kind, data, ctas_level, reassessment_interval, lang, facility, reasons
+        )
+        if assessment_id is None:
+            metrics.ASSESSMENTS_DROPPED.inc()
+    if board_events is not None:
+        board_events.publish(facility, 'assessment', {
+            'assessment_id': assessment_id,
+            'kind': kind,
+            'level': ctas_level,
+            'interval': reassessment_interval,
+        })
+    return assessment_id
+
 @app.route('/calculate_ctas', methods=['POST'])
 def calculate_ctas_route():
     try:
         data = request.form.to_dict()
-        lang = session.get('language', DEFAULT_LANGUAGE)
+        lang = request_language()
         
         # Validate required fields
         if not data.get('patient_age'):
@@ -561,18 +1495,18 @@ def calculate_ctas_route():
                 {'field': 'chief_complaint'}
             )
         
-        # Validate medical ranges
-        validation_warnings = validate_medical_ranges(data)
-        
-        # Calculate CTAS level
+        # Parse, validate medical ranges and calculate the CTAS level
         try:
-            ctas_level, reassessment_interval = calculate_ctas_logic(data)
+            inputs = parse_triage_input(data)
+            ctas_level, reassessment_interval, reasons = cached_ctas_logic(data, inputs)
         except Exception as calc_error:
             raise CalculationError(
                 'CALCULATION_FAILED',
                 'Failed to calculate CTAS level',
                 {'original_error': str(calc_error)}
             )
+        validation_warnings = inputs.warnings
+        metrics.observe_validation(validation_warnings)
 
         # Prepare summary data for JSON response
         summary_data = {
@@ -596,11 +1530,16 @@ def calculate_ctas_route():
             'reassessment_interval': reassessment_interval,
             'wait_time_estimate': get_wait_time_estimate(ctas_level, lang),
             'lang': lang,
-            'validation_warnings': validation_warnings  # Include validation warnings
+            'validation_warnings': validation_warnings,  # Include validation warnings
+            'reasons': ctas_reason_names(reasons)
         }
+        summary_data['assessment_id'] = record_assessment(
+            'professional', data, ctas_level, reassessment_interval, lang, reasons
+        )
         return jsonify(summary_data)
         
     except DataMissingError as e:
+        count_ctas_error(e)
         app.logger.warning(f"Missing required data: {e.error_code} - {e.message}")
         error_msg = 'بيانات مطلوبة مفقودة' if lang == 'ar' else 'Required data missing'
         return jsonify({
@@ -610,6 +1549,7 @@ def calculate_ctas_route():
         }), 400
         
     except ValidationError as e:
+        count_ctas_error(e)
         app.logger.warning(f"Validation error: {e.error_code} - {e.message}")
         error_msg = 'خطأ في التحقق من البيانات' if lang == 'ar' else 'Data validation error'
         return jsonify({
@@ -619,6 +1559,7 @@ def calculate_ctas_route():
         }), 400
         
     except CalculationError as e:
+        count_ctas_error(e)
         app.logger.error(f"Calculation error: {e.error_code} - {e.message}")
         error_msg = 'خطأ في حساب مستوى الفرز' if lang == 'ar' else 'Triage calculation error'
         return jsonify({
@@ -636,33 +1577,296 @@ def calculate_ctas_route():
             'details': {'message': str(e)}
         }), 500
 
+@app.route('/calculate_ctas_batch', methods=['POST'])
+def calculate_ctas_batch_route():
+    """Triage many patients in one request.
+
+    Accepts JSON with either "records" (a list of form-style dicts) or
+    "columns" (a dict of equal-length field lists). A bare list is read as
+    records.
+    """
+    lang = request_language()
+    try:
+        payload = request.get_json(silent=True) or {}
+        if isinstance(payload, list):
+            records = payload
+        elif isinstance(payload, dict):
+            records = payload.get('records') if 'records' in payload else payload.get('columns')
+        else:
+            records = None
+
+        if isinstance(records, list):
+            if not all(isinstance(record, dict) for record in records):
+                raise ValidationError('INVALID_BATCH', 'Every record must be an object')
+            count = len(records)
+        elif isinstance(records, dict):
+            lengths = {len(column) if isinstance(column, list) else -1 for column in records.values()}
+            if len(lengths) > 1 or -1 in lengths:
+                raise ValidationError('INVALID_BATCH', 'Columns must be lists of equal length')
+            count = lengths.pop() if lengths else 0
+        else:
+            raise DataMissingError(
+                'MISSING_RECORDS',
+                'A "records" list or "columns" object is required',
+                {'field': 'records'}
+            )
+
+        if count > BATCH_MAX_RECORDS:
+            raise ValidationError(
+                'BATCH_TOO_LARGE',
+                'Too many records in one batch',
+                {'count': count, 'max_records': BATCH_MAX_RECORDS}
+            )
+
+        try:
+            ctas_levels, reassessment_intervals = calculate_ctas_batch(records)
+        except Exception as calc_error:
+            raise CalculationError(
+                'CALCULATION_FAILED',
+                'Failed to calculate CTAS levels',
+                {'original_error': str(calc_error)}
+            )
+
+        for level, level_count in zip(*np.unique(ctas_levels, return_counts=True)):
+            metrics.TRIAGE_LEVELS.labels('batch', str(level)).inc(int(level_count))
+        return jsonify({
+            'count': count,
+            'ctas_levels': ctas_levels.tolist(),
+            'reassessment_intervals': reassessment_intervals.tolist()
+        })
+
+    except DataMissingError as e:
+        count_ctas_error(e)
+        app.logger.warning(f"Missing required data: {e.error_code} - {e.message}")
+        error_msg = 'بيانات مطلوبة مفقودة' if lang == 'ar' else 'Required data missing'
+        return jsonify({
+            'error': error_msg,
+            'error_code': e.error_code,
+            'details': e.details
+        }), 400
+
+    except ValidationError as e:
+        count_ctas_error(e)
+        app.logger.warning(f"Validation error: {e.error_code} - {e.message}")
+        error_msg = 'خطأ في التحقق من البيانات' if lang == 'ar' else 'Data validation error'
+        return jsonify({
+            'error': error_msg,
+            'error_code': e.error_code,
+            'details': e.details
+        }), 400
+
+    except CalculationError as e:
+        count_ctas_error(e)
+        app.logger.error(f"Calculation error: {e.error_code} - {e.message}")
+        error_msg = 'خطأ في حساب مستوى الفرز' if lang == 'ar' else 'Triage calculation error'
+        return jsonify({
+            'error': error_msg,
+            'error_code': e.error_code,
+            'details': e.details
+        }), 500
+
+# --- API v2 for machine clients (EHR integration, kiosks) ---
+# Takes a JSON object, or MessagePack when the msgpack package is installed,
+# and answers with codes only: level, interval, warning codes and rule
+# identifiers. Clients localize them; nothing depends on the request language.
+API_V2_KINDS = ('professional', 'self_assessment')
+API_V2_SCALAR_TYPES = (str, int, float, bool, type(None))
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+def range_warning_codes(warnings):
+    """validate_medical_ranges warnings as codes, e.g. 'HEART_RATE_HIGH' or 'SPO2_LOW'."""
+    return [
+        f"{w['field'].upper()}_{'LOW' if w['value'] < MEDICAL_RANGES[w['field']]['min'] else 'HIGH'}"
+        for w in warnings
+    ]
+
+def api_v2_request_body():
+    """Decode the request body as MessagePack or JSON; None if it cannot be decoded."""
+    if request.mimetype in MSGPACK_MIMETYPES:
+        if msgpack is None:
+            raise ValidationError('UNSUPPORTED_MEDIA_TYPE', 'MessagePack is not available on this server',
+                                  {'content_type': request.mimetype})
+        try:
+            return msgpack.unpackb(request.get_data(), raw=False)
+        except Exception:
+            return None
+    return request.get_json(silent=True)
+
+def api_v2_response(payload, status=200):
+    """Encode payload as MessagePack when the client prefers it, otherwise JSON."""
+    if msgpack is not None and request.accept_mimetypes.best_match(
+            ('application/json',) + MSGPACK_MIMETYPES) in MSGPACK_MIMETYPES:
+        response = Response(msgpack.packb(payload), status=status, mimetype='application/msgpack')
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    response.vary.add('Accept')
+    return response
+
+@app.route('/api/v2/triage', methods=['POST'])
+def api_v2_triage_route():
+    """Triage one patient and return compact, code-based results.
+
+    The body holds the same field names as the triage forms, plus "kind"
+    ("professional" by default, or "self_assessment").
+    """
+    try:
+        data = api_v2_request_body()
+        if not isinstance(data, dict):
+            raise DataMissingError('MISSING_BODY', 'A JSON or MessagePack object with the triage fields is required')
+        invalid = [str(field) for field, value in data.items()
+                   if not isinstance(field, str) or not isinstance(value, API_V2_SCALAR_TYPES)]
+        if invalid:
+            raise ValidationError('INVALID_FIELD_TYPE', 'Fields must be strings, numbers, booleans or null',
+                                  {'fields': invalid})
+
+        kind = data.get('kind', 'professional')
+        if kind not in API_V2_KINDS:
+            raise ValidationError('INVALID_KIND', 'Unknown assessment kind',
+                                  {'field': 'kind', 'allowed': list(API_V2_KINDS)})
+        if kind == 'self_assessment':
+            data = normalize_self_assessment(data)
+        else:
+            if not data.get('patient_age'):
+                raise DataMissingError('MISSING_AGE', 'Patient age is required for triage calculation',
+                                       {'field': 'patient_age'})
+            if not data.get('chief_complaint'):
+                raise DataMissingError('MISSING_COMPLAINT', 'Chief complaint is required for triage calculation',
+                                       {'field': 'chief_complaint'})
+
+        try:
+            inputs = parse_triage_input(data)
+            ctas_level, reassessment_interval, reasons = evaluate_ctas_rules(inputs)
+        except Exception as calc_error:
+            raise CalculationError(
+                'CALCULATION_FAILED',
+                'Failed to calculate CTAS level',
+                {'original_error': str(calc_error)}
+            )
+        validation_warnings = inputs.warnings
+        metrics.observe_validation(validation_warnings)
+
+        return api_v2_response({
+            'level': ctas_level,
+            'interval': reassessment_interval,
+            'warnings': range_warning_codes(validation_warnings),
+            'rules': ctas_reason_names(reasons),
+            'reasons': reasons,
+            'assessment_id': record_assessment(kind, data, ctas_level, reassessment_interval, None, reasons),
+        })
+
+    except CTASError as e:
+        status = CTAS_ERROR_RESPONSES.get(type(e), (None, None, 500))[2]
+        log_ctas_error(e, status)
+        return api_v2_response({'error_code': e.error_code, 'details': e.details}, status)
+
+    except Exception as e:
+        app.logger.error(f"Unexpected error in api_v2_triage: {str(e)}")
+        return api_v2_response({'error_code': 'SYSTEM_ERROR', 'details': {'message': str(e)}}, 500)
+
+# --- Mass-casualty intake ---
+# One request carries a whole incident's patients (from field teams' tablets);
+# results stream back as NDJSON, one line per patient as it is triaged, then a
+# summary line. A bad record gets an error line and does not stop the rest.
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+def incident_records():
+    """Patient records from an NDJSON body, a JSON list or {"records": [...]}; None if absent."""
+    if request.mimetype in NDJSON_MIMETYPES:
+        records = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                raise ValidationError('INVALID_NDJSON', 'Every line must be a JSON object', {'line': number})
+        return records
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('records')
+    return payload if isinstance(payload, list) else None
+
+def triage_incident_record(index, data, lang):
+    """Triage one incident record into its compact NDJSON result."""
+    result = {'index': index}
+    try:
+        if not isinstance(data, dict):
+            raise ValidationError('INVALID_RECORD', 'Every record must be an object')
+        if data.get('patient_id'):
+            result['patient_id'] = data['patient_id']
+        if not data.get('patient_age'):
+            raise DataMissingError('MISSING_AGE', 'Patient age is required for triage calculation',
+                                   {'field': 'patient_age'})
+        if not data.get('chief_complaint'):
+            raise DataMissingError('MISSING_COMPLAINT', 'Chief complaint is required for triage calculation',
+                                   {'field': 'chief_complaint'})
+        try:
+            inputs = parse_triage_input(data)
+            ctas_level, reassessment_interval, reasons = evaluate_ctas_rules(inputs)
+        except Exception as calc_error:
+            raise CalculationError(
+                'CALCULATION_FAILED',
+                'Failed to calculate CTAS level',
+                {'original_error': str(calc_error)}
+            )
+    except CTASError as e:
+        log_ctas_error(e, CTAS_ERROR_RESPONSES.get(type(e), (None, None, 500))[2])
+        result['error_code'] = e.error_code
+        result['details'] = e.details
+        return result
+
+    validation_warnings = inputs.warnings
+    metrics.observe_validation(validation_warnings)
+    result['level'] = ctas_level
+    result['interval'] = reassessment_interval
+    result['warnings'] = range_warning_codes(validation_warnings)
+    result['assessment_id'] = record_assessment('professional', data, ctas_level, reassessment_interval, lang, reasons)
+    return result
+
+@app.route('/incident/intake', methods=['POST'])
+def incident_intake_route():
+    """Triage a mass-casualty incident's patients in one request, streaming NDJSON results."""
+    lang = request_language()
+    try:
+        records = incident_records()
+        if records is None:
+            raise DataMissingError(
+                'MISSING_RECORDS',
+                'An NDJSON body, a JSON list or a "records" list is required',
+                {'field': 'records'}
+            )
+        if len(records) > INCIDENT_MAX_RECORDS:
+            raise ValidationError(
+                'BATCH_TOO_LARGE',
+                'Too many records in one incident intake',
+                {'count': len(records), 'max_records': INCIDENT_MAX_RECORDS}
+            )
+    except CTASError as e:
+        return ctas_error_response(e, lang)
+
+    def generate():
+        levels = dict.fromkeys(range(1, 6), 0)
+        errors = 0
+        for index, data in enumerate(records):
+            result = triage_incident_record(index, data, lang)
+            if 'level' in result:
+                levels[result['level']] += 1
+            else:
+                errors += 1
+            yield json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        summary = {'count': len(records), 'triaged': len(records) - errors, 'errors': errors, 'levels': levels}
+        yield json.dumps({'summary': summary}, separators=(',', ':')).encode('utf-8') + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 def get_wait_time_estimate(ctas_level, lang='ar'):
     """Get estimated wait time based on CTAS level."""
-    wait_times_ar = {
-        1: "فوري",
-        2: "≤ 15 دقيقة",
-        3: "≤ 30 دقيقة",
-        4: "≤ 60 دقيقة",
-        5: "≤ 120 دقيقة"
-    }
-    wait_times_en = {
-        1: "Immediate",
-        2: "≤ 15 minutes",
-        3: "≤ 30 minutes",
-        4: "≤ 60 minutes",
-        5: "≤ 120 minutes"
-    }
-    wait_times = wait_times_ar if lang == 'ar' else wait_times_en
-    return wait_times.get(ctas_level, "N/A")
-
-@app.route('/download_csv', methods=['POST'])
-def download_csv_route():
-    data = request.form.to_dict()
-    ctas_level, _ = calculate_ctas_logic(data)
-    lang = session.get('language', DEFAULT_LANGUAGE)
+    return WAIT_TIME_LABELS['ar' if lang == 'ar' else 'en'].get(ctas_level, "N/A")
 
-    # Prepare data for CSV, getting text values
-    csv_data = {
+def build_professional_csv_row(data, ctas_level, lang='ar'):
+    """Prepare one professional assessment for CSV export, getting text values."""
+    return {
         'Patient Name': data.get('patient_name', ''),
         'Age': data.get('patient_age', ''),
         'Gender': get_text_from_value('patient-gender', data.get('patient_gender'), 'professional', lang),
@@ -686,6 +1890,14 @@ def download_csv_route():
         'CTAS Level (Preliminary)': ctas_level
     }
 
+@app.route('/download_csv', methods=['POST'])
+def download_csv_route():
+    data = request.form.to_dict()
+    ctas_level, _, _ = cached_ctas_logic(data)
+    lang = request_language()
+
+    csv_data = build_professional_csv_row(data, ctas_level, lang)
+
     # Define CSV headers based on the keys prepared above
     csv_headers = list(csv_data.keys())
     csv_data_row = [csv_data[header] for header in csv_headers]
@@ -721,50 +1933,62 @@ def download_csv_route():
         }
     )
 
+# Self-assessment answers -> the professional fields the CTAS rules read.
+# Built once; normalize_self_assessment applies them in one pass before the
+# level is calculated, so every self-assessment route evaluates the same data.
+SELF_ASSESSMENT_COMPLAINTS = {
+    'severe_chest_pain': 'chest_pain_cardiac',
+    'active_seizure': 'seizure_active',
+    'stroke_signs': 'stroke',
+    'severe_allergic_reaction': 'anaphylaxis',
+    'poison_overdose': 'overdose',
+    'severe_pain_other': 'severe_pain',
+    'severe_abdominal_pain': 'abdominal_pain_severe',
+    'minor_injury': 'minor_trauma',
+}
+SELF_ASSESSMENT_RESPIRATORY = {
+    'cannot_breathe': 'severe',
+    'severe_breathing_difficulty': 'severe',
+    'moderate_breathing_difficulty': 'moderate',
+    'mild_breathing_difficulty': 'mild',
+}
+BREATHING_DIFFICULTY_RESPIRATORY = {'moderate': 'moderate', 'mild': 'mild'}
+# Most severe first; the main symptom and the breathing answer can both raise it
+RESPIRATORY_SEVERITY = ('severe', 'moderate', 'mild', 'none')
+
+def normalize_self_assessment(data):
+    """Copy of a self-assessment with chief_complaint, respiratory_distress and avpu derived from the answers."""
+    data = dict(data)
+    main_symptom = data.get('main_symptom', '')
+    respiratory = min(
+        SELF_ASSESSMENT_RESPIRATORY.get(main_symptom, 'none'),
+        BREATHING_DIFFICULTY_RESPIRATORY.get(data.get('breathing_difficulty', 'none'), 'none'),
+        key=RESPIRATORY_SEVERITY.index,
+    )
+    data['respiratory_distress'] = respiratory
+    data['avpu'] = data.get('alertness', 'A')
+    complaint = SELF_ASSESSMENT_COMPLAINTS.get(main_symptom)
+    if complaint:
+        data['chief_complaint'] = complaint
+    return data
+
+def assess_self_assessment(form):
+    """(normalized data, level, interval, reasons) for a submitted self-assessment.
+
+    The JSON summary and the CSV export both go through here, so they show
+    the same level; the second one is served from the triage cache.
+    """
+    data = normalize_self_assessment(form)
+    ctas_level, reassessment_interval, reasons = cached_ctas_logic(data)
+    return data, ctas_level, reassessment_interval, reasons
+
 # Add routes for self-assessment functionality
 @app.route('/calculate_self_assessment', methods=['POST'])
 def calculate_self_assessment_route():
-    data = request.form.to_dict()
-    lang = session.get('language', DEFAULT_LANGUAGE)
-    
-    # Calculate CTAS level using the same logic
-    ctas_level, _ = calculate_ctas_logic(data)
-    
-    # Map the main symptom to a recognizable chief complaint for the CTAS algorithm
+    data, ctas_level, reassessment_interval, reasons = assess_self_assessment(request.form.to_dict())
+    lang = request_language()
     main_symptom = data.get('main_symptom', '')
-    breathing_difficulty = data.get('breathing_difficulty', 'none')
-    
-    # Add derived fields that CTAS logic expects
-    if main_symptom in ['cannot_breathe', 'severe_breathing_difficulty']:
-        data['respiratory_distress'] = 'severe'
-    elif main_symptom == 'moderate_breathing_difficulty' or breathing_difficulty == 'moderate':
-        data['respiratory_distress'] = 'moderate'
-    elif main_symptom == 'mild_breathing_difficulty' or breathing_difficulty == 'mild':
-        data['respiratory_distress'] = 'mild'
-    else:
-        data['respiratory_distress'] = 'none'
-        
-    # Map alertness to AVPU
-    data['avpu'] = data.get('alertness', 'A')
-    
-    # Map severe symptoms to chief complaints
-    if main_symptom in ['severe_chest_pain']:
-        data['chief_complaint'] = 'chest_pain_cardiac'
-    elif main_symptom in ['active_seizure']:
-        data['chief_complaint'] = 'seizure_active'
-    elif main_symptom in ['stroke_signs']:
-        data['chief_complaint'] = 'stroke'
-    elif main_symptom in ['severe_allergic_reaction']:
-        data['chief_complaint'] = 'anaphylaxis'
-    elif main_symptom in ['poison_overdose']:
-        data['chief_complaint'] = 'overdose'
-    elif main_symptom in ['severe_pain_other']:
-        data['chief_complaint'] = 'severe_pain'
-    elif main_symptom in ['severe_abdominal_pain']:
-        data['chief_complaint'] = 'abdominal_pain_severe'
-    elif main_symptom in ['minor_injury']:
-        data['chief_complaint'] = 'minor_trauma'
-        
+
     # Calculate recommendations based on CTAS level
     recommendation_html = generate_recommendation(ctas_level, main_symptom, lang)
     
@@ -787,106 +2011,20 @@ def calculate_self_assessment_route():
         'recommendation': recommendation_html,
         'lang': lang
     }
+    summary_data['assessment_id'] = record_assessment(
+        'self_assessment', data, ctas_level, reassessment_interval, lang, reasons
+    )
     
     return jsonify(summary_data)
 
 def generate_recommendation(ctas_level, main_symptom, lang='ar'):
     """Generate HTML recommendation based on CTAS level and symptoms for healthcare center use."""
-    
-    if lang == 'ar':
-        if ctas_level == 1:
-            return """
-            <div class="bg-red-100 border-l-4 border-red-500 text-red-700 p-4 rounded-md">
-                <p class="font-bold text-lg">🚨 CTAS I - حالة طارئة</p>
-                <p>هذه الأعراض تشير إلى حالة طبية طارئة تتطلب رعاية فورية.</p>
-                <p class="font-bold mt-2">يجب تقييم المريض فوراً من قبل الطبيب - أولوية قصوى</p>
-            </div>
-            """
-        elif ctas_level == 2:
-            return """
-            <div class="bg-orange-100 border-l-4 border-orange-500 text-orange-700 p-4 rounded-md">
-                <p class="font-bold text-lg">⚠️ CTAS II - حالة عاجلة</p>
-                <p>هذه الأعراض تشير إلى حالة طبية عاجلة تتطلب تقييم سريع.</p>
-                <p class="font-bold mt-2">يجب رؤية الطبيب خلال 15 دقيقة</p>
-            </div>
-            """
-        elif ctas_level == 3:
-            return """
-            <div class="bg-amber-100 border-l-4 border-amber-500 text-amber-700 p-4 rounded-md">
-                <p class="font-bold text-lg">⚠️ CTAS III - حالة مستعجلة</p>
-                <p>هذه الأعراض تشير إلى حالة تتطلب تقييم طبي خلال 30 دقيقة.</p>
-                <p class="font-bold mt-2">يرجى الانتظار في منطقة الانتظار - ستتم رؤية المريض قريباً</p>
-            </div>
-            """
-        elif ctas_level == 4:
-            return """
-            <div class="bg-green-100 border-l-4 border-green-500 text-green-700 p-4 rounded-md">
-                <p class="font-bold text-lg">ℹ️ CTAS IV - أقل استعجالاً</p>
-                <p>هذه الأعراض تشير إلى حالة تتطلب تقييم طبي خلال 60 دقيقة.</p>
-                <p class="font-bold mt-2">يرجى الانتظار - الوقت المتوقع للانتظار أقل من ساعة</p>
-            </div>
-            """
-        else:  # CTAS 5
-            return """
-            <div class="bg-blue-100 border-l-4 border-blue-500 text-blue-700 p-4 rounded-md">
-                <p class="font-bold text-lg">ℹ️ CTAS V - غير عاجل</p>
-                <p>هذه الأعراض لا تشير إلى حالة طارئة في الوقت الحالي.</p>
-                <p class="font-bold mt-2">يرجى الانتظار - الوقت المتوقع للانتظار أقل من ساعتين</p>
-            </div>
-            """
-    else:  # English
-        if ctas_level == 1:
-            return """
-            <div class="bg-red-100 border-l-4 border-red-500 text-red-700 p-4 rounded-md">
-                <p class="font-bold text-lg">🚨 CTAS I - Resuscitation</p>
-                <p>These symptoms indicate a medical emergency requiring immediate care.</p>
-                <p class="font-bold mt-2">Patient requires immediate physician assessment - highest priority</p>
-            </div>
-            """
-        elif ctas_level == 2:
-            return """
-            <div class="bg-orange-100 border-l-4 border-orange-500 text-orange-700 p-4 rounded-md">
-                <p class="font-bold text-lg">⚠️ CTAS II - Emergent</p>
-                <p>These symptoms indicate an urgent medical condition requiring prompt care.</p>
-                <p class="font-bold mt-2">Patient should be seen by physician within 15 minutes</p>
-            </div>
-            """
-        elif ctas_level == 3:
-            return """
-            <div class="bg-amber-100 border-l-4 border-amber-500 text-amber-700 p-4 rounded-md">
-                <p class="font-bold text-lg">⚠️ CTAS III - Urgent</p>
-                <p>These symptoms indicate a condition requiring medical assessment within 30 minutes.</p>
-                <p class="font-bold mt-2">Please wait in waiting area - patient will be seen soon</p>
-            </div>
-            """
-        elif ctas_level == 4:
-            return """
-            <div class="bg-green-100 border-l-4 border-green-500 text-green-700 p-4 rounded-md">
-                <p class="font-bold text-lg">ℹ️ CTAS IV - Less Urgent</p>
-                <p>These symptoms indicate a condition requiring medical assessment within 60 minutes.</p>
-                <p class="font-bold mt-2">Please wait - expected wait time less than one hour</p>
-            </div>
-            """
-        else:  # CTAS 5
-            return """
-            <div class="bg-blue-100 border-l-4 border-blue-500 text-blue-700 p-4 rounded-md">
-                <p class="font-bold text-lg">ℹ️ CTAS V - Non-Urgent</p>
-                <p>These symptoms do not indicate an emergency at this time.</p>
-                <p class="font-bold mt-2">Please wait - expected wait time less than two hours</p>
-            </div>
-            """
+    recommendations = RECOMMENDATION_HTML['ar' if lang == 'ar' else 'en']
+    return recommendations.get(ctas_level, recommendations[5])
 
-@app.route('/download_self_assessment_csv', methods=['POST'])
-def download_self_assessment_csv_route():
-    data = request.form.to_dict()
-    ctas_level, _ = calculate_ctas_logic(data)
-    lang = session.get('language', DEFAULT_LANGUAGE)
-    
-    # Map alertness to AVPU for calculation
-    data['avpu'] = data.get('alertness', 'A')
-    
-    # Prepare data for CSV, getting text values using the self-assessment mappings
-    csv_data = {
+def build_self_assessment_csv_row(data, ctas_level, lang, assessed_at):
+    """Prepare one self-assessment for CSV export, getting text values using the self-assessment mappings."""
+    return {
         'Age': data.get('patient_age', ''),
         'Gender': get_text_from_value('patient-gender', data.get('patient_gender', ''), 'self_assessment', lang),
         'Main Symptom': get_text_from_value('main-symptom', data.get('main_symptom', ''), 'self_assessment', lang),
@@ -901,9 +2039,16 @@ def download_self_assessment_csv_route():
         'Diabetes': get_text_from_value('has-diabetes', data.get('has_diabetes', ''), 'self_assessment', lang),
         'Blood Glucose': data.get('glucose', ''),
         'CTAS Level (Preliminary)': ctas_level,
-        'Assessment Date/Time': datetime.now().strftime("%Y-%m-%d %H:%M")
+        'Assessment Date/Time': assessed_at.strftime("%Y-%m-%d %H:%M")
     }
 
+@app.route('/download_self_assessment_csv', methods=['POST'])
+def download_self_assessment_csv_route():
+    data, ctas_level, _, _ = assess_self_assessment(request.form.to_dict())
+    lang = request_language()
+
+    csv_data = build_self_assessment_csv_row(data, ctas_level, lang, datetime.now())
+
     # Define CSV headers based on the keys prepared above
     csv_headers = list(csv_data.keys())
     csv_data_row = [csv_data[header] for header in csv_headers]
@@ -934,6 +2079,282 @@ def download_self_assessment_csv_route():
         }
     )
 
+def queue_entry_json(entry):
+    """Queue entry with ISO timestamps and the time left until reassessment."""
+    now = datetime.now().timestamp()
+    timestamps = {
+        field: datetime.fromtimestamp(entry[field]).isoformat(timespec='seconds') if entry[field] else None
+        for field in ('arrived_at', 'reassess_due_at', 'updated_at', 'flagged_at')
+    }
+    return {
+        **entry,
+        **timestamps,
+        'reassessment_due': entry['flagged_at'] is not None,
+        'minutes_until_reassessment': round((entry['reassess_due_at'] - now) / 60, 1),
+    }
+
+def publish_queue_event(event, entry):
+    """Send a waiting-room change to the live board of the entry's facility."""
+    if board_events is not None:
+        board_events.publish(entry['facility'], event, queue_entry_json(entry))
+
+# Queue request fields stored in the waiting room as text
+QUEUE_TEXT_FIELDS = ('facility', 'patient_label', 'patient_name', 'patient_id', 'assessment_id')
+
+def queue_triage_data():
+    """Triage the JSON body of a queue request.
+
+    The stored fields (QUEUE_TEXT_FIELDS) must be scalars and are converted
+    to strings, so a number is kept as text and a list or object is a 400.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise DataMissingError('MISSING_BODY', 'A JSON object with the triage fields is required')
+    invalid = [field for field in QUEUE_TEXT_FIELDS if not isinstance(data.get(field), API_V2_SCALAR_TYPES)]
+    if invalid:
+        raise ValidationError('INVALID_FIELD_TYPE', 'Fields must be strings, numbers, booleans or null',
+                              {'fields': invalid})
+    data = {**data, **{field: str(data[field]) for field in QUEUE_TEXT_FIELDS if data.get(field) is not None}}
+    try:
+        ctas_level, reassessment_interval, _ = cached_ctas_logic(data)
+    except Exception as calc_error:
+        raise CalculationError(
+            'CALCULATION_FAILED',
+            'Failed to calculate CTAS level',
+            {'original_error': str(calc_error)}
+        )
+    return data, ctas_level, reassessment_interval
+
+# Reassessment timers for waiting patients (see reassessment_scheduler.py)
+reassessment_scheduler = ReassessmentScheduler(
+    triage_queue, CTAS_MODIFIER_RULES['waiting_time'], get_reassessment_interval
+)
+
+def log_reassessment_event(event, entry):
+    if event == 'reassessment_due':
+        app.logger.warning(f"Reassessment due: {entry['queue_id']} (CTAS {entry['ctas_level']}, {entry['facility'] or 'default'})")
+    else:
+        app.logger.warning(f"Waiting-time upgrade: {entry['queue_id']} now CTAS {entry['ctas_level']}")
+
+reassessment_scheduler.add_listener(log_reassessment_event)
+reassessment_scheduler.add_listener(publish_queue_event)
+
+def start_background_tasks():
+    """Start this process's background threads. Call after gunicorn forks a worker."""
+    if REASSESSMENT_SCHEDULER_ENABLED:
+        reassessment_scheduler.start()
+
+@app.route('/queue', methods=['GET'])
+def queue_list_route():
+    """List waiting patients for a facility in priority order."""
+    facility = request.args.get('facility', FACILITY_ID)
+    entries = triage_queue.waiting(facility)
+    return jsonify({'facility': facility, 'count': len(entries), 'patients': [queue_entry_json(e) for e in entries]})
+
+@app.route('/queue', methods=['POST'])
+def queue_enqueue_route():
+    """Triage a patient (JSON triage fields) and add them to the waiting room."""
+    lang = request_language()
+    try:
+        data, ctas_level, reassessment_interval = queue_triage_data()
+    except CTASError as e:
+        return ctas_error_response(e, lang)
+
+    entry = triage_queue.enqueue(
+        ctas_level,
+        reassessment_interval,
+        facility=data.get('facility') or FACILITY_ID,
+        patient_label=data.get('patient_label') or data.get('patient_name') or data.get('patient_id') or '',
+        assessment_id=data.get('assessment_id'),
+    )
+    publish_queue_event('patient_queued', entry)
+    return jsonify(queue_entry_json(entry)), 201
+
+@app.route('/queue/next', methods=['POST'])
+def queue_pop_route():
+    """Call the next patient: removes and returns the highest-priority waiting patient."""
+    facility = request.args.get('facility', FACILITY_ID)
+    entry = triage_queue.pop(facility)
+    if entry is None:
+        return jsonify({'status': 'empty', 'facility': facility}), 404
+    publish_queue_event('patient_seen', entry)
+    return jsonify(queue_entry_json(entry))
+
+@app.route('/queue/<queue_id>/retriage', methods=['POST'])
+def queue_retriage_route(queue_id):
+    """Re-triage a waiting patient with new triage fields (JSON)."""
+    lang = request_language()
+    try:
+        _, ctas_level, reassessment_interval = queue_triage_data()
+    except CTASError as e:
+        return ctas_error_response(e, lang)
+
+    entry = triage_queue.retriage(queue_id, ctas_level, reassessment_interval)
+    if entry is None:
+        return jsonify({'status': 'not_found', 'queue_id': queue_id}), 404
+    publish_queue_event('level_changed', entry)
+    return jsonify(queue_entry_json(entry))
+
+@app.route('/queue/<queue_id>/remove', methods=['POST'])
+def queue_remove_route(queue_id):
+    """Take a patient out of the waiting room, e.g. left without being seen."""
+    if not triage_queue.remove(queue_id):
+        return jsonify({'status': 'not_found', 'queue_id': queue_id}), 404
+    publish_queue_event('patient_left', triage_queue.get(queue_id))
+    return jsonify({'status': 'removed', 'queue_id': queue_id})
+
+@app.route('/queue/overdue', methods=['GET'])
+def queue_overdue_route():
+    """Waiting patients past their reassessment interval, most overdue first."""
+    facility = request.args.get('facility', FACILITY_ID)
+    entries = triage_queue.overdue(facility)
+    return jsonify({'facility': facility, 'count': len(entries), 'patients': [queue_entry_json(e) for e in entries]})
+
+@app.route('/board/events')
+def board_events_route():
+    """Server-Sent Events for a facility's live board (EventSource).
+
+    Answers with the events after Last-Event-ID and closes; EventSource
+    reconnects after `retry` ms and resumes, so no worker is held open. A new
+    screen, or one whose position was pruned, first gets a 'snapshot' event
+    with the whole waiting room.
+    """
+    facility = request.args.get('facility', FACILITY_ID)
+    if board_events is None:
+        return not_found(None)
+    # None for a new screen; 0 is a real position (a snapshot of a log with no events yet)
+    raw_last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(raw_last_id) if raw_last_id else None
+    except ValueError:
+        last_id = None
+
+    messages = [f'retry: {BOARD_RETRY_MS}\n\n']
+    events, complete = board_events.after(facility, last_id) if last_id is not None else ([], False)
+    if not complete:
+        # Position first: changes landing while the snapshot is read are sent again next time
+        last_id = board_events.last_id()
+        waiting = [queue_entry_json(entry) for entry in triage_queue.waiting(facility)]
+        messages.append(format_sse('snapshot', {'facility': facility, 'patients': waiting}, last_id))
+        events, _ = board_events.after(facility, last_id)
+    messages.extend(format_sse(event, data, event_id) for event_id, event, data in events)
+    return Response(''.join(messages), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def parse_export_date(value, end=False):
+    """Parse an export range bound; a plain date as `end` covers the whole day.
+
+    Assessments are stored in the server's local time without an offset, so
+    a bound with an offset is converted to local time before comparing.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValidationError('INVALID_DATE', 'Dates must be ISO formatted (YYYY-MM-DD)', {'value': value})
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.isoformat(timespec='seconds')
+
+def check_export_token():
+    """Require `Authorization: Bearer <EXPORT_TOKEN>` for the assessment history."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not secrets.compare_digest(token.strip().encode(), EXPORT_TOKEN.encode()):
+        raise AuthorizationError('INVALID_TOKEN', 'A valid export token is required')
+
+@app.route('/export_csv')
+def export_csv_route():
+    """Stream stored assessments as CSV for a date range and/or facility.
+
+    Query parameters: kind (professional or self_assessment), start, end
+    (inclusive dates or ISO timestamps), facility and lang.
+    """
+    lang = request_language()
+    # The history holds every patient's name, ID and vitals: off unless a token is configured
+    if not EXPORT_TOKEN:
+        return not_found(None)
+    try:
+        check_export_token()
+    except AuthorizationError as e:
+        response, status = ctas_error_response(e, lang)
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response, status
+    try:
+        if assessment_store is None:
+            raise DataMissingError('STORE_DISABLED', 'Assessment history is not enabled')
+        kind = request.args.get('kind', 'professional')
+        if kind not in ('professional', 'self_assessment'):
+            raise ValidationError('INVALID_KIND', 'kind must be professional or self_assessment', {'value': kind})
+        start = parse_export_date(request.args.get('start'))
+        end = parse_export_date(request.args.get('end'), end=True)
+        facility = request.args.get('facility') or None
+    except (DataMissingError, ValidationError) as e:
+        count_ctas_error(e)
+        app.logger.warning(f"Export request rejected: {e.error_code} - {e.message}")
+        error_msg = 'خطأ في التحقق من البيانات' if lang == 'ar' else 'Data validation error'
+        return jsonify({
+            'error': error_msg,
+            'error_code': e.error_code,
+            'details': e.details
+        }), 400
+
+    assessments = iter_assessments(ASSESSMENT_DB, kind, start, end, facility)
+
+    def generate():
+        si = io.StringIO()
+        writer = csv.writer(si)
+        if kind == 'professional':
+            writer.writerow(list(build_professional_csv_row({}, '', lang)))
+        else:
+            writer.writerow(list(build_self_assessment_csv_row({}, '', lang, datetime.now())))
+        # UTF-8 BOM so Excel shows the Arabic labels correctly
+        yield ('\ufeff' + si.getvalue()).encode('utf-8')
+        si.seek(0)
+        si.truncate()
+
+        rows = 0
+        for assessment in assessments:
+            if kind == 'professional':
+                row = build_professional_csv_row(assessment['data'], assessment['ctas_level'], lang)
+            else:
+                assessed_at = datetime.fromisoformat(assessment['created_at'])
+                row = build_self_assessment_csv_row(assessment['data'], assessment['ctas_level'], lang, assessed_at)
+            writer.writerow(row.values())
+            rows += 1
+            if rows % EXPORT_CHUNK_ROWS == 0:
+                yield si.getvalue().encode('utf-8')
+                si.seek(0)
+                si.truncate()
+        yield si.getvalue().encode('utf-8')
+
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    filename = f"ctas_export_{kind}_{timestamp}.csv"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv; charset=utf-8",
+        headers={
+            "Content-Disposition": f"attachment; filename=\"{filename}\"",
+            "Content-Type": "text/csv; charset=utf-8"
+        }
+    )
+
+@app.route('/metrics')
+def metrics_route():
+    """Prometheus metrics, aggregated over all gunicorn workers."""
+    if not METRICS_ENABLED:
+        return not_found(None)
+    collectors = [metrics.WaitingQueueCollector(triage_queue)]
+    if triage_cache is not None:
+        collectors.append(metrics.TriageCacheCollector(triage_cache))
+    if admission is not None:
+        collectors.append(metrics.AdmissionCollector(admission))
+    body, content_type = metrics.render(collectors)
+    return Response(body, content_type=content_type)
+
 @app.route('/health')
 def health_check():
     """Health check endpoint for load balancers and monitoring."""
@@ -946,16 +2367,27 @@ def health_check():
             'system': 'CTAS Triage System - Saudi Arabia',
             'environment': os.environ.get('FLASK_ENV', 'production')
         }
+        if assessment_store is not None:
+            # Per worker: the writer that answers this request
+            status['assessment_store'] = assessment_store.stats()
+        if triage_cache is not None:
+            status['triage_cache'] = triage_cache.stats()
+        if admission is not None:
+            status['admission'] = admission.stats()
         return jsonify(status), 200
     except Exception as e:
         app.logger.error(f"Health check failed: {str(e)}")
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
+# The form pages only depend on the language: render them once, before gunicorn forks
+page_shells.prerender(('professional_triage.html', 'reference.html', 'self_assessment.html'), SUPPORTED_LANGUAGES)
+
 # Production-ready application for Railway
 if __name__ == '__main__':
     # This is only used for local development
     # Railway will use Gunicorn in production
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
+    start_background_tasks()
     app.run(host='0.0.0.0', port=port, debug=debug)
 
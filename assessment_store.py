@@ -0,0 +1,285 @@
+# Persistent assessment store for the Saudi Arabian CTAS Triage System
+# Records every triage result in an embedded SQLite database (WAL mode).
+#
+# Writes are queued and committed in batches by a background thread, so the
+# request path never waits on disk. Each gunicorn worker runs its own writer;
+# SQLite's WAL locking keeps concurrent writers from several workers safe.
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    assessment_id TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    facility TEXT NOT NULL DEFAULT '',
+    lang TEXT,
+    ctas_level INTEGER,
+    reassessment_interval INTEGER,
+    data TEXT NOT NULL,
+    ctas_reasons INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_assessments_created_at ON assessments (created_at);
+CREATE INDEX IF NOT EXISTS idx_assessments_facility ON assessments (facility, created_at);
+"""
+
+INSERT_SQL = """
+INSERT INTO assessments
+    (assessment_id, created_at, kind, facility, lang, ctas_level, reassessment_interval, data, ctas_reasons)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Seconds between attempts to restart a writer thread that died
+WRITER_RESTART_INTERVAL = 5.0
+
+# Columns added after the first release: (column, definition)
+MIGRATIONS = (
+    ('ctas_reasons', 'INTEGER'),
+)
+
+def connect(path, timeout=30.0):
+    """Open a connection configured for concurrent use from several processes."""
+    connection = sqlite3.connect(path, timeout=timeout)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # In WAL mode NORMAL only syncs at checkpoints; commits stay durable across app crashes
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute(f'PRAGMA busy_timeout={int(timeout * 1000)}')
+    return connection
+
+def table_columns(connection):
+    return {row[1] for row in connection.execute('PRAGMA table_info(assessments)')}
+
+def ensure_schema(connection):
+    """Create the assessments table, or add columns missing from an older one.
+
+    Several workers may open an older database at once, so the columns are
+    checked again and added under a write lock (BEGIN IMMEDIATE); a column
+    another process added first is not an error.
+    """
+    connection.executescript(SCHEMA)
+    if all(column in table_columns(connection) for column, _ in MIGRATIONS):
+        return
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        columns = table_columns(connection)
+        for column, definition in MIGRATIONS:
+            if column in columns:
+                continue
+            try:
+                connection.execute(f'ALTER TABLE assessments ADD COLUMN {column} {definition}')
+            except sqlite3.OperationalError as e:
+                if 'duplicate column name' not in str(e):
+                    raise
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+
+class AssessmentStore:
+    """Batched, non-blocking writer for triage assessments."""
+
+    def __init__(self, path, batch_size=200, flush_interval=0.5, max_pending=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+        self._writer_started_at = 0.0
+        self.dropped = 0
+
+    def record(self, kind, data, ctas_level, reassessment_interval, lang, facility='', reasons=None):
+        """Queue an assessment for writing and return its assessment id.
+
+        `reasons` is the bitmask of rules that set the level (see CTAS_REASON_CODES in app.py).
+        Returns None, and counts the assessment in `dropped`, when it cannot be
+        queued: the queue is full, or the writer died and is not due a restart.
+        """
+        assessment_id = uuid.uuid4().hex
+        row = (
+            assessment_id,
+            datetime.now().isoformat(timespec='seconds'),
+            kind,
+            facility or '',
+            lang,
+            ctas_level,
+            reassessment_interval,
+            json.dumps(data, ensure_ascii=False),
+            reasons,
+        )
+        if not self._ensure_writer():
+            self.dropped += 1
+            logger.warning('Assessment store writer is not running, dropping assessment %s', assessment_id)
+            return None
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning('Assessment store queue full, dropping assessment %s', assessment_id)
+            return None
+        return assessment_id
+
+    def flush(self):
+        """Block until every queued assessment has been written, or the writer has died."""
+        if self._writer is None or self._writer_pid != os.getpid():
+            return
+        condition = self._queue.all_tasks_done
+        with condition:
+            while self._queue.unfinished_tasks and self._writer is not None and self._writer.is_alive():
+                condition.wait(self.flush_interval)
+
+    def stats(self):
+        """This worker's writer state: alive, assessments pending and dropped."""
+        own = self._writer_pid == os.getpid()
+        return {
+            'writer_alive': bool(own and self._writer is not None and self._writer.is_alive()),
+            'pending': self._queue.qsize() if own else 0,
+            'dropped': self.dropped if own else 0,
+        }
+
+    def close(self):
+        """Write everything still queued and stop the writer thread."""
+        if self._writer is None or self._writer_pid != os.getpid():
+            return
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._writer = None
+
+    def _ensure_writer(self):
+        """Start this process's writer if needed; False while a dead writer waits for its restart."""
+        # Threads do not survive fork, so each gunicorn worker starts its own writer
+        pid = os.getpid()
+        writer = self._writer
+        if self._writer_pid == pid and writer is not None and writer.is_alive():
+            return True
+        with self._lock:
+            writer = self._writer
+            if self._writer_pid == pid and writer is not None and writer.is_alive():
+                return True
+            if self._writer_pid != pid:
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self.dropped = 0
+            elif writer is not None:
+                # The writer died (e.g. the database could not be opened); retry now and then
+                if time.monotonic() - self._writer_started_at < WRITER_RESTART_INTERVAL:
+                    return False
+                logger.warning('Assessment store writer died, restarting it')
+            self._writer_pid = pid
+            self._writer_started_at = time.monotonic()
+            self._writer = threading.Thread(target=self._run, name='assessment-store-writer', daemon=True)
+            self._writer.start()
+            return True
+
+    def _run(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = connect(self.path)
+            ensure_schema(connection)
+        except (OSError, sqlite3.Error) as e:
+            logger.error('Assessment store writer could not open %s: %s', self.path, e)
+            return
+
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = []
+            if first is None:
+                stopping = True
+            else:
+                batch.append(first)
+            while not stopping and len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                else:
+                    batch.append(row)
+
+            if batch:
+                try:
+                    with connection:
+                        connection.executemany(INSERT_SQL, batch)
+                except sqlite3.Error as e:
+                    logger.error('Failed to write %d assessments: %s', len(batch), e)
+            for _ in range(len(batch) + (1 if stopping else 0)):
+                self._queue.task_done()
+
+        connection.close()
+
+# Columns iter_assessments returns (`data` is decoded from JSON)
+EXPORT_COLUMNS = (
+    'assessment_id', 'created_at', 'kind', 'facility', 'lang', 'ctas_level', 'reassessment_interval',
+    'ctas_reasons', 'data',
+)
+
+def iter_assessments(path, kind=None, start=None, end=None, facility=None, batch_size=500):
+    """Yield stored assessments oldest first, reading `batch_size` rows at a time.
+
+    `start` is inclusive and `end` exclusive (ISO timestamps). Each row is a
+    dict with the stored columns and the submitted form in `data`.
+    """
+    if not os.path.exists(path):
+        return
+
+    clauses, params = [], []
+    for column, operator, value in (
+        ('kind', '=', kind),
+        ('created_at', '>=', start),
+        ('created_at', '<', end),
+        ('facility', '=', facility),
+    ):
+        if value is not None:
+            clauses.append(f'{column} {operator} ?')
+            params.append(value)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    connection = connect(path)
+    try:
+        # Read-only: a database no writer has migrated yet lacks the newer columns
+        columns = table_columns(connection)
+        if not columns:
+            return
+        selected = ', '.join(column if column in columns else f'NULL AS {column}' for column in EXPORT_COLUMNS)
+        cursor = connection.execute(
+            f'SELECT {selected} FROM assessments {where} ORDER BY created_at, id',
+            params,
+        )
+        columns = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                assessment = dict(zip(columns, row))
+                assessment['data'] = json.loads(assessment['data'])
+                yield assessment
+    finally:
+        connection.close()
+
+def open_store(path):
+    """Create the store and make sure queued assessments are written on exit."""
+    store = AssessmentStore(path)
+    atexit.register(store.close)
+    return store
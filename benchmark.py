@@ -0,0 +1,209 @@
+# Benchmark suite for the Saudi Arabian CTAS Triage System hot paths
+# Measures the per-call cost of the CTAS engine, validation, label lookups,
+# recommendations, the CSV export routes and full request round trips through
+# the Flask test client. Runs offline against temporary databases.
+#
+# Usage:
+#   python benchmark.py                   # run and compare with the baseline
+#   python benchmark.py --save            # run and record a new baseline
+#   python benchmark.py -k ctas --threshold 0.10
+#   python benchmark.py --ci              # as in CI: a missing baseline fails
+#
+# Exits with status 1 when a benchmark is slower than its baseline by more
+# than the threshold (default 20%). With --ci it also exits with status 1 when
+# the baseline file, or the baseline of a benchmark that ran, is missing.
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+
+# The app reads its configuration at import, so point it at scratch files first
+_scratch = tempfile.mkdtemp(prefix='ctas-bench-')
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault('FLASK_ENV', 'development')
+os.environ['ASSESSMENT_DB'] = os.path.join(_scratch, 'assessments.db')
+os.environ['QUEUE_DB'] = os.path.join(_scratch, 'queue.db')
+os.environ['TRIAGE_TABLE_PATH'] = os.path.join(_scratch, 'triage_table.bin')
+os.environ['REASSESSMENT_SCHEDULER_ENABLED'] = 'False'
+os.environ['EXPORT_TOKEN'] = 'benchmark'
+os.environ['SESSION_COOKIE_SECURE'] = 'False'
+
+import app as triage_app  # noqa: E402
+from workload import malformed_form, professional_form, self_assessment_form  # noqa: E402
+
+def measure(func, inputs, repeat, min_time=0.2):
+    """Per-call seconds for func over inputs: the best of `repeat` rounds of at least min_time each."""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            for item in inputs:
+                func(item)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops *= 2
+    rounds = [elapsed]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            for item in inputs:
+                func(item)
+        rounds.append(time.perf_counter() - started)
+    calls = loops * len(inputs)
+    return min(rounds) / calls, statistics.median(rounds) / calls, calls
+
+def build_benchmarks(seed, size):
+    rng = random.Random(seed)
+    realistic = [professional_form(rng) for _ in range(size)]
+    adversarial = [malformed_form(rng) for _ in range(size)]
+    self_forms = [self_assessment_form(rng) for _ in range(size)]
+    # The same handful of forms over and over, as on a busy kiosk
+    repeated = [self_forms[i % 20] for i in range(size)]
+
+    labels = [
+        (field, value, tool, lang)
+        for tool, mappings in (('professional', triage_app.PROFESSIONAL_LABELS_EN),
+                               ('self_assessment', triage_app.SELF_ASSESSMENT_LABELS_EN))
+        for field, values in mappings.items()
+        for value in list(values) + ['unknown']
+        for lang in ('ar', 'en')
+    ]
+    recommendations = [(level, 'x', lang) for level in (1, 2, 3, 4, 5, None) for lang in ('ar', 'en')]
+
+    client = triage_app.app.test_client()
+    requests = realistic[:200]
+    self_requests = self_forms[:200]
+
+    # History for /export_csv
+    store = triage_app.assessment_store
+    if store is not None:
+        for data in realistic[:2000]:
+            level, interval = triage_app.calculate_ctas_logic(data)
+            store.record('professional', data, level, interval, 'en')
+        store.flush()
+
+    def export_csv(_):
+        response = client.get('/export_csv?kind=professional&lang=en', headers={'Authorization': 'Bearer benchmark'})
+        for _ in response.response:
+            pass
+
+    return {
+        'ctas_logic.realistic': (triage_app.calculate_ctas_logic, realistic),
+        'ctas_logic.adversarial': (triage_app.calculate_ctas_logic, adversarial),
+        'ctas_logic.cached_repeats': (triage_app.cached_ctas_logic, repeated),
+        'ctas_batch.realistic': (triage_app.calculate_ctas_batch, [realistic]),
+        'parse_triage_input.realistic': (triage_app.parse_triage_input, realistic),
+        'validate_medical_ranges.realistic': (triage_app.validate_medical_ranges, realistic),
+        'validate_medical_ranges.adversarial': (triage_app.validate_medical_ranges, adversarial),
+        'get_text_from_value': (lambda args: triage_app.get_text_from_value(*args), labels),
+        'generate_recommendation': (lambda args: triage_app.generate_recommendation(*args), recommendations),
+        'route.download_csv': (lambda data: client.post('/download_csv', data=data), requests),
+        'route.download_self_assessment_csv': (
+            lambda data: client.post('/download_self_assessment_csv', data=data), self_requests),
+        'route.export_csv_2000_rows': (export_csv, [None]),
+        'route.calculate_ctas': (lambda data: client.post('/calculate_ctas', data=data), requests),
+        'route.calculate_self_assessment': (
+            lambda data: client.post('/calculate_self_assessment', data=data), self_requests),
+        'route.page_index': (lambda _: client.get('/ar/'), [None]),
+        'route.page_self_diagnosis': (lambda _: client.get('/ar/self_diagnosis'), [None]),
+    }
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the CTAS triage hot paths.')
+    parser.add_argument('-k', '--filter', default='', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.20, help='allowed slowdown before failing (0.20 = 20%%)')
+    parser.add_argument('--repeat', type=int, default=5, help='timing rounds per benchmark (best one counts)')
+    parser.add_argument('--size', type=int, default=2000, help='generated inputs per distribution')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--ci', action='store_true',
+                        help='fail when the baseline, or a benchmark missing from it, would skip the comparison')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    benchmarks = build_benchmarks(args.seed, args.size)
+    baseline = load_baseline(args.baseline)
+    if baseline is None and args.ci and not args.save:
+        print(f"❌ No baseline at {args.baseline}; record one on this machine with --save", file=sys.stderr)
+        return 1
+    baseline_results = baseline['results'] if baseline else {}
+
+    results = {}
+    regressions = []
+    unmeasured = []
+    print(f"{'benchmark':40} {'best µs':>10} {'median µs':>10} {'baseline':>10} {'change':>8}")
+    for name, (func, inputs) in benchmarks.items():
+        if args.filter not in name:
+            continue
+        best, median, calls = measure(func, inputs, args.repeat)
+        results[name] = {'per_call_us': round(best * 1e6, 3), 'median_us': round(median * 1e6, 3), 'calls': calls}
+
+        previous = baseline_results.get(name)
+        change = ''
+        if previous:
+            ratio = results[name]['per_call_us'] / previous['per_call_us'] - 1
+            change = f'{ratio:+.1%}'
+            if ratio > args.threshold:
+                regressions.append((name, ratio))
+                change += ' ❌'
+        elif baseline:
+            unmeasured.append(name)
+        print(f"{name:40} {best * 1e6:10.2f} {median * 1e6:10.2f} "
+              f"{previous['per_call_us'] if previous else '-':>10} {change:>8}")
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'size': args.size,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.save:
+        if baseline:
+            # Keep the baselines of benchmarks that were filtered out of this run
+            report['results'] = {**baseline_results, **results}
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"💾 Baseline saved to {args.baseline}", file=sys.stderr)
+    elif baseline is None:
+        print(f"ℹ️ No baseline at {args.baseline}; run with --save to record one", file=sys.stderr)
+
+    if args.save:
+        return 0
+    for name, ratio in regressions:
+        print(f"❌ {name} is {ratio:.1%} slower than the baseline", file=sys.stderr)
+    if unmeasured:
+        print(f"{'❌' if args.ci else 'ℹ️'} No baseline for {', '.join(unmeasured)}", file=sys.stderr)
+    return 1 if regressions or (args.ci and unmeasured) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# Static asset build for the Saudi Arabian CTAS Triage System
+# Replaces the in-browser Tailwind runtime and the Google Fonts / Font Awesome
+# CDNs with self-hosted files in static/dist:
+#   app.css    - Inter and Font Awesome, then a purged, minified Tailwind build
+#   triage.js  - the minified front-end script
+# Each file name carries a content hash, so the app can serve it with
+# immutable caching. Text files also get .gz/.br variants.
+# static/dist/manifest.json maps the logical names to the built files.
+#
+# Usage (needs network access the first time, to fetch Tailwind and the fonts):
+#   pip install -r requirements-build.txt
+#   python build_assets.py
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import urllib.request
+from urllib.parse import urljoin, urlsplit
+
+import pytailwindcss
+import rjsmin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(ROOT, 'static', 'dist')
+MANIFEST_NAME = 'manifest.json'
+
+# The Play CDN the templates used is Tailwind 3
+TAILWIND_VERSION = 'v3.4.17'
+TAILWIND_CONFIG = os.path.join(ROOT, 'tailwind.config.js')
+TAILWIND_INPUT = os.path.join(ROOT, 'assets', 'app.css')
+
+# Third-party stylesheets bundled into app.css; the fonts they use are copied next to it
+VENDOR_STYLESHEETS = (
+    'https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+)
+# Google Fonts only serves woff2 to browsers that announce support for it
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+CSS_URL = re.compile(r'url\(\s*(["\']?)([^)"\']+)\1\s*\)')
+
+SCRIPTS = {
+    'triage.js': os.path.join(ROOT, 'static', 'js', 'triage.js'),
+}
+
+def fetch(url):
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+def fingerprint(name, content):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+def write_asset(name, content, precompress=True):
+    """Write a fingerprinted file (plus .gz/.br variants) to DIST_DIR and return its name."""
+    filename = fingerprint(name, content)
+    path = os.path.join(DIST_DIR, filename)
+    with open(path, 'wb') as f:
+        f.write(content)
+    if precompress:
+        with open(f'{path}.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(f'{path}.br', 'wb') as f:
+                f.write(brotli.compress(content, quality=11))
+    return filename
+
+def vendor_stylesheet(url, copied):
+    """Download a stylesheet and the files it references, pointing its url()s at the local copies."""
+    css = fetch(url).decode('utf-8')
+
+    def localize(match):
+        reference = match.group(2)
+        if reference.startswith('data:'):
+            return match.group(0)
+        absolute = urljoin(url, reference)
+        source = absolute.split('#')[0]
+        if source not in copied:
+            name = os.path.basename(urlsplit(source).path)
+            copied[source] = write_asset(name, fetch(source), precompress=False)
+        fragment = absolute[len(source):]
+        return f'url({copied[source]}{fragment})'
+
+    return CSS_URL.sub(localize, css)
+
+def build_tailwind(tailwind_bin):
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'tailwind.css')
+        pytailwindcss.run(
+            ['-c', TAILWIND_CONFIG, '-i', TAILWIND_INPUT, '-o', output, '--minify'],
+            cwd=ROOT,
+            bin_path=tailwind_bin,
+            auto_install=tailwind_bin is None,
+            version=TAILWIND_VERSION,
+        )
+        with open(output, encoding='utf-8') as f:
+            return f.read()
+
+def build(tailwind_bin=None):
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    manifest = {}
+    copied = {}
+    vendor_css = [vendor_stylesheet(url, copied) for url in VENDOR_STYLESHEETS]
+    css = '\n'.join(vendor_css + [build_tailwind(tailwind_bin)])
+    manifest['app.css'] = write_asset('app.css', css.encode('utf-8'))
+
+    for name, path in SCRIPTS.items():
+        with open(path, encoding='utf-8') as f:
+            manifest[name] = write_asset(name, rjsmin.jsmin(f.read()).encode('utf-8'))
+
+    with open(os.path.join(DIST_DIR, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest, len(copied)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the fingerprinted CSS/JS bundles in static/dist.')
+    parser.add_argument('--tailwind', help='path to a Tailwind CSS 3 standalone binary (default: download one)')
+    args = parser.parse_args(argv)
+
+    manifest, fonts = build(args.tailwind)
+    for name, filename in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(DIST_DIR, filename))
+        print(f"✅ {name} -> static/dist/{filename} ({size / 1024:.1f} KiB)", file=sys.stderr)
+    print(f"🔤 {fonts} font files copied", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# Bulk triage command-line tool for the Saudi Arabian CTAS Triage System
+# Streams a CSV or NDJSON file of encounters through the same CTAS logic used
+# by the web application and writes the results in the /download_csv layout.
+#
+# Usage:
+#   python bulk_triage.py encounters.csv -o results.csv
+#   python bulk_triage.py encounters.ndjson --workers 8 --lang en -o -
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from app import (
+    DEFAULT_LANGUAGE,
+    build_professional_csv_row,
+    evaluate_ctas_inputs,
+    parse_triage_input,
+)
+
+# Extra columns appended after the /download_csv layout
+EXTRA_HEADERS = ['Reassessment Interval (min)', 'Validation Warnings']
+
+def skip_record(number, error_code, reason, skipped):
+    print(f"⚠️ Line {number}: {error_code}, {reason}; skipped", file=sys.stderr)
+    if skipped is not None:
+        skipped.append(number)
+
+def read_records(stream, input_format, skipped=None):
+    """Yield (line number, encounter dict) per input row without loading the whole file.
+
+    NDJSON lines that are not valid JSON objects are reported on stderr by line
+    number and skipped, as /incident/intake rejects them with INVALID_RECORD;
+    their line numbers are appended to `skipped` when given.
+    """
+    if input_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            reason = f"invalid JSON ({e})"
+        else:
+            if isinstance(record, dict):
+                yield number, record
+                continue
+            reason = 'every record must be an object'
+        skip_record(number, 'INVALID_RECORD', reason, skipped)
+
+def chunked(records, size):
+    """Group an iterator of records into lists of at most `size` records."""
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+def output_headers(lang):
+    return list(build_professional_csv_row({}, '', lang)) + EXTRA_HEADERS
+
+def triage_chunk(records, lang):
+    """Triage a chunk of (line number, encounter) pairs.
+
+    Returns (rows, failures): the CSV rows, and (line number, error) for each
+    encounter that could not be triaged, so one bad record does not end the run.
+    """
+    rows = []
+    failures = []
+    for number, data in records:
+        try:
+            inputs = parse_triage_input(data)
+            ctas_level, reassessment_interval = evaluate_ctas_inputs(inputs)
+            row = list(build_professional_csv_row(data, ctas_level, lang).values())
+        except Exception as e:
+            failures.append((number, f'{type(e).__name__}: {e}'))
+            continue
+        row.append(reassessment_interval)
+        row.append('; '.join(warning['message'] for warning in inputs.warnings))
+        rows.append(row)
+    return rows, failures
+
+def triage_chunks(chunks, lang, workers):
+    """Yield triaged chunks in input order.
+
+    At most two chunks per worker are in flight, so memory stays constant no
+    matter how large the input is.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield triage_chunk(chunk, lang)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(triage_chunk, chunk, lang))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def open_input(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+def open_output(path):
+    # UTF-8 BOM so Excel shows the Arabic labels correctly, as /download_csv does
+    if path == '-':
+        return io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8-sig', newline='')
+    return open(path, 'w', encoding='utf-8-sig', newline='')
+
+def detect_format(path, input_format):
+    if input_format:
+        return input_format
+    if path.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if path.endswith('.csv'):
+        return 'csv'
+    raise SystemExit(f"Cannot detect the format of {path}; pass --format csv or --format ndjson")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Triage a CSV or NDJSON file of encounters using CTAS.')
+    parser.add_argument('input', help='input file, or - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='output CSV file, or - for stdout (default)')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='input format (default: from file extension)')
+    parser.add_argument('--lang', default=DEFAULT_LANGUAGE, help='language for the text columns')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='records per chunk sent to a worker')
+    parser.add_argument('--progress-every', type=float, default=5.0, help='seconds between progress reports')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    input_format = detect_format(args.input, args.format)
+
+    started = time.monotonic()
+    last_report = started
+    total = 0
+    skipped = []
+
+    with open_input(args.input) as source, open_output(args.output) as target:
+        writer = csv.writer(target)
+        writer.writerow(output_headers(args.lang))
+
+        chunks = chunked(read_records(source, input_format, skipped), args.chunk_size)
+        for rows, failures in triage_chunks(chunks, args.lang, args.workers):
+            for number, error in failures:
+                skip_record(number, 'CALCULATION_FAILED', error, skipped)
+            writer.writerows(rows)
+            total += len(rows)
+
+            now = time.monotonic()
+            if now - last_report >= args.progress_every:
+                print(f"📊 {total} rows ({total / (now - started):.0f} rows/s)", file=sys.stderr)
+                last_report = now
+
+    elapsed = time.monotonic() - started
+    rate = total / elapsed if elapsed > 0 else 0
+    print(f"✅ Triaged {total} rows in {elapsed:.1f}s ({rate:.0f} rows/s)", file=sys.stderr)
+    if skipped:
+        print(f"⚠️ Skipped {len(skipped)} invalid records", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# Equivalence check of the CTAS engine against the original implementation
+# Runs seeded realistic, malformed and adversarial forms through the app and
+# through ctas_reference.py, a frozen copy of the engine before the rule
+# tables were compiled, and compares:
+#
+#   1. calculate_ctas_logic and cached_ctas_logic: level and reassessment interval
+#   2. validate_medical_ranges: the warnings, in order
+#   3. calculate_ctas_batch: every level and interval
+#
+# The one deliberate difference is a JSON number such as 1e999 (inf) in an
+# integer field: the original engine raised OverflowError, the app treats the
+# value as missing. Such forms are compared with the value removed.
+#
+# Exits with status 1 on any mismatch. calculate_ctas_batch is checked on
+# the path the app is configured for; run with TRIAGE_TABLE_ENABLED=False to
+# check the NumPy rules instead of the outcome table.
+#
+# Usage:
+#   python check_equivalence.py
+#   python check_equivalence.py --forms 60000 --seed 7
+
+import argparse
+import math
+import random
+import sys
+import time
+
+import numpy as np
+
+import ctas_reference
+from app import (
+    TRIAGE_INT_FIELDS,
+    cached_ctas_logic,
+    calculate_ctas_batch,
+    calculate_ctas_logic,
+    validate_medical_ranges,
+)
+from workload import adversarial_form, malformed_form, professional_form
+
+INT_FIELDS = [field for field, _, _ in TRIAGE_INT_FIELDS]
+
+def without_overflow(data):
+    """`data` with the infinite numbers in integer fields removed, as the app reads it."""
+    return {field: None if field in INT_FIELDS and isinstance(value, float) and math.isinf(value) else value
+            for field, value in data.items()}
+
+def reference(func, data):
+    try:
+        return func(data)
+    except OverflowError:
+        return func(without_overflow(data))
+
+def same(expected, result):
+    # repr, so NaN warning values compare equal and 1 == 1.0 == True do not
+    return repr(expected) == repr(result)
+
+def check_function(name, reference_func, func, forms, failures):
+    mismatched = 0
+    for data in forms:
+        expected = reference(reference_func, data)
+        try:
+            result = func(data)
+        except Exception as e:
+            result = f'{type(e).__name__}: {e}'
+        if not same(expected, result):
+            mismatched += 1
+            if len(failures) < 10:
+                failures.append((name, data, expected, result))
+    print(f'{name}: {len(forms)} forms, {mismatched} mismatched')
+    return mismatched
+
+def check_batch(forms, failures):
+    expected = [reference(ctas_reference.calculate_ctas_logic, data) for data in forms]
+    levels, intervals = calculate_ctas_batch(forms)
+    mismatched = np.flatnonzero((levels != np.array([level for level, _ in expected])) |
+                                (intervals != np.array([interval for _, interval in expected])))
+    if len(mismatched) and len(failures) < 10:
+        first = int(mismatched[0])
+        failures.append(('calculate_ctas_batch', forms[first], expected[first],
+                         (int(levels[first]), int(intervals[first]))))
+    print(f'calculate_ctas_batch: {len(forms)} forms, {len(mismatched)} mismatched')
+    return len(mismatched)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Check the CTAS engine against the original implementation.')
+    parser.add_argument('--forms', type=int, default=60000, help='random forms (default: 60000)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    generators = (professional_form, malformed_form, adversarial_form)
+    forms = [generators[i % 3](rng) for i in range(args.forms)]
+
+    started = time.perf_counter()
+    failures = []
+    mismatched = check_function('calculate_ctas_logic', ctas_reference.calculate_ctas_logic,
+                                calculate_ctas_logic, forms, failures)
+    mismatched += check_function('cached_ctas_logic', ctas_reference.calculate_ctas_logic,
+                                 lambda data: cached_ctas_logic(data)[:2], forms, failures)
+    mismatched += check_function('validate_medical_ranges', ctas_reference.validate_medical_ranges,
+                                 validate_medical_ranges, forms, failures)
+    mismatched += check_batch(forms, failures)
+
+    for name, data, expected, result in failures:
+        print(f'\nMISMATCH in {name}: expected {expected!r}, got {result!r}\n  {data}', file=sys.stderr)
+    print(f'{"FAILED" if mismatched else "OK"} in {time.perf_counter() - started:.1f}s')
+    return 1 if mismatched else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
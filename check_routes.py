@@ -0,0 +1,371 @@
+# Route-level checks for the Saudi Arabian CTAS Triage System
+# Drives every JSON, streaming and page route through the Flask test client
+# against scratch databases: status codes, error codes, headers and body
+# layout, and CTAS levels compared with ctas_reference.py for seeded forms.
+#
+# Exits with status 1 if any check fails.
+#
+# Usage:
+#   python check_routes.py
+#   python check_routes.py --forms 500 --seed 7
+
+import argparse
+import atexit
+import html.parser
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# The app reads its configuration at import, so point it at scratch files first
+_scratch = tempfile.mkdtemp(prefix='ctas-routes-')
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault('FLASK_ENV', 'development')
+os.environ['ASSESSMENT_DB'] = os.path.join(_scratch, 'assessments.db')
+os.environ['QUEUE_DB'] = os.path.join(_scratch, 'queue.db')
+os.environ['TRIAGE_TABLE_PATH'] = os.path.join(_scratch, 'triage_table.bin')
+os.environ['REASSESSMENT_SCHEDULER_ENABLED'] = 'False'
+os.environ['EXPORT_TOKEN'] = 'check-routes'
+os.environ['SESSION_COOKIE_SECURE'] = 'False'
+
+import app as triage_app  # noqa: E402
+import ctas_reference  # noqa: E402
+from workload import malformed_form, professional_form, self_assessment_form  # noqa: E402
+
+EXPORT_AUTH = {'Authorization': 'Bearer check-routes'}
+
+class Checker:
+    """Counts checks and keeps the first failures."""
+
+    def __init__(self):
+        self.checks = 0
+        self.failures = []
+
+    def expect(self, name, condition, detail=''):
+        self.checks += 1
+        if not condition:
+            self.failures.append(f'{name}: {detail}' if detail else name)
+        return condition
+
+    def status(self, name, response, status):
+        return self.expect(name, response.status_code == status,
+                           f'expected {status}, got {response.status_code} {response.get_data(as_text=True)[:200]!r}')
+
+def reference_level(data):
+    return ctas_reference.calculate_ctas_logic(data)
+
+def triage_forms(rng, count, generator=professional_form):
+    """Forms with the age and complaint the single-patient routes require."""
+    forms = []
+    while len(forms) < count:
+        data = generator(rng)
+        if data.get('patient_age') and data.get('chief_complaint'):
+            forms.append(data)
+    return forms
+
+def check_calculate_ctas(client, forms, check):
+    mismatched = 0
+    for data in forms:
+        response = client.post('/calculate_ctas?lang=en', data=data)
+        if not check.status('/calculate_ctas', response, 200):
+            continue
+        body = response.get_json()
+        if (body['ctas_level'], body['reassessment_interval']) != reference_level(data):
+            mismatched += 1
+    check.expect('/calculate_ctas levels', not mismatched, f'{mismatched} of {len(forms)} differ from the reference')
+
+    response = client.post('/calculate_ctas?lang=en', data={'patient_age': '40'})
+    if check.status('/calculate_ctas without a complaint', response, 400):
+        check.expect('/calculate_ctas error code', response.get_json()['error_code'] == 'MISSING_COMPLAINT')
+
+def check_calculate_ctas_batch(client, forms, check):
+    expected = [reference_level(data) for data in forms]
+    response = client.post('/calculate_ctas_batch', json={'records': forms})
+    if check.status('/calculate_ctas_batch records', response, 200):
+        body = response.get_json()
+        check.expect('/calculate_ctas_batch count', body['count'] == len(forms))
+        check.expect('/calculate_ctas_batch levels',
+                     list(zip(body['ctas_levels'], body['reassessment_intervals'])) == expected)
+
+    columns = {field: [data.get(field) for data in forms] for field in forms[0]}
+    response = client.post('/calculate_ctas_batch', json={'columns': columns})
+    if check.status('/calculate_ctas_batch columns', response, 200):
+        check.expect('/calculate_ctas_batch column levels',
+                     response.get_json()['ctas_levels'] == [level for level, _ in expected])
+
+    response = client.post('/calculate_ctas_batch', json={'records': [1]})
+    if check.status('/calculate_ctas_batch with a non-object record', response, 400):
+        check.expect('/calculate_ctas_batch error code', response.get_json()['error_code'] == 'INVALID_BATCH')
+    response = client.post('/calculate_ctas_batch', json={'columns': {'patient_age': ['1'], 'spo2': []}})
+    check.status('/calculate_ctas_batch with uneven columns', response, 400)
+
+def check_api_v2(client, forms, check):
+    mismatched = 0
+    for data in forms:
+        response = client.post('/api/v2/triage', json=data)
+        if not check.status('/api/v2/triage', response, 200):
+            continue
+        body = response.get_json()
+        if (body['level'], body['interval']) != reference_level(data):
+            mismatched += 1
+    check.expect('/api/v2/triage levels', not mismatched, f'{mismatched} of {len(forms)} differ from the reference')
+
+    # JSON numbers too large for an int are treated as missing, not a crash
+    response = client.post('/api/v2/triage', data='{"patient_age": 40, "chief_complaint": "rash", "heart_rate": 1e999}',
+                           content_type='application/json')
+    check.status('/api/v2/triage with an overflowing number', response, 200)
+    response = client.post('/api/v2/triage', json={'patient_age': [1]})
+    if check.status('/api/v2/triage with a list value', response, 400):
+        check.expect('/api/v2/triage error code', response.get_json()['error_code'] == 'INVALID_FIELD_TYPE')
+    response = client.post('/api/v2/triage', json={'kind': 'other'})
+    check.status('/api/v2/triage with an unknown kind', response, 400)
+
+def check_incident_intake(client, forms, check):
+    body = ''.join(json.dumps(data) + '\n' for data in forms) + '[1, 2]\n'
+    response = client.post('/incident/intake?lang=en', data=body, content_type='application/x-ndjson')
+    if not check.status('/incident/intake', response, 200):
+        return
+    check.expect('/incident/intake content type', response.mimetype == 'application/x-ndjson')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    results, summary = lines[:-1], lines[-1].get('summary')
+    check.expect('/incident/intake results', len(results) == len(forms) + 1)
+    levels = [(result.get('level'), result.get('interval')) for result in results[:len(forms)]]
+    check.expect('/incident/intake levels', levels == [reference_level(data) for data in forms])
+    check.expect('/incident/intake non-object record', results[-1].get('error_code') == 'INVALID_RECORD')
+    check.expect('/incident/intake summary', summary is not None and summary['count'] == len(forms) + 1
+                 and summary['errors'] == 1)
+
+    response = client.post('/incident/intake', data='{"patient_age": \n', content_type='application/x-ndjson')
+    if check.status('/incident/intake with a broken line', response, 400):
+        check.expect('/incident/intake error code', response.get_json()['error_code'] == 'INVALID_NDJSON')
+    check.status('/incident/intake without records', client.post('/incident/intake', json={}), 400)
+
+def check_overflow(client, check):
+    """A 400-digit JSON integer is out of range, or missing for a float field, on every JSON route."""
+    for field, warning in (('heart_rate', 'HEART_RATE'), ('patient_age', 'PATIENT_AGE'), ('temperature', 'TEMPERATURE')):
+        for sign, side in ((1, 'HIGH'), (-1, 'LOW')):
+            data = {'patient_age': 40, 'chief_complaint': 'rash', 'facility': 'check-overflow', field: sign * 10 ** 400}
+            name = f'{field}={"-" if sign < 0 else ""}10**400'
+            try:
+                expected = reference_level(data)
+            except OverflowError:  # the original engine crashed; the app reads the value as missing
+                expected = reference_level({**data, field: None})
+
+            response = client.post('/api/v2/triage', json=data)
+            if check.status(f'/api/v2/triage {name}', response, 200):
+                body = response.get_json()
+                check.expect(f'/api/v2/triage {name} level', (body['level'], body['interval']) == expected)
+                check.expect(f'/api/v2/triage {name} warning', body['warnings'] == [f'{warning}_{side}'],
+                             str(body['warnings']))
+            for payload in ({'records': [data]}, {'columns': {key: [value] for key, value in data.items()}}):
+                response = client.post('/calculate_ctas_batch', json=payload)
+                if check.status(f'/calculate_ctas_batch {name}', response, 200):
+                    check.expect(f'/calculate_ctas_batch {name} level',
+                                 response.get_json()['ctas_levels'] == [expected[0]])
+            response = client.post('/queue', json=data)
+            if check.status(f'POST /queue {name}', response, 201):
+                check.expect(f'POST /queue {name} level', response.get_json()['ctas_level'] == expected[0])
+            response = client.post('/incident/intake', json=[data])
+            if check.status(f'/incident/intake {name}', response, 200):
+                result = json.loads(response.get_data(as_text=True).splitlines()[0])
+                check.expect(f'/incident/intake {name} level', result.get('level') == expected[0], str(result))
+
+def check_board_reconnect(client, check, facility):
+    """A screen resuming from the id of its snapshot gets no second snapshot, even at id 0."""
+    first = client.get(f'/board/events?facility={facility}')
+    if not check.status('/board/events new screen', first, 200):
+        return
+    text = first.get_data(as_text=True)
+    ids = [line[4:] for line in text.splitlines() if line.startswith('id: ')]
+    if not check.expect('/board/events new screen snapshot', 'event: snapshot' in text and ids, text[:200]):
+        return
+    again = client.get(f'/board/events?facility={facility}', headers={'Last-Event-ID': ids[-1]})
+    if check.status('/board/events reconnect', again, 200):
+        check.expect(f'/board/events reconnect from id {ids[-1]}', 'event: snapshot' not in again.get_data(as_text=True),
+                     'the snapshot was sent again')
+
+def check_queue(client, check):
+    facility = 'check-routes'
+    urgent = {'patient_age': '40', 'chief_complaint': 'stroke', 'symptom_onset_time': '1',
+              'facility': facility, 'patient_label': 'urgent'}
+    minor = {'patient_age': '30', 'chief_complaint': 'rash', 'facility': facility, 'patient_label': 'minor'}
+    responses = [client.post('/queue', json=data) for data in (minor, urgent)]
+    if not all(check.status('POST /queue', response, 201) for response in responses):
+        return
+    minor_entry, urgent_entry = (response.get_json() for response in responses)
+    check.expect('POST /queue levels', (urgent_entry['ctas_level'], minor_entry['ctas_level']) == (2, 5))
+
+    waiting = client.get(f'/queue?facility={facility}').get_json()
+    check.expect('GET /queue order', [entry['patient_label'] for entry in waiting['patients']] == ['urgent', 'minor'])
+    check.status('GET /queue/overdue', client.get(f'/queue/overdue?facility={facility}'), 200)
+
+    events = client.get(f'/board/events?facility={facility}')
+    if check.status('/board/events', events, 200):
+        text = events.get_data(as_text=True)
+        check.expect('/board/events content type', events.mimetype == 'text/event-stream')
+        check.expect('/board/events snapshot', text.startswith('retry:') and 'event: snapshot' in text)
+    check_board_reconnect(client, check, facility)
+
+    response = client.post(f"/queue/{minor_entry['queue_id']}/retriage", json={'patient_age': '30', 'spo2': '85'})
+    if check.status('/queue/<id>/retriage', response, 200):
+        check.expect('/queue/<id>/retriage level', response.get_json()['ctas_level'] == 1)
+    check.status('/queue/<id>/retriage unknown id', client.post('/queue/unknown/retriage', json=minor), 404)
+
+    response = client.post(f'/queue/next?facility={facility}')
+    if check.status('/queue/next', response, 200):
+        check.expect('/queue/next order', response.get_json()['patient_label'] == 'minor')
+    check.status('/queue/<id>/remove', client.post(f"/queue/{urgent_entry['queue_id']}/remove"), 200)
+    check.status('/queue/<id>/remove unknown id', client.post('/queue/unknown/remove'), 404)
+    check.status('/queue/next when empty', client.post(f'/queue/next?facility={facility}'), 404)
+
+    for body in ({**minor, 'patient_label': ['a']}, {**minor, 'facility': {'x': 1}}, {**minor, 'assessment_id': [1]}):
+        response = client.post('/queue', json=body)
+        if check.status('POST /queue with a list or object field', response, 400):
+            check.expect('POST /queue error code', response.get_json()['error_code'] == 'INVALID_FIELD_TYPE')
+    response = client.post('/queue', json={**minor, 'facility': 7, 'patient_id': 12345, 'patient_label': None})
+    if check.status('POST /queue with number fields', response, 201):
+        entry = response.get_json()
+        check.expect('POST /queue number fields as text', (entry['facility'], entry['patient_label']) == ('7', '12345'),
+                     str(entry))
+        client.post(f"/queue/{entry['queue_id']}/remove")
+
+def check_export_csv(client, check):
+    if triage_app.assessment_store is not None:
+        triage_app.assessment_store.flush()
+    response = client.get('/export_csv')
+    if check.status('/export_csv without a token', response, 401):
+        check.expect('/export_csv challenge', response.headers.get('WWW-Authenticate') == 'Bearer')
+    check.status('/export_csv with a wrong token', client.get('/export_csv', headers={'Authorization': 'Bearer x'}), 401)
+
+    response = client.get('/export_csv?lang=en', headers=EXPORT_AUTH)
+    if check.status('/export_csv', response, 200):
+        text = response.get_data(as_text=True)
+        check.expect('/export_csv header', text.startswith('\ufeffPatient Name,'))
+        check.expect('/export_csv rows', len(text.splitlines()) > 1, 'no assessments exported')
+    response = client.get('/export_csv?start=2020-01-01T00:00:00%2B03:00&end=2099-12-31', headers=EXPORT_AUTH)
+    check.status('/export_csv with an offset date', response, 200)
+    response = client.get('/export_csv?start=yesterday', headers=EXPORT_AUTH)
+    if check.status('/export_csv with a bad date', response, 400):
+        check.expect('/export_csv error code', response.get_json()['error_code'] == 'INVALID_DATE')
+    check.status('/export_csv with a bad kind', client.get('/export_csv?kind=x', headers=EXPORT_AUTH), 400)
+
+def check_pages(client, check):
+    for path in ('/', '/reference', '/self_diagnosis'):
+        response = client.get(path, headers={'Accept-Language': 'en-US,en;q=0.9'})
+        if check.status(f'{path} redirect', response, 302):
+            check.expect(f'{path} location', response.headers['Location'] == f'/en{path}')
+            check.expect(f'{path} vary', 'Accept-Language' in response.headers.get('Vary', ''))
+        response = client.get(f'{path}?lang=ar', headers={'Accept-Language': 'en'})
+        check.expect(f'{path}?lang=ar redirect', response.headers.get('Location', '').startswith('/ar/'))
+        for lang in triage_app.SUPPORTED_LANGUAGES:
+            page = client.get(f"/{lang}{path}")
+            if check.status(f'/{lang}{path}', page, 200):
+                check.expect(f'/{lang}{path} cookie', 'Set-Cookie' not in page.headers)
+                again = client.get(f"/{lang}{path}", headers={'If-None-Match': page.headers['ETag']})
+                check.status(f'/{lang}{path} revalidation', again, 304)
+    check.status('unsupported language', client.get('/xx/'), 404)
+
+class SelectParser(html.parser.HTMLParser):
+    """Collects each <select> of a page as {id: {option value: option text}}."""
+
+    def __init__(self):
+        super().__init__()
+        self.selects = {}
+        self._select = None
+        self._value = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'select':
+            self._select = self.selects.setdefault(attrs.get('id'), {})
+        elif tag == 'option' and self._select is not None:
+            self._value = attrs.get('value', '')
+            self._select[self._value] = ''
+
+    def handle_data(self, data):
+        if self._value is not None:
+            self._select[self._value] += data
+
+    def handle_endtag(self, tag):
+        if tag == 'option':
+            if self._value is not None:
+                self._select[self._value] = self._select[self._value].strip()
+            self._value = None
+        elif tag == 'select':
+            self._select = None
+
+def check_form_labels(client, check):
+    """Every select on the triage form offers exactly the catalog's values and text."""
+    catalogs = {'en': triage_app.PROFESSIONAL_LABELS_EN, 'ar': triage_app.PROFESSIONAL_LABELS_AR}
+    for lang, catalog in catalogs.items():
+        page = client.get(f'/{lang}/')
+        if not check.status(f'/{lang}/ form', page, 200):
+            continue
+        parser = SelectParser()
+        parser.feed(page.get_data(as_text=True))
+        check.expect(f'/{lang}/ selects', parser.selects, 'no <select> found')
+        for field, options in parser.selects.items():
+            check.expect(f'/{lang}/ #{field} options', options == catalog.get(field),
+                         f'form {options} != catalog {catalog.get(field)}')
+
+def check_self_assessment(client, forms, check):
+    for data in forms:
+        response = client.post('/calculate_self_assessment?lang=en', data=data)
+        if check.status('/calculate_self_assessment', response, 200):
+            check.expect('/calculate_self_assessment level', response.get_json()['level'] in range(1, 6))
+        response = client.post('/download_self_assessment_csv?lang=en', data=data)
+        check.status('/download_self_assessment_csv', response, 200)
+
+def check_monitoring(client, check):
+    response = client.get('/health')
+    if check.status('/health', response, 200):
+        body = response.get_json()
+        check.expect('/health status', body['status'] == 'healthy')
+        if triage_app.assessment_store is not None:
+            check.expect('/health writer', body['assessment_store']['writer_alive'])
+    response = client.get('/metrics')
+    if triage_app.METRICS_ENABLED and check.status('/metrics', response, 200):
+        text = response.get_data(as_text=True)
+        for name in ('ctas_requests_total', 'ctas_triage_results_total', 'ctas_queue_waiting'):
+            check.expect(f'/metrics {name}', name in text)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Check the CTAS routes through the Flask test client.')
+    parser.add_argument('--forms', type=int, default=200, help='random forms per triage route (default: 200)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    forms = triage_forms(rng, args.forms)
+    malformed = [malformed_form(rng) for _ in range(args.forms)]
+    client = triage_app.app.test_client()
+
+    started = time.perf_counter()
+    check = Checker()
+    # First, while the board log is still empty and its last id is 0
+    check_board_reconnect(client, check, 'check-quiet')
+    check_calculate_ctas(client, forms, check)
+    check_calculate_ctas_batch(client, forms + malformed, check)
+    check_api_v2(client, forms + triage_forms(rng, args.forms, malformed_form), check)
+    check_incident_intake(client, forms, check)
+    check_overflow(client, check)
+    check_queue(client, check)
+    check_export_csv(client, check)
+    check_pages(client, check)
+    check_form_labels(client, check)
+    check_self_assessment(client, [self_assessment_form(rng) for _ in range(20)], check)
+    check_monitoring(client, check)
+
+    for failure in check.failures[:20]:
+        print(f'FAILED {failure}', file=sys.stderr)
+    print(f'{check.checks} checks, {len(check.failures)} failed')
+    print(f'{"FAILED" if check.failures else "OK"} in {time.perf_counter() - started:.1f}s')
+    return 1 if check.failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# Equivalence check for the quantized CTAS outcome table (triage_table.py)
+# Compares the table with the reference evaluator, evaluate_ctas_rules:
+#
+#   1. every bin combination of every factor, with the other fields at their
+#      defaults and then in random contexts (random bins, random values
+#      inside each bin)
+#   2. a fine sweep of every numeric field across its thresholds, including
+#      the nearest floats either side of each threshold
+#   3. the NumPy lookup used by calculate_ctas_batch on all of the above,
+#      and calculate_ctas_batch against calculate_ctas_logic on random forms
+#
+# Levels and reason bits must match exactly. Exits with status 1 on any
+# mismatch, so it can gate a change to the rule tables.
+#
+# Usage:
+#   python check_triage_table.py
+#   python check_triage_table.py --contexts 5 --seed 7
+
+import argparse
+import itertools
+import math
+import random
+import sys
+import time
+
+import numpy as np
+
+import triage_table
+from app import (
+    CTAS_TABLE_FACTORS,
+    CTAS_TABLE_FIELDS,
+    TRIAGE_TABLE_PATH,
+    calculate_ctas_batch,
+    calculate_ctas_logic,
+    ctas_reason_names,
+    ctas_table,
+    evaluate_ctas_rules,
+    open_ctas_table,
+    parse_triage_input,
+)
+from workload import malformed_form, professional_form
+
+def sample(bins, index, rng):
+    """A random value in bin `index` of `bins`."""
+    if isinstance(bins, triage_table.CategoryBins):
+        if index == 0:
+            # Text fields may hold anything; flags are always parsed to a bool
+            return rng.choice([bins.other, None, '', 'other']) if isinstance(bins.other, str) else bins.other
+        return bins.values[index - 1]
+    if index == 0:
+        return None
+    if index == 1:
+        return float('nan')
+    thresholds = bins.thresholds
+    if index % 2:
+        return thresholds[(index - 3) // 2]
+    k = (index - 2) // 2
+    low = thresholds[k - 1] if k > 0 else thresholds[0] - 50
+    high = thresholds[k] if k < len(thresholds) else thresholds[-1] + 50
+    value = rng.uniform(low, high)
+    # Whole numbers where the bin has one, as most fields are entered
+    whole = math.floor(value)
+    if low < whole < high and rng.random() < 0.5:
+        return whole
+    return value if low < value < high else (low + high) / 2
+
+def make_inputs(values):
+    inputs = parse_triage_input({})
+    for field, value in values.items():
+        setattr(inputs, field, value)
+    return inputs
+
+def factor_cases(table, contexts, rng):
+    """Every bin combination of every factor, in `contexts` + 1 settings of the other fields."""
+    fields = table.fields
+    representatives = {field: bins.representatives() for field, bins in fields.items()}
+    for factor in table.factors:
+        others = [field for field in fields if field not in factor]
+        ranges = [range(fields[field].size) for field in factor]
+        for combination in itertools.product(*ranges):
+            values = {field: representatives[field][i] for field, i in zip(factor, combination)}
+            yield make_inputs(values)
+            for _ in range(contexts):
+                values = {field: sample(fields[field], rng.randrange(fields[field].size), rng) for field in others}
+                values.update((field, sample(fields[field], i, rng)) for field, i in zip(factor, combination))
+                yield make_inputs(values)
+
+def sweep_cases(table, rng):
+    """Each numeric field from below its first threshold to above its last, in steps of 0.1."""
+    fields = table.fields
+    for field, bins in fields.items():
+        if not isinstance(bins, triage_table.NumericBins):
+            continue
+        low, high = bins.thresholds[0] - 5, bins.thresholds[-1] + 5
+        values = [round(low + 0.1 * i, 1) for i in range(int((high - low) * 10) + 1)]
+        for threshold in bins.thresholds:
+            values += [math.nextafter(threshold, -math.inf), threshold, math.nextafter(threshold, math.inf)]
+        for value in values:
+            yield make_inputs({field: value})
+            context = {other: sample(fields[other], rng.randrange(fields[other].size), rng)
+                       for other in fields if other != field}
+            context[field] = value
+            yield make_inputs(context)
+
+def describe(inputs, table):
+    return {field: getattr(inputs, field) for field in table.fields}
+
+def check_cases(name, table, cases, failures):
+    cases = list(cases)
+    expected = [evaluate_ctas_rules(inputs)[::2] for inputs in cases]
+    mismatched = 0
+    for inputs, reference in zip(cases, expected):
+        result = table.lookup(inputs)
+        if result != reference:
+            mismatched += 1
+            if len(failures) < 10:
+                failures.append((name, describe(inputs, table), reference, result))
+
+    # The NumPy lookup, with bins computed exactly as the scalar lookup does
+    bins = {field: np.fromiter((field_bins.index(getattr(inputs, field)) for inputs in cases),
+                               dtype=np.intp, count=len(cases))
+            for field, field_bins in table.fields.items()}
+    levels, reasons = table.lookup_bins(bins, len(cases))
+    expected_levels = np.array([level for level, _ in expected])
+    expected_reasons = np.array([reason for _, reason in expected])
+    batch_mismatched = int(((levels != expected_levels) | (reasons != expected_reasons)).sum())
+    if batch_mismatched and len(failures) < 10:
+        first = int(np.flatnonzero((levels != expected_levels) | (reasons != expected_reasons))[0])
+        failures.append((f'{name} (NumPy)', describe(cases[first], table), expected[first],
+                         (int(levels[first]), int(reasons[first]))))
+    print(f'{name}: {len(cases)} cases, {mismatched} mismatched, {batch_mismatched} mismatched in NumPy')
+    return mismatched + batch_mismatched
+
+def check_batch(forms, failures):
+    expected = np.array([calculate_ctas_logic(form)[0] for form in forms])
+    levels, _ = calculate_ctas_batch(forms)
+    mismatched = np.flatnonzero(levels != expected)
+    if len(mismatched) and len(failures) < 10:
+        first = int(mismatched[0])
+        failures.append(('calculate_ctas_batch', forms[first], int(expected[first]), int(levels[first])))
+    print(f'calculate_ctas_batch: {len(forms)} forms, {len(mismatched)} mismatched')
+    return len(mismatched)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Check the CTAS outcome table against the reference evaluator.')
+    parser.add_argument('--contexts', type=int, default=2,
+                        help='random settings of the other fields per bin combination (default: 2)')
+    parser.add_argument('--forms', type=int, default=20000, help='random forms for the batch check (default: 20000)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    table = ctas_table or open_ctas_table(TRIAGE_TABLE_PATH)
+    if table.fields is not CTAS_TABLE_FIELDS or table.factors is not CTAS_TABLE_FACTORS:
+        raise SystemExit('The outcome table was not built from the app rule tables')
+    print(f'{len(table.factors)} factors, {table.size} entries')
+
+    started = time.perf_counter()
+    failures = []
+    mismatched = check_cases('bin combinations', table, factor_cases(table, args.contexts, rng), failures)
+    mismatched += check_cases('threshold sweep', table, sweep_cases(table, rng), failures)
+    forms = [professional_form(rng) if i % 2 else malformed_form(rng) for i in range(args.forms)]
+    mismatched += check_batch(forms, failures)
+
+    for name, inputs, expected, result in failures:
+        print(f'\nMISMATCH in {name}: expected {expected}, got {result}\n  {inputs}', file=sys.stderr)
+        if isinstance(expected, tuple):
+            print(f'  expected reasons {ctas_reason_names(expected[1])}, got {ctas_reason_names(result[1])}',
+                  file=sys.stderr)
+    print(f'{"FAILED" if mismatched else "OK"} in {time.perf_counter() - started:.1f}s')
+    return 1 if mismatched else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# Reference CTAS engine for check_equivalence.py
+# A frozen copy of safe_int, safe_float, validate_medical_ranges,
+# calculate_ctas_logic and get_reassessment_interval as they were before the
+# rule tables were compiled (commit 8defdfc). The app's engine must keep giving
+# the same results, so do not edit this file to follow a change in app.py; a
+# deliberate change to the CTAS rules updates both, in the same commit.
+
+def safe_int(value):
+    """Helper function to safely convert to int or return None."""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+def safe_float(value):
+    """Helper function to safely convert to float or return None."""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+# Medical validation ranges (extreme but clinically possible values)
+MEDICAL_RANGES = {
+    'patient_age': {'min': 0, 'max': 120, 'unit': 'years'},
+    'heart_rate': {'min': 30, 'max': 220, 'unit': 'bpm'},
+    'resp_rate': {'min': 5, 'max': 60, 'unit': '/min'},
+    'spo2': {'min': 70, 'max': 100, 'unit': '%'},
+    'bp_systolic': {'min': 50, 'max': 250, 'unit': 'mmHg'},
+    'bp_diastolic': {'min': 30, 'max': 150, 'unit': 'mmHg'},
+    'temperature': {'min': 32, 'max': 45, 'unit': '°C'},
+    'gcs_score': {'min': 3, 'max': 15, 'unit': 'points'},
+    'pain_score': {'min': 0, 'max': 10, 'unit': 'points'},
+    'glucose': {'min': 1, 'max': 50, 'unit': 'mmol/L'}
+}
+
+def validate_medical_ranges(data):
+    """Validate input data against medical ranges."""
+    warnings = []
+    
+    for field, range_info in MEDICAL_RANGES.items():
+        if field in data and data[field]:
+            try:
+                value = float(data[field])
+                if value < range_info['min'] or value > range_info['max']:
+                    warnings.append({
+                        'field': field,
+                        'value': value,
+                        'range': f"{range_info['min']}-{range_info['max']} {range_info['unit']}",
+                        'message': f"{field} ({value}) outside normal range"
+                    })
+            except (ValueError, TypeError):
+                continue
+    
+    return warnings
+
+def calculate_ctas_logic(data):
+    """Calculate CTAS level using Canadian Triage and Acuity Scale as implemented in Saudi Arabia."""
+    
+    # --- Get Input Data ---
+    age = safe_float(data.get('patient_age'))
+    complaint = data.get('chief_complaint', '')
+    hr = safe_int(data.get('heart_rate'))
+    rr = safe_int(data.get('resp_rate'))
+    spo2 = safe_int(data.get('spo2'))
+    bp_sys = safe_int(data.get('bp_systolic'))
+    temp = safe_float(data.get('temperature'))
+    gcs = safe_int(data.get('gcs_score'))
+    avpu = data.get('avpu')
+    pain = safe_int(data.get('pain_score', 0))
+    resp_distress = data.get('respiratory_distress', 'none')
+    bleeding = data.get('bleeding', 'none')
+    moi = data.get('mechanism_injury', 'none')
+    glucose = safe_float(data.get('glucose'))
+    dehydration = data.get('dehydration', 'none')
+    is_frail = data.get('is_frail') == 'true'
+    symptom_onset_time = safe_float(data.get('symptom_onset_time'))
+    
+    # Saudi-specific factors
+    heat_exposure = data.get('heat_exposure', 'no')
+    diabetes_status = data.get('has_diabetes', 'no')
+    time_waiting = safe_int(data.get('time_waiting', 0))
+
+    # Use AVPU if GCS is not provided
+    loc_indicator = gcs if gcs is not None else avpu
+
+    ctas_level = 5  # Default to CTAS V (Non-urgent)
+
+    # --- Determine Age Group (Saudi pediatric ranges) ---
+    age_group = 'adult'  # Default
+    if age is not None:
+        if age < 1/12: age_group = 'newborn'  # < 1 month
+        elif age < 1: age_group = 'infant'
+        elif age < 3: age_group = 'toddler'
+        elif age < 5: age_group = 'preschool'
+        elif age < 12: age_group = 'school_age'
+        elif age < 18: age_group = 'adolescent'
+
+    # --- Saudi-specific heat illness check (HIGH PRIORITY) ---
+    if heat_exposure == 'yes' and temp is not None and temp >= 40.0:
+        return 1, get_reassessment_interval(1)
+    elif heat_exposure == 'yes' and (temp is not None and temp >= 38.5) and dehydration in ['moderate', 'severe']:
+        return 2, get_reassessment_interval(2)
+
+    # --- CTAS I: Resuscitation (Immediate) ---
+    is_ctas1 = False
+    
+    # Critical LOC
+    if (gcs is not None and gcs < 9) or (gcs is None and avpu in ['U', 'P']):
+        is_ctas1 = True
+    
+    # Life-threatening conditions
+    elif complaint in ['cardiac_arrest', 'resp_arrest'] or \
+         resp_distress == 'severe' or \
+         (spo2 is not None and spo2 < 90) or \
+         bleeding == 'severe' or \
+         complaint in ['shock', 'major_trauma', 'anaphylaxis', 'seizure_active']:
+        is_ctas1 = True
+    
+    # Critical vital signs (Saudi pediatric ranges)
+    elif age_group == 'newborn' and ((hr is not None and (hr < 120 or hr > 200)) or (rr is not None and (rr < 30 or rr > 80))):
+        is_ctas1 = True
+    elif age_group == 'infant' and ((hr is not None and (hr < 100 or hr > 200)) or (rr is not None and (rr < 25 or rr > 70))):
+        is_ctas1 = True
+    elif age_group == 'toddler' and ((hr is not None and (hr < 90 or hr > 180)) or (rr is not None and (rr < 20 or rr > 50))):
+        is_ctas1 = True
+    elif age_group == 'preschool' and ((hr is not None and (hr < 80 or hr > 160)) or (rr is not None and (rr < 20 or rr > 40))):
+        is_ctas1 = True
+    elif age_group == 'school_age' and ((hr is not None and (hr < 70 or hr > 140)) or (rr is not None and (rr < 15 or rr > 35))):
+        is_ctas1 = True
+    elif age_group == 'adolescent' and ((hr is not None and (hr < 60 or hr > 140)) or (rr is not None and (rr < 12 or rr > 30))):
+        is_ctas1 = True
+    elif age_group == 'adult' and ((hr is not None and (hr < 40 or hr > 140)) or (rr is not None and (rr < 8 or rr > 35)) or (bp_sys is not None and bp_sys < 80)):
+        is_ctas1 = True
+
+    if is_ctas1: return 1, get_reassessment_interval(1)
+
+    # --- CTAS II: Emergent (≤15 minutes) ---
+    is_ctas2 = False
+    
+    # Time-Sensitive CVA Modifier
+    if complaint == 'stroke' and symptom_onset_time is not None and symptom_onset_time < 4.5:
+        is_ctas2 = True
+
+    # Altered LOC
+    if (gcs is not None and 9 <= gcs <= 13) or (gcs is None and avpu == 'V'):
+        is_ctas2 = True
+    
+    # High-risk conditions
+    if complaint in ['chest_pain_cardiac', 'stroke', 'sepsis', 'overdose'] or \
+         resp_distress == 'moderate' or \
+         (pain is not None and pain >= 8) or \
+         complaint in ['severe_pain', 'head_injury_moderate', 'vaginal_bleeding_heavy', 'fever_infant', 'psych_severe'] or \
+         dehydration == 'severe' or moi == 'significant':
+        is_ctas2 = True
+    
+    # Diabetic emergency (high prevalence in Saudi Arabia)
+    if diabetes_status == 'yes' and glucose is not None and (glucose < 3.0 or glucose > 20.0):
+        is_ctas2 = True
+    
+    # Concerning vital signs
+    if (spo2 is not None and 90 <= spo2 < 92):
+        is_ctas2 = True
+        
+    # Paediatric Fever Logic
+    if age is not None and age >= 0.25 and age <= 1.5 and temp is not None and temp >= 38.5: # 3-18 months
+        is_ctas2 = True
+
+    if is_ctas2: return 2, get_reassessment_interval(2)
+
+    # --- CTAS III: Urgent (≤30 minutes) ---
+    is_ctas3 = False
+    
+    if gcs is not None and gcs == 14:
+        is_ctas3 = True
+    
+    if resp_distress == 'mild' or \
+         (pain is not None and 4 <= pain <= 7) or \
+         complaint == 'abdominal_pain_severe' or \
+         bleeding == 'moderate' or dehydration == 'moderate' or \
+         (temp is not None and temp >= 39.0):
+        is_ctas3 = True
+    
+    # Time-based upgrade for patients waiting too long
+    if time_waiting is not None and time_waiting > 120:
+        is_ctas3 = True
+
+    if is_ctas3: ctas_level = 3
+
+    # --- CTAS IV: Less Urgent (≤60 minutes) ---
+    is_ctas4 = False
+    if complaint in ['minor_trauma', 'vomiting_diarrhea_mild'] or \
+       (pain is not None and 2 <= pain <= 3) or \
+       bleeding == 'minor' or dehydration == 'mild' or \
+       (temp is not None and temp >= 38.0):
+        is_ctas4 = True
+
+    if is_ctas4 and ctas_level == 5: ctas_level = 4
+
+    # Frailty Modifier
+    if is_frail and ctas_level in [4, 5]:
+        ctas_level = 3
+
+    return ctas_level, get_reassessment_interval(ctas_level)
+
+def get_reassessment_interval(ctas_level):
+    if ctas_level == 1:
+        return 0 # Continuous
+    elif ctas_level == 2:
+        return 15
+    elif ctas_level == 3:
+        return 30
+    elif ctas_level == 4:
+        return 60
+    else:
+        return 120
@@ -3,6 +3,8 @@
 
 import os
 import multiprocessing
+import shutil
+import tempfile
 
 # Server socket - Railway provides PORT environment variable
 bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
@@ -22,6 +24,39 @@ max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 50))
 # Application
 wsgi_app = "app:app"
 
+# Prometheus metrics: workers keep their counters in mmap files here and
+# /metrics merges them. Must be set before the app (and prometheus_client) is
+# loaded, and emptied on startup so counts from a previous run do not leak in.
+# The default is per master (ctas-metrics-<pid>), so a second instance or a
+# test run on the same host never wipes a running server's counters; it is
+# removed on exit, along with any left behind by masters that no longer run.
+METRICS_PARENT = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+METRICS_PREFIX = 'ctas-metrics-'
+
+def _remove_stale_metrics_dirs():
+    for name in os.listdir(METRICS_PARENT):
+        pid = name[len(METRICS_PREFIX):]
+        if not name.startswith(METRICS_PREFIX) or not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(METRICS_PARENT, name), ignore_errors=True)
+        except PermissionError:  # alive, owned by another user
+            pass
+
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    own_metrics_dir = False
+else:
+    _remove_stale_metrics_dirs()
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(
+        METRICS_PARENT, f'{METRICS_PREFIX}{os.getpid()}'
+    )
+    own_metrics_dir = True
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
 # Logging - Railway handles log aggregation
 accesslog = "-"  # Log to stdout for Railway
 errorlog = "-"   # Log to stderr for Railway
@@ -70,11 +105,20 @@ def pre_fork(server, worker):
     print(f"👷 Worker {worker.pid} starting...")
 
 def post_fork(server, worker):
+    # Background threads do not survive the fork, so each worker starts its own
+    from app import start_background_tasks
+    start_background_tasks()
     print(f"✅ Worker {worker.pid} started successfully")
 
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
 def worker_abort(worker):
     print(f"❌ Worker {worker.pid} aborted")
 
 def on_exit(server):
+    if own_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
     print("🛑 Saudi Arabian CTAS Triage System shutting down...")
     print("👋 Healthcare system offline!") 
\ No newline at end of file
@@ -0,0 +1,145 @@
+# Live triage board events for the Saudi Arabian CTAS Triage System
+#
+# Every change a wall display cares about (new assessment, patient queued,
+# level changed, reassessment due, patient seen or left) is appended to an
+# event log in SQLite, so all gunicorn workers share one ordered sequence.
+# The board stream (/board/events) is Server-Sent Events that never holds a
+# worker. Each request answers with the events after the client's
+# Last-Event-ID and closes. The browser's EventSource reconnects after the
+# `retry` delay and resumes from the last id it saw. A screen thus only
+# downloads changes, and dozens of screens cost a few indexed reads a second.
+#
+# publish() only queues the event; a background thread per worker writes them
+# in batches, like the assessment store.
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from assessment_store import connect
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS board_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    facility TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_board_events_facility ON board_events (facility, id);
+CREATE INDEX IF NOT EXISTS idx_board_events_created_at ON board_events (created_at);
+"""
+
+INSERT_SQL = "INSERT INTO board_events (facility, created_at, event, data) VALUES (?, ?, ?, ?)"
+
+def format_sse(event, data, event_id=None):
+    """One Server-Sent Events message; `data` is JSON-encoded."""
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {event}')
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+class BoardEvents:
+    """Shared, ordered log of board events with a batched, non-blocking writer."""
+
+    def __init__(self, path, retention=86400.0, flush_interval=0.2, max_pending=10000):
+        self.path = path
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def _connection(self):
+        # SQLite connections must not cross fork, so keep one per process and thread
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            local.connection = connect(self.path)
+            local.pid = os.getpid()
+            if not self._schema_ready:
+                local.connection.executescript(SCHEMA)
+                self._schema_ready = True
+        return local.connection
+
+    def publish(self, facility, event, data):
+        """Queue an event for the board of `facility`."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((facility or '', time.time(), event, json.dumps(data, ensure_ascii=False)))
+        except queue.Full:
+            logger.warning('Board event queue full, dropping %s event', event)
+
+    def flush(self):
+        """Block until every queued event has been written."""
+        if self._writer is not None and self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def last_id(self):
+        return self._connection().execute('SELECT COALESCE(MAX(id), 0) FROM board_events').fetchone()[0]
+
+    def after(self, facility, last_id, limit=500):
+        """(events, complete) for `facility` after `last_id`.
+
+        events are (id, event, data) with data decoded. complete is False when
+        events after `last_id` have already been pruned (or `last_id` is from
+        a log that no longer exists), so the client needs a fresh snapshot.
+        """
+        connection = self._connection()
+        oldest, newest = connection.execute('SELECT MIN(id), MAX(id) FROM board_events').fetchone()
+        # A client ahead of the log saw a log that has since been deleted
+        complete = oldest is None and last_id == 0 or oldest is not None and oldest <= last_id + 1 <= newest + 1
+        rows = connection.execute(
+            'SELECT id, event, data FROM board_events WHERE facility = ? AND id > ? ORDER BY id LIMIT ?',
+            (facility or '', last_id, limit),
+        ).fetchall()
+        return [(event_id, event, json.loads(data)) for event_id, event, data in rows], complete
+
+    def _ensure_writer(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own writer
+        pid = os.getpid()
+        if self._writer_pid == pid and self._writer is not None:
+            return
+        with self._lock:
+            if self._writer_pid == pid and self._writer is not None:
+                return
+            if self._writer_pid != pid:
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._writer_pid = pid
+            self._writer = threading.Thread(target=self._run, name='board-events-writer', daemon=True)
+            self._writer.start()
+
+    def _run(self):
+        connection = self._connection()
+        pruned_at = 0.0
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with connection:
+                    connection.executemany(INSERT_SQL, batch)
+                    now = time.time()
+                    if now - pruned_at > 60:
+                        connection.execute('DELETE FROM board_events WHERE created_at < ?', (now - self.retention,))
+                        pruned_at = now
+            except Exception as e:
+                logger.error('Failed to write %d board events: %s', len(batch), e)
+            for _ in batch:
+                self._queue.task_done()
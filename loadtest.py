@@ -0,0 +1,268 @@
+# Load-test harness for the Saudi Arabian CTAS Triage System
+# Starts the app under the real gunicorn.conf.py and replays nurse-station and
+# kiosk traffic against it: each simulated station keeps its own language
+# and keep-alive connection and sends a weighted mix of triage,
+# self-assessment, CSV download and page requests. Reports throughput and
+# p50/p95/p99 latency per route for every combination of worker count, worker
+# class and station count.
+#
+# Usage:
+#   python loadtest.py
+#   python loadtest.py --workers 2,4,8 --worker-classes sync,gthread --stations 8,32,64 --duration 30
+#   python loadtest.py --mix calculate_ctas=70,page_index=30 --output results.json
+#
+# The stations are threads in this process; at very high station counts,
+# check that the load generator is not the bottleneck (it reports its own CPU
+# time).
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from workload import professional_form, self_assessment_form
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# route name -> (method, path, form generator)
+ROUTES = {
+    'calculate_ctas': ('POST', '/calculate_ctas?lang={lang}', professional_form),
+    'calculate_self_assessment': ('POST', '/calculate_self_assessment?lang={lang}', self_assessment_form),
+    'download_csv': ('POST', '/download_csv?lang={lang}', professional_form),
+    'page_index': ('GET', '/{lang}/', None),
+    'page_self_diagnosis': ('GET', '/{lang}/self_diagnosis', None),
+    'page_reference': ('GET', '/{lang}/reference', None),
+}
+DEFAULT_MIX = 'calculate_ctas=40,calculate_self_assessment=30,download_csv=5,page_index=10,page_self_diagnosis=10,page_reference=5'
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route '{name}' in --mix; choose from {', '.join(ROUTES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def parse_list(text, cast=str):
+    return [cast(item.strip()) for item in text.split(',') if item.strip()]
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class Server:
+    """gunicorn running app:app with gunicorn.conf.py, overriding only workers, class and bind."""
+
+    def __init__(self, workers, worker_class, threads, data_dir, log_path):
+        self.port = free_port()
+        command = [
+            sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+            '--workers', str(workers), '--worker-class', worker_class,
+            '--bind', f'127.0.0.1:{self.port}',
+        ]
+        if worker_class == 'gthread':
+            # With the sync class, threads > 1 would silently switch to gthread
+            command += ['--threads', str(threads)]
+        env = dict(os.environ)
+        env.setdefault('ASSESSMENT_DB', os.path.join(data_dir, 'assessments.db'))
+        env.setdefault('QUEUE_DB', os.path.join(data_dir, 'queue.db'))
+        self.log = open(log_path, 'ab')
+        self.process = subprocess.Popen(command + ['app:app'], cwd=ROOT, env=env,
+                                        stdout=self.log, stderr=subprocess.STDOUT)
+
+    def _log_tail(self, lines=20):
+        self.log.flush()
+        with open(self.log.name, encoding='utf-8', errors='replace') as f:
+            return ''.join(f.readlines()[-lines:])
+
+    def wait_ready(self, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f"gunicorn exited with status {self.process.returncode}:\n{self._log_tail()}")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=2)
+                connection.request('GET', '/health')
+                if connection.getresponse().status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise SystemExit(f"gunicorn did not become ready within {timeout:.0f}s:\n{self._log_tail()}")
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+class Station(threading.Thread):
+    """One triage station or kiosk: its own language and keep-alive connection."""
+
+    def __init__(self, port, mix, seed, start_at, measure_from, stop_at, timeout):
+        super().__init__(daemon=True)
+        self.port = port
+        self.routes = list(mix)
+        self.weights = list(mix.values())
+        self.rng = random.Random(seed)
+        self.start_at = start_at
+        self.measure_from = measure_from
+        self.stop_at = stop_at
+        self.timeout = timeout
+        self.connection = None
+        self.samples = []  # (route, seconds, status); status None for a connection error
+
+    def _request(self, method, path, body=None, content_type=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if content_type:
+            headers['Content-Type'] = content_type
+        # A kept-alive connection may have been closed by the server (keepalive
+        # timeout, max_requests restart); retry those once on a new connection
+        for _ in range(2):
+            reused = self.connection is not None
+            if not reused:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                self.connection.close()
+                self.connection = None
+                if not reused:
+                    return None
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+            self.connection = None
+        return response.status
+
+    def run(self):
+        time.sleep(max(0.0, self.start_at - time.monotonic()))
+        lang = self.rng.choice(['ar', 'en'])
+
+        while True:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            method, path, form = ROUTES[route]
+            body = urlencode(form(self.rng)) if form else None
+            started = time.monotonic()
+            if started >= self.stop_at:
+                break
+            status = self._request(method, path.format(lang=lang), body, 'application/x-www-form-urlencoded' if form else None)
+            if started >= self.measure_from:
+                self.samples.append((route, time.monotonic() - started, status))
+        if self.connection is not None:
+            self.connection.close()
+
+def run_load(port, mix, stations, duration, warmup, timeout, seed):
+    now = time.monotonic()
+    # Stagger the stations over the first second, like people arriving
+    start_at = [now + i / stations for i in range(stations)]
+    measure_from = now + 1 + warmup
+    stop_at = measure_from + duration
+    threads = [Station(port, mix, seed * 10007 + i, start_at[i], measure_from, stop_at, timeout)
+               for i in range(stations)]
+    cpu_started = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client_cpu = time.process_time() - cpu_started
+
+    by_route = {}
+    for thread in threads:
+        for route, seconds, status in thread.samples:
+            by_route.setdefault(route, []).append((seconds, status))
+
+    report = {'routes': {}, 'client_cpu_seconds': round(client_cpu, 2)}
+    total_ok = 0
+    for route, samples in sorted(by_route.items()):
+        latencies = sorted(seconds for seconds, status in samples if status is not None and status < 500)
+        errors = len(samples) - len(latencies)
+        total_ok += len(latencies)
+        report['routes'][route] = {
+            'requests': len(samples),
+            'errors': errors,
+            'rps': round(len(latencies) / duration, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        }
+    report['rps'] = round(total_ok / duration, 1)
+    return report
+
+def print_report(label, report):
+    print(f"\n🏥 {label}: {report['rps']} req/s "
+          f"(load generator CPU {report['client_cpu_seconds']}s)")
+    print(f"  {'route':28} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in report['routes'].items():
+        cells = [stats['p50_ms'], stats['p95_ms'], stats['p99_ms']]
+        p50, p95, p99 = ('-' if value is None else f'{value:.1f}' for value in cells)
+        print(f"  {route:28} {stats['requests']:9d} {stats['errors']:7d} {stats['rps']:8.1f} "
+              f"{p50:>8} {p95:>8} {p99:>8}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the triage app under gunicorn.conf.py.')
+    parser.add_argument('--workers', default='4', help='comma-separated worker counts to sweep')
+    parser.add_argument('--worker-classes', default='sync', help='comma-separated worker classes (sync, gthread, gevent, ...)')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker for gthread')
+    parser.add_argument('--stations', default='4,16', help='comma-separated concurrent stations to sweep')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='route=weight pairs')
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds per run')
+    parser.add_argument('--warmup', type=float, default=3.0, help='unmeasured seconds before each run')
+    parser.add_argument('--timeout', type=float, default=30.0, help='client timeout per request (s)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write all results to this JSON file')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix='ctas-load-') as data_dir:
+        log_path = os.path.join(data_dir, 'gunicorn.log')
+        for worker_class in parse_list(args.worker_classes):
+            for workers in parse_list(args.workers, int):
+                server = Server(workers, worker_class, args.threads, data_dir, log_path)
+                try:
+                    server.wait_ready()
+                    for stations in parse_list(args.stations, int):
+                        report = run_load(server.port, mix, stations, args.duration, args.warmup,
+                                          args.timeout, args.seed)
+                        report.update({'workers': workers, 'worker_class': worker_class, 'stations': stations})
+                        if worker_class == 'gthread':
+                            report['threads'] = args.threads
+                        results.append(report)
+                        print_report(f"{workers} × {worker_class}, {stations} stations", report)
+                finally:
+                    server.stop()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'mix': mix, 'duration': args.duration, 'results': results}, f, indent=2)
+        print(f"\n💾 Results written to {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# Prometheus metrics for the Saudi Arabian CTAS Triage System
+#
+# Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set by gunicorn.conf.py before
+# the app is loaded. prometheus_client then keeps every worker's counters and
+# histograms in mmap-backed files in that directory, and /metrics merges them,
+# so a scrape sees the totals for all workers whichever worker answers it.
+# Without it (python app.py), metrics live in process memory.
+#
+# Values that already live in shared state (the triage cache and the waiting
+# queue) are read when /metrics is scraped rather than counted per worker.
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    'ctas_request_duration_seconds', 'Request latency by route', ['route', 'method'], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter('ctas_requests_total', 'Requests by route and status', ['route', 'method', 'status'])
+CTAS_ERRORS = Counter('ctas_errors_total', 'CTAS errors raised, by error class and code', ['error', 'code'])
+TRIAGE_LEVELS = Counter('ctas_triage_results_total', 'Triage results by kind and CTAS level', ['kind', 'level'])
+CTAS_RULE_HITS = Counter(
+    'ctas_rule_hits_total', 'Recorded assessments by the rule that set their level (default = CTAS V)', ['rule']
+)
+ASSESSMENTS_DROPPED = Counter(
+    'ctas_assessments_dropped_total', 'Assessments the history store could not queue (writer down or queue full)'
+)
+VALIDATED_FORMS = Counter(
+    'ctas_validated_forms_total', 'Forms checked by validate_medical_ranges', ['with_warnings']
+)
+VALIDATION_WARNINGS = Counter(
+    'ctas_validation_warnings_total', 'Out-of-range warnings from validate_medical_ranges', ['field']
+)
+
+def observe_request(route, method, status, seconds):
+    REQUEST_LATENCY.labels(route, method).observe(seconds)
+    REQUESTS.labels(route, method, str(status)).inc()
+
+def observe_reasons(codes):
+    for code in codes or ('default',):
+        CTAS_RULE_HITS.labels(code).inc()
+
+def observe_validation(warnings):
+    VALIDATED_FORMS.labels('true' if warnings else 'false').inc()
+    for warning in warnings:
+        VALIDATION_WARNINGS.labels(warning['field']).inc()
+
+class TriageCacheCollector:
+    """Shared triage cache counters, read from the cache's own shared memory."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        for name in ('hits', 'misses', 'evictions', 'lock_timeouts'):
+            yield CounterMetricFamily(f'ctas_triage_cache_{name}', f'Triage cache {name}', value=stats[name])
+        yield GaugeMetricFamily('ctas_triage_cache_disabled', 'Triage cache turned off after lock timeouts',
+                                value=int(stats['disabled']))
+        yield GaugeMetricFamily('ctas_triage_cache_capacity', 'Triage cache capacity (entries)', value=stats['capacity'])
+
+class AdmissionCollector:
+    """Admission-control bucket level and admitted/rejected requests per priority."""
+
+    def __init__(self, admission):
+        self.admission = admission
+
+    def collect(self):
+        stats = self.admission.stats()
+        admitted = CounterMetricFamily('ctas_admission_admitted', 'Requests admitted', labels=['priority'])
+        rejected = CounterMetricFamily('ctas_admission_rejected', 'Requests refused with 503', labels=['priority'])
+        for priority, counts in stats['priorities'].items():
+            admitted.add_metric([priority], counts['admitted'])
+            rejected.add_metric([priority], counts['rejected'])
+        yield admitted
+        yield rejected
+        yield GaugeMetricFamily('ctas_admission_tokens', 'Tokens left in the admission bucket', value=stats['tokens'])
+
+class WaitingQueueCollector:
+    """Waiting-room depth and overdue reassessments per facility."""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def collect(self):
+        waiting = GaugeMetricFamily('ctas_queue_waiting', 'Patients waiting', labels=['facility', 'level'])
+        overdue = GaugeMetricFamily('ctas_queue_overdue', 'Waiting patients past their reassessment time',
+                                    labels=['facility'])
+        overdue_by_facility = {}
+        for facility, level, count, overdue_count in self.queue.depth():
+            waiting.add_metric([facility, str(level)], count)
+            overdue_by_facility[facility] = overdue_by_facility.get(facility, 0) + overdue_count
+        for facility, count in overdue_by_facility.items():
+            overdue.add_metric([facility], count)
+        yield waiting
+        yield overdue
+
+def render(collectors=()):
+    """Return (body, content type) for a /metrics response."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        body = generate_latest(registry)
+    else:
+        body = generate_latest(REGISTRY)
+    if collectors:
+        registry = CollectorRegistry()
+        for collector in collectors:
+            registry.register(collector)
+        body += generate_latest(registry)
+    return body, CONTENT_TYPE_LATEST
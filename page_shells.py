@@ -0,0 +1,66 @@
+# Pre-rendered page shells for the Saudi Arabian CTAS Triage System
+#
+# The form pages depend only on the language, so each (template, language)
+# pair is rendered once at startup and kept as bytes, along with gzip (and,
+# when the brotli package is installed, brotli) variants. Requests are
+# answered from those buffers, or with 304 Not Modified when the browser
+# already holds the current version.
+
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # optional: gzip alone is enough for every browser
+    brotli = None
+
+# Encodings we keep pre-compressed variants for, best first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Each URL carries its language, so shared caches may keep a page. They
+# revalidate every time, because a deploy changes the pages; a cached copy is
+# then reused after a 304
+CACHE_CONTROL = 'public, no-cache'
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+class PageShell:
+    """One rendered page and its pre-compressed variants."""
+
+    def __init__(self, html):
+        self.body = html.encode('utf-8')
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        # Strong ETags must differ per content encoding
+        self.etags = {None: digest}
+        self.variants = {None: self.body}
+        for encoding in ENCODINGS:
+            self.etags[encoding] = f'{digest}-{encoding}'
+            self.variants[encoding] = compress(self.body, encoding)
+
+    def negotiate(self, accept_encodings):
+        """Pick the encoding to send for a request's Accept-Encoding header."""
+        for encoding in ENCODINGS:
+            if accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+class PageShellCache:
+    """Page shells keyed by (template, language), rendered up front by `render`."""
+
+    def __init__(self, render):
+        self.render = render
+        self.shells = {}
+
+    def prerender(self, templates, languages):
+        for template in templates:
+            for lang in languages:
+                self.shells[(template, lang)] = PageShell(self.render(template, lang))
+
+    def get(self, template, lang):
+        shell = self.shells.get((template, lang))
+        if shell is None:
+            shell = self.shells[(template, lang)] = PageShell(self.render(template, lang))
+        return shell
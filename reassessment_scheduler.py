@@ -0,0 +1,201 @@
+# Reassessment scheduler for the Saudi Arabian CTAS Triage System
+#
+# Tracks every waiting patient's reassessment deadline (from
+# get_reassessment_interval) and the CTAS waiting-time upgrade on a
+# hierarchical timing wheel, so insert, cancel and expiry are O(1) no matter
+# how many patients are waiting. Due reassessments are flagged in the waiting
+# queue within a tick, without anyone polling from a browser.
+#
+# One scheduler runs per host: every worker starts the thread, and the one
+# holding an exclusive lock on <queue db>.scheduler.lock drives the wheel.
+
+import logging
+import math
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows development: a single process, always the leader
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class HierarchicalTimingWheel:
+    """Hierarchical timing wheel (Varghese & Lauck).
+
+    Level 0 has one slot per tick; each higher level has one slot per full
+    turn of the level below. Timers are placed by how far away they are and
+    cascade down as time advances. Timers beyond the top level wait in an
+    overflow table until they come into range.
+    """
+
+    def __init__(self, tick=1.0, sizes=(60, 60, 24), start=None):
+        self.tick = tick
+        self.sizes = sizes
+        self.spans = [math.prod(sizes[:level]) for level in range(len(sizes))]
+        self.current = int((time.time() if start is None else start) // tick)
+        self.wheels = [[{} for _ in range(size)] for size in sizes]
+        self.overflow = {}
+        self.timers = {}  # key -> slot dict holding it
+
+    def __len__(self):
+        return len(self.timers)
+
+    def schedule(self, key, when, payload=None):
+        """Fire `key` at time `when` (epoch seconds), replacing any existing timer for it."""
+        self.cancel(key)
+        expiry = max(math.ceil(when / self.tick), self.current + 1)
+        self._place(key, expiry, payload)
+
+    def cancel(self, key):
+        slot = self.timers.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def _place(self, key, expiry, payload):
+        delta = expiry - self.current
+        for level, size in enumerate(self.sizes):
+            span = self.spans[level]
+            if delta < span * size:
+                slot = self.wheels[level][(expiry // span) % size]
+                break
+        else:
+            slot = self.overflow
+        slot[key] = (expiry, payload)
+        self.timers[key] = slot
+
+    def _cascade(self, slot):
+        entries = list(slot.items())
+        slot.clear()
+        for key, (expiry, payload) in entries:
+            self._place(key, expiry, payload)
+
+    def advance(self, now=None):
+        """Move the wheel to `now` and return the (key, payload) pairs that expired."""
+        target = int((time.time() if now is None else now) // self.tick)
+        expired = []
+        top = len(self.sizes) - 1
+        while self.current < target:
+            self.current += 1
+            if self.current % (self.spans[top] * self.sizes[top]) == 0 and self.overflow:
+                self._cascade(self.overflow)
+            # Higher levels first, so their timers can fall all the way down
+            for level in range(top, 0, -1):
+                span = self.spans[level]
+                if self.current % span == 0:
+                    self._cascade(self.wheels[level][(self.current // span) % self.sizes[level]])
+
+            slot = self.wheels[0][self.current % self.sizes[0]]
+            for key, (expiry, payload) in list(slot.items()):
+                if expiry <= self.current:
+                    del slot[key]
+                    del self.timers[key]
+                    expired.append((key, payload))
+        return expired
+
+class ReassessmentScheduler:
+    """Background thread that flags due reassessments and applies the waiting-time upgrade."""
+
+    def __init__(self, queue, waiting_rule, get_interval, tick=1.0, sync_lag=5.0):
+        self.queue = queue
+        self.waiting_rule = waiting_rule
+        self.get_interval = get_interval
+        self.tick = tick
+        # Changes are re-read for this long, to catch commits from other workers that land late
+        self.sync_lag = sync_lag
+        self.listeners = []
+        self._thread = None
+        self._pid = None
+        self._lock_file = None
+        self._stop = threading.Event()
+
+    def add_listener(self, callback):
+        """Call `callback(event, entry)` for 'reassessment_due' and 'level_changed' events."""
+        self.listeners.append(callback)
+
+    def start(self):
+        """Start the scheduler thread in this process (idempotent, fork-aware)."""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._lock_file = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='reassessment-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _acquire_leadership(self):
+        if fcntl is None:
+            return True
+        path = f"{self.queue.path}.scheduler.lock"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file  # held for the life of the process
+        return True
+
+    def _emit(self, event, entry):
+        for callback in self.listeners:
+            try:
+                callback(event, entry)
+            except Exception as e:
+                logger.error('Reassessment listener failed on %s: %s', event, e)
+
+    def _schedule_entry(self, wheel, entry):
+        queue_id = entry['queue_id']
+        wheel.cancel(('due', queue_id))
+        wheel.cancel(('wait', queue_id))
+        if entry['status'] != 'waiting':
+            return
+        if entry['flagged_at'] is None:
+            wheel.schedule(('due', queue_id), entry['reassess_due_at'], queue_id)
+        if entry['ctas_level'] > self.waiting_rule['level']:
+            # The CTAS rule upgrades patients waiting more than max_wait whole minutes
+            upgrade_at = entry['arrived_at'] + (self.waiting_rule['max_wait'] + 1) * 60
+            wheel.schedule(('wait', queue_id), upgrade_at, queue_id)
+
+    def _fire(self, kind, queue_id, now):
+        if kind == 'due':
+            entry = self.queue.flag_reassessment_due(queue_id, now)
+            if entry is not None:
+                self._emit('reassessment_due', entry)
+        else:
+            level = self.waiting_rule['level']
+            waited_since = now - (self.waiting_rule['max_wait'] + 1) * 60
+            entry = self.queue.upgrade_long_wait(queue_id, level, self.get_interval(level), waited_since, now)
+            if entry is not None:
+                self._emit('level_changed', entry)
+
+    def _run(self):
+        while not self._stop.is_set() and not self._acquire_leadership():
+            self._stop.wait(5.0)
+
+        wheel = HierarchicalTimingWheel(tick=self.tick)
+        watermark = 0.0
+        while not self._stop.is_set():
+            try:
+                now = time.time()
+                if watermark:
+                    changed = self.queue.changed_since(watermark - self.sync_lag)
+                else:
+                    changed = self.queue.all_waiting()
+                for entry in changed:
+                    self._schedule_entry(wheel, entry)
+                    watermark = max(watermark, entry['updated_at'])
+                watermark = watermark or now
+
+                for (kind, _), queue_id in wheel.advance(now):
+                    self._fire(kind, queue_id, now)
+            except Exception as e:
+                logger.error('Reassessment scheduler tick failed: %s', e)
+            self._stop.wait(self.tick)
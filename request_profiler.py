@@ -0,0 +1,163 @@
+# Opt-in request profiler for the Saudi Arabian CTAS Triage System
+#
+# Two modes, both off by default and set from the environment in app.py:
+#   - sampled: a fraction of requests runs under cProfile. Each one writes a
+#     .prof dump (for pstats/snakeviz) and a .folded file of collapsed stacks.
+#   - slow: every request's thread is watched by a stack sampler. Requests
+#     slower than the threshold write their collapsed stacks, so production
+#     spikes can be explained without reproducing them.
+# Files go to <directory>/<route>/, newest `max_files` kept per route. The
+# .folded files feed straight into flamegraph.pl or speedscope.
+
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from werkzeug.wsgi import ClosingIterator
+
+def route_slug(route):
+    """'/queue/<queue_id>/retriage' -> 'queue_queue_id_retriage', '/' -> 'index'."""
+    slug = ''.join(c if c.isalnum() else '_' for c in route).strip('_')
+    return '_'.join(part for part in slug.split('_') if part) or 'index'
+
+def frame_stack(frame):
+    """Collapsed 'outer;...;inner' stack of a frame."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class RequestProfile:
+    __slots__ = ('started', 'profile', 'stacks')
+
+    def __init__(self, profile, stacks):
+        self.started = time.perf_counter()
+        self.profile = profile
+        self.stacks = stacks
+
+class RequestProfiler:
+    """Profiles sampled requests with cProfile and slow requests with a stack sampler."""
+
+    def __init__(self, directory, sample_rate=0.0, slow_ms=0.0, interval_ms=5.0, max_files=100):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000
+        self.max_files = max_files
+        self._watched = {}  # thread id -> Counter of collapsed stacks
+        self._sampler = None
+        self._sampler_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def start(self):
+        """Begin profiling the current request; returns a handle for stop() or None."""
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            return None
+        self._ensure_sampler()
+        stacks = self._watched[threading.get_ident()] = Counter()
+        profile = None
+        if sampled:
+            profile = cProfile.Profile()
+            profile.enable()
+        return RequestProfile(profile, stacks)
+
+    def stop(self, handle, route, status):
+        """Finish profiling and write the results if the request was sampled or slow."""
+        if handle is None:
+            return
+        elapsed_ms = (time.perf_counter() - handle.started) * 1000
+        if handle.profile is not None:
+            handle.profile.disable()
+        self._watched.pop(threading.get_ident(), None)
+        if handle.profile is None and elapsed_ms < self.slow_ms:
+            return
+
+        directory = os.path.join(self.directory, route_slug(route))
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(
+            directory, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}-{status}-{elapsed_ms:.0f}ms"
+        )
+        if handle.profile is not None:
+            handle.profile.dump_stats(f'{stem}.prof')
+        if handle.stacks:
+            with open(f'{stem}.folded', 'w', encoding='utf-8') as f:
+                for stack, count in handle.stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        self._prune(directory)
+
+    def wrap(self, wsgi_app, url_map):
+        """WSGI middleware profiling whole requests, including session and after-request work
+        and the generation of streamed response bodies."""
+        def profiled_app(environ, start_response):
+            handle = self.start()
+            if handle is None:
+                return wsgi_app(environ, start_response)
+            status = []
+
+            def capture_status(status_line, headers, exc_info=None):
+                status.append(status_line.split(' ', 1)[0])
+                return start_response(status_line, headers, exc_info)
+
+            def finish():
+                try:
+                    rule, _ = url_map.bind_to_environ(environ).match(return_rule=True)
+                    route = rule.rule
+                except Exception:  # 404/405 and redirects
+                    route = 'unmatched'
+                self.stop(handle, route, status[0] if status else '500')
+
+            try:
+                response = wsgi_app(environ, capture_status)
+            except BaseException:
+                finish()
+                raise
+            # Streamed bodies (CSV export, incident intake) are generated while
+            # the server iterates, so stop only when it closes the response
+            return ClosingIterator(response, finish)
+        return profiled_app
+
+    def _prune(self, directory):
+        stems = sorted({name.rsplit('.', 1)[0] for name in os.listdir(directory)})
+        for stem in stems[:-self.max_files] if len(stems) > self.max_files else ():
+            for suffix in ('.prof', '.folded'):
+                try:
+                    os.remove(os.path.join(directory, stem + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def _ensure_sampler(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own sampler
+        pid = os.getpid()
+        if self._sampler_pid == pid:
+            return
+        with self._lock:
+            if self._sampler_pid == pid:
+                return
+            self._watched = {}
+            self._sampler = threading.Thread(target=self._sample, name='request-profiler', daemon=True)
+            self._sampler_pid = pid
+            self._sampler.start()
+
+    def _sample(self):
+        sampler_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            if not self._watched:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in list(self._watched.items()):
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != sampler_id:
+                    stacks[frame_stack(frame)] += 1
@@ -153,7 +153,7 @@ function showSummary() {
     formData.set('is_frail', document.getElementById('is_frail').checked ? 'true' : 'false');
     
     // Call backend API to calculate CTAS
-    fetch('/calculate_ctas', {
+    fetch(`/calculate_ctas?lang=${document.documentElement.lang}`, {
         method: 'POST',
         body: formData
     })
@@ -253,7 +253,7 @@ function downloadCSV() {
     const formData = new FormData(document.getElementById('triage-form'));
     formData.set('is_frail', document.getElementById('is_frail').checked ? 'true' : 'false');
     
-    fetch('/download_csv', {
+    fetch(`/download_csv?lang=${document.documentElement.lang}`, {
         method: 'POST',
         body: formData
     })
@@ -308,21 +308,6 @@ function startNew() {
 function toggleLanguage() {
     const currentLang = document.documentElement.lang;
     const newLang = currentLang === 'en' ? 'ar' : 'en';
-    
-    fetch('/set_language', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ language: newLang })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.status === 'success') {
-            window.location.reload();
-        }
-    })
-    .catch(error => {
-        console.error('Error switching language:', error);
-    });
+    // The language is part of the URL: /ar/..., /en/...
+    window.location.href = '/' + newLang + window.location.pathname.replace(/^\/(ar|en)(?=\/)/, '');
 } 
\ No newline at end of file
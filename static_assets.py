@@ -0,0 +1,28 @@
+# Fingerprinted static assets for the Saudi Arabian CTAS Triage System
+# build_assets.py writes the bundles and static/dist/manifest.json; the app
+# reads the manifest once at startup. File names change whenever the content
+# does, so the files can be cached by browsers for good.
+
+import json
+import os
+
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Pre-compressed variants written next to each text asset, best first
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+def load_manifest(dist_dir):
+    """Logical name -> built file name, or {} when the assets have not been built."""
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def pick_variant(dist_dir, filename, accept_encodings):
+    """Return (encoding, suffix) of the best pre-compressed copy the browser accepts, or (None, '')."""
+    for encoding, suffix in PRECOMPRESSED:
+        if accept_encodings[encoding] > 0 and os.path.isfile(os.path.join(dist_dir, filename + suffix)):
+            return encoding, suffix
+    return None, ''
@@ -0,0 +1,138 @@
+# Non-blocking JSON-lines logging for the Saudi Arabian CTAS Triage System
+#
+# Log calls on the request thread only put the record on an in-process queue.
+# A listener thread in each worker formats it as one JSON object per line and
+# does the file writes. The workers share one log file, opened in append mode
+# so whole-line writes never interleave. Rotation takes an flock on
+# "<file>.lock", and the other workers notice the new file by its inode and
+# reopen it, so a rollover is done exactly once.
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows development: a single process, so rotation needs no lock
+    fcntl = None
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record, Arabic kept as-is."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+            'path': record.pathname,
+            'line': record.lineno,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SharedRotatingFileHandler(logging.handlers.WatchedFileHandler):
+    """Size-based rotation that is safe with several processes appending to the same file."""
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, encoding='utf-8'):
+        super().__init__(filename, mode='a', encoding=encoding)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.lock_path = f'{self.baseFilename}.lock'
+
+    def emit(self, record):
+        try:
+            line = self.format(record) + self.terminator
+            self.reopenIfNeeded()
+            if self.max_bytes and os.fstat(self.stream.fileno()).st_size + len(line) > self.max_bytes:
+                self._rollover()
+            self.stream.write(line)
+            self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def _rollover(self):
+        with open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another worker may have rotated while we waited for the lock
+            self.reopenIfNeeded()
+            if os.fstat(self.stream.fileno()).st_size < self.max_bytes:
+                return
+            if self.backup_count > 0:
+                for i in range(self.backup_count - 1, 0, -1):
+                    source = f'{self.baseFilename}.{i}'
+                    if os.path.exists(source):
+                        os.replace(source, f'{self.baseFilename}.{i + 1}')
+                os.replace(self.baseFilename, f'{self.baseFilename}.1')
+            else:
+                os.truncate(self.baseFilename, 0)
+            self.stream.close()
+            self.stream = self._open()
+            self._statstream()
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """Hands records to a listener thread that runs `handlers`; emit never touches disk."""
+
+    def __init__(self, handlers, max_pending=10000):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = list(handlers)
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # The queue stays in this process, so the record needs no pre-formatting
+        # or pickling; the listener formats it off the request thread
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        # SimpleQueue is unbounded and much cheaper to put on than Queue; bound
+        # it here so a stalled disk drops records instead of growing the worker
+        if self.queue.qsize() < self.max_pending:
+            self.queue.put(record)
+        else:
+            self.dropped += 1
+
+    def close(self):
+        """Write everything still queued and stop the listener (logging.shutdown calls this at exit)."""
+        with self._start_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+    def _ensure_listener(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own listener
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._start_lock:
+            if self._listener_pid == pid:
+                return
+            if self._listener_pid is not None:
+                # Records queued before the fork belong to the parent, which writes them
+                self.queue = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener_pid = pid
+            self._listener.start()
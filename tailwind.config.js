@@ -0,0 +1,10 @@
+// Tailwind configuration for build_assets.py. Classes are collected from the
+// templates, the front-end script and the recommendation HTML in app.py.
+module.exports = {
+  content: ['./templates/**/*.html', './static/js/**/*.js', './app.py'],
+  darkMode: 'class',
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+}
@@ -0,0 +1,144 @@
+# Shared triage result cache for the Saudi Arabian CTAS Triage System
+#
+# Most triage inputs are discrete (selects, radio buttons, small integers), so
+# the same canonical inputs come back again and again, above all on the
+# self-assessment form. Results are memoized in an anonymous shared memory map
+# created before gunicorn forks (preload_app), so every worker reads and fills
+# the same cache.
+#
+# The map is a set-associative table: a key hashes to one set of WAYS slots,
+# and a full set evicts its least recently used slot. Entries also expire after
+# `ttl` seconds. Hit, miss and eviction counters live in the same map, so they
+# cover all workers.
+#
+# A worker killed while holding the lock (e.g. by the gunicorn timeout) leaves
+# it held for good. Each lookup then waits LOCK_TIMEOUT and counts a lock
+# timeout and a miss; after MAX_LOCK_TIMEOUTS in a row a worker turns the cache
+# off for every worker, so triage stays correct at uncached speed until restart.
+# Forcing the lock open instead could let two writers corrupt a slot.
+
+import hashlib
+import logging
+import mmap
+import multiprocessing
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+WAYS = 8
+# hits, misses, evictions, lock timeouts, disabled flag
+HEADER = struct.Struct('<QQQQQ')
+COUNTER = struct.Struct('<Q')
+HITS, MISSES, EVICTIONS, LOCK_TIMEOUTS, DISABLED = (i * COUNTER.size for i in range(5))
+# key digest, stored at, last used, ctas level (0 = empty), reassessment interval, reason bits
+SLOT = struct.Struct('<16sddBHI')
+# Lookups hold the lock for microseconds, so a wait this long means its holder died
+LOCK_TIMEOUT = 0.05
+# Consecutive lock timeouts after which the cache is turned off for all workers
+MAX_LOCK_TIMEOUTS = 3
+
+class SharedTriageCache:
+    """LRU/TTL memo cache of (ctas_level, reassessment_interval, reasons) shared across forked workers."""
+
+    def __init__(self, capacity=4096, ttl=3600.0):
+        self.sets = max(1, capacity // WAYS)
+        self.capacity = self.sets * WAYS
+        self.ttl = ttl
+        self._buffer = mmap.mmap(-1, HEADER.size + self.capacity * SLOT.size)
+        self._lock = multiprocessing.Lock()
+        self._timeouts_in_row = 0
+
+    def _locate(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        base = HEADER.size + int.from_bytes(digest[:8], 'little') % self.sets * WAYS * SLOT.size
+        return digest, range(base, base + WAYS * SLOT.size, SLOT.size)
+
+    def _count(self, counter):
+        COUNTER.pack_into(self._buffer, counter, COUNTER.unpack_from(self._buffer, counter)[0] + 1)
+
+    @property
+    def disabled(self):
+        return COUNTER.unpack_from(self._buffer, DISABLED)[0] != 0
+
+    def _acquire(self):
+        """Take the lock; False (counted, without the lock) if it timed out or the cache is off."""
+        if self.disabled:
+            return False
+        if self._lock.acquire(timeout=LOCK_TIMEOUT):
+            self._timeouts_in_row = 0
+            return True
+        # Counted without the lock, which is stuck; a lost increment only undercounts
+        self._count(LOCK_TIMEOUTS)
+        self._timeouts_in_row += 1
+        if self._timeouts_in_row >= MAX_LOCK_TIMEOUTS:
+            COUNTER.pack_into(self._buffer, DISABLED, 1)
+            logger.error('Triage cache lock held for %d lookups in a row (a worker died holding it?); '
+                         'the cache is off until restart', self._timeouts_in_row)
+        return False
+
+    def get(self, key):
+        """Return the cached result for `key` (bytes), or None."""
+        digest, offsets = self._locate(key)
+        now = time.time()
+        buffer = self._buffer
+        if not self._acquire():
+            self._count(MISSES)
+            return None
+        try:
+            for offset in offsets:
+                if buffer[offset:offset + 16] == digest:
+                    _, stored_at, _, level, interval, reasons = SLOT.unpack_from(buffer, offset)
+                    if level and now - stored_at < self.ttl:
+                        SLOT.pack_into(buffer, offset, digest, stored_at, now, level, interval, reasons)
+                        self._count(HITS)
+                        return level, interval, reasons
+                    break
+            self._count(MISSES)
+            return None
+        finally:
+            self._lock.release()
+
+    def put(self, key, result):
+        """Store `result` (ctas_level, reassessment_interval, reasons) for `key` (bytes)."""
+        digest, offsets = self._locate(key)
+        now = time.time()
+        if not self._acquire():
+            return
+        try:
+            victim, victim_used, free = None, None, None
+            for offset in offsets:
+                slot_digest, stored_at, used, level, _, _ = SLOT.unpack_from(self._buffer, offset)
+                if slot_digest == digest:
+                    free = offset
+                    break
+                if not level or now - stored_at >= self.ttl:
+                    free = offset if free is None else free
+                elif victim is None or used < victim_used:
+                    victim, victim_used = offset, used
+            if free is not None:
+                victim = free
+            else:
+                self._count(EVICTIONS)
+            SLOT.pack_into(self._buffer, victim, digest, now, now, *result)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        with self._lock:
+            self._buffer[:] = bytes(len(self._buffer))
+
+    def stats(self):
+        """Counters for all workers since startup."""
+        hits, misses, evictions, lock_timeouts, disabled = HEADER.unpack_from(self._buffer, 0)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'evictions': evictions,
+            'lock_timeouts': lock_timeouts,
+            'disabled': bool(disabled),
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'capacity': self.capacity,
+            'ttl': self.ttl,
+        }
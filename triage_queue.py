@@ -0,0 +1,239 @@
+# Waiting-room priority queue for the Saudi Arabian CTAS Triage System
+#
+# Patients are ordered by CTAS level, then arrival time, then reassessment
+# deadline. The queue lives in SQLite next to the assessment history so every
+# gunicorn worker sees the same state. Partial B-tree indexes over the waiting
+# patients keep enqueue, pop, re-triage and the overdue lookup at O(log n)
+# (plus the size of the overdue list) instead of rescanning the waiting room.
+
+import os
+import threading
+import time
+import uuid
+
+from assessment_store import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS waiting_queue (
+    queue_id TEXT PRIMARY KEY,
+    facility TEXT NOT NULL DEFAULT '',
+    assessment_id TEXT,
+    patient_label TEXT NOT NULL DEFAULT '',
+    ctas_level INTEGER NOT NULL,
+    reassessment_interval INTEGER NOT NULL,
+    arrived_at REAL NOT NULL,
+    reassess_due_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'waiting',
+    updated_at REAL NOT NULL,
+    flagged_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_waiting_priority
+    ON waiting_queue (facility, ctas_level, arrived_at, reassess_due_at) WHERE status = 'waiting';
+CREATE INDEX IF NOT EXISTS idx_waiting_due
+    ON waiting_queue (facility, reassess_due_at) WHERE status = 'waiting';
+CREATE INDEX IF NOT EXISTS idx_waiting_updated ON waiting_queue (updated_at);
+"""
+
+# Columns added after the first release: (column, definition)
+MIGRATIONS = (
+    ('flagged_at', 'REAL'),
+)
+
+COLUMNS = ('queue_id', 'facility', 'assessment_id', 'patient_label', 'ctas_level',
+           'reassessment_interval', 'arrived_at', 'reassess_due_at', 'status', 'updated_at',
+           'flagged_at')
+SELECT_COLUMNS = ', '.join(COLUMNS)
+
+class TriageQueue:
+    """Priority queue of waiting patients shared by all worker processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_ready = False
+
+    def _connection(self):
+        # SQLite connections must not cross fork, so keep one per process and thread
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            local.connection = connect(self.path)
+            local.connection.isolation_level = None  # explicit transactions below
+            local.pid = os.getpid()
+            if not self._schema_ready:
+                self._create_schema(local.connection)
+                self._schema_ready = True
+        return local.connection
+
+    def _create_schema(self, connection):
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            existing = {row[1] for row in connection.execute('PRAGMA table_info(waiting_queue)')}
+            if existing:
+                for column, definition in MIGRATIONS:
+                    if column not in existing:
+                        connection.execute(f'ALTER TABLE waiting_queue ADD COLUMN {column} {definition}')
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.executescript(SCHEMA)
+
+    def _row(self, row):
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def enqueue(self, ctas_level, reassessment_interval, facility='', patient_label='',
+                assessment_id=None, arrived_at=None):
+        """Add a waiting patient and return the queue entry."""
+        now = time.time()
+        arrived_at = now if arrived_at is None else arrived_at
+        entry = {
+            'queue_id': uuid.uuid4().hex,
+            'facility': facility or '',
+            'assessment_id': assessment_id,
+            'patient_label': patient_label or '',
+            'ctas_level': ctas_level,
+            'reassessment_interval': reassessment_interval,
+            'arrived_at': arrived_at,
+            'reassess_due_at': now + reassessment_interval * 60,
+            'status': 'waiting',
+            'updated_at': now,
+            'flagged_at': None,
+        }
+        self._connection().execute(
+            f"INSERT INTO waiting_queue ({SELECT_COLUMNS}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [entry[column] for column in COLUMNS],
+        )
+        return entry
+
+    def peek(self, facility=''):
+        """Return the highest-priority waiting patient without removing it."""
+        return self._row(self._connection().execute(
+            f"SELECT {SELECT_COLUMNS} FROM waiting_queue "
+            "WHERE facility = ? AND status = 'waiting' "
+            "ORDER BY ctas_level, arrived_at, reassess_due_at LIMIT 1",
+            (facility or '',),
+        ).fetchone())
+
+    def pop(self, facility=''):
+        """Remove and return the highest-priority waiting patient, or None."""
+        connection = self._connection()
+        # IMMEDIATE takes the write lock up front so two workers never pop the same patient
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            entry = self.peek(facility)
+            if entry is not None:
+                now = time.time()
+                connection.execute(
+                    "UPDATE waiting_queue SET status = 'seen', updated_at = ? WHERE queue_id = ?",
+                    (now, entry['queue_id']),
+                )
+                entry['status'], entry['updated_at'] = 'seen', now
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return entry
+
+    def retriage(self, queue_id, ctas_level, reassessment_interval):
+        """Update a waiting patient's level and restart their reassessment clock.
+
+        The arrival time is kept, so a re-triaged patient keeps their place
+        among patients of the same level.
+        """
+        now = time.time()
+        connection = self._connection()
+        cursor = connection.execute(
+            "UPDATE waiting_queue SET ctas_level = ?, reassessment_interval = ?, "
+            "reassess_due_at = ?, updated_at = ?, flagged_at = NULL "
+            "WHERE queue_id = ? AND status = 'waiting'",
+            (ctas_level, reassessment_interval, now + reassessment_interval * 60, now, queue_id),
+        )
+        if cursor.rowcount == 0:
+            return None
+        return self.get(queue_id)
+
+    def remove(self, queue_id, status='left'):
+        """Take a patient out of the waiting room (e.g. left without being seen)."""
+        cursor = self._connection().execute(
+            "UPDATE waiting_queue SET status = ?, updated_at = ? WHERE queue_id = ? AND status = 'waiting'",
+            (status, time.time(), queue_id),
+        )
+        return cursor.rowcount > 0
+
+    def get(self, queue_id):
+        return self._row(self._connection().execute(
+            f"SELECT {SELECT_COLUMNS} FROM waiting_queue WHERE queue_id = ?", (queue_id,)
+        ).fetchone())
+
+    def overdue(self, facility='', now=None):
+        """Waiting patients whose reassessment deadline has passed, most overdue first."""
+        now = time.time() if now is None else now
+        rows = self._connection().execute(
+            f"SELECT {SELECT_COLUMNS} FROM waiting_queue "
+            "WHERE facility = ? AND status = 'waiting' AND reassess_due_at <= ? "
+            "ORDER BY reassess_due_at",
+            (facility or '', now),
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def waiting(self, facility=''):
+        """All waiting patients in priority order."""
+        rows = self._connection().execute(
+            f"SELECT {SELECT_COLUMNS} FROM waiting_queue "
+            "WHERE facility = ? AND status = 'waiting' "
+            "ORDER BY ctas_level, arrived_at, reassess_due_at",
+            (facility or '',),
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def depth(self, now=None):
+        """(facility, ctas_level, waiting, overdue) for every facility and level with waiting patients."""
+        now = time.time() if now is None else now
+        return self._connection().execute(
+            "SELECT facility, ctas_level, COUNT(*), SUM(reassess_due_at <= ?) FROM waiting_queue "
+            "WHERE status = 'waiting' GROUP BY facility, ctas_level",
+            (now,),
+        ).fetchall()
+
+    def all_waiting(self):
+        """Waiting patients across all facilities."""
+        rows = self._connection().execute(
+            f"SELECT {SELECT_COLUMNS} FROM waiting_queue WHERE status = 'waiting'"
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def changed_since(self, since):
+        """Entries of any status updated at or after `since` (epoch seconds)."""
+        rows = self._connection().execute(
+            f"SELECT {SELECT_COLUMNS} FROM waiting_queue WHERE updated_at >= ?", (since,)
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def flag_reassessment_due(self, queue_id, now=None):
+        """Flag a waiting patient whose reassessment is due; returns the entry if newly flagged."""
+        now = time.time() if now is None else now
+        cursor = self._connection().execute(
+            "UPDATE waiting_queue SET flagged_at = ?, updated_at = ? "
+            "WHERE queue_id = ? AND status = 'waiting' AND flagged_at IS NULL AND reassess_due_at <= ?",
+            (now, now, queue_id, now),
+        )
+        return self.get(queue_id) if cursor.rowcount else None
+
+    def upgrade_long_wait(self, queue_id, ctas_level, reassessment_interval, waited_since, now=None):
+        """Raise a patient who arrived before `waited_since` to `ctas_level`.
+
+        Returns the updated entry, or None if the patient is no longer
+        waiting, is already at that level or more urgent, or arrived later.
+        """
+        now = time.time() if now is None else now
+        cursor = self._connection().execute(
+            "UPDATE waiting_queue SET ctas_level = ?, reassessment_interval = ?, "
+            "reassess_due_at = ?, updated_at = ?, flagged_at = NULL "
+            "WHERE queue_id = ? AND status = 'waiting' AND ctas_level > ? AND arrived_at <= ?",
+            (ctas_level, reassessment_interval, now + reassessment_interval * 60, now,
+             queue_id, ctas_level, waited_since),
+        )
+        return self.get(queue_id) if cursor.rowcount else None
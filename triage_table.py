@@ -0,0 +1,206 @@
+# Quantized CTAS outcome table for the Saudi Arabian CTAS Triage System
+#
+# Every CTAS rule compares a number with a fixed threshold or looks a value up
+# in a fixed set, so each input field collapses into a few bins. A number
+# falls in one of the intervals between the thresholds, on a threshold, or is
+# missing or NaN. A category is one of the listed values or "anything else".
+# The rules also split into factors, groups of fields such that every rule
+# reads the fields of one factor only (a field such as the age may belong to
+# several factors). The level is then the override, if a factor has one, or
+# else the most urgent of the factors' levels.
+#
+# build() runs the reference evaluator once for every bin combination of
+# every factor and packs each outcome into a uint32. The table is written to
+# a file that every worker memory-maps read-only, so they all share one copy
+# in the page cache. A triage then costs one bin lookup per field and one
+# indexed read per factor, and a batch becomes a handful of NumPy gathers.
+
+import hashlib
+import itertools
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+from bisect import bisect_left
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CTASQT01'
+# magic, fingerprint of the rule tables, number of entries
+HEADER = struct.Struct('<8s32sQ')
+# Entry layout: CTAS level in the low 3 bits, override flag, reason bits from bit 8
+LEVEL_MASK = 0x7
+OVERRIDE = 0x8
+REASON_SHIFT = 8
+
+def fingerprint(*tables):
+    """Stable digest of the rule tables a table was built from (sets are sorted)."""
+    encoded = json.dumps(tables, sort_keys=True, default=lambda value: sorted(value, key=repr))
+    return hashlib.sha256(encoded.encode('utf-8')).digest()
+
+class NumericBins:
+    """Bins for a number compared against `thresholds`.
+
+    0 is missing, 1 is NaN, then the interval below the first threshold, the
+    threshold itself, the next interval, and so on up to the interval above
+    the last threshold. Every <, <=, >= or > against a threshold gives the
+    same answer for all values in a bin. Infinite thresholds (open band
+    ends) split nothing and are dropped.
+    """
+
+    def __init__(self, thresholds):
+        self.thresholds = tuple(sorted({threshold for threshold in thresholds if math.isfinite(threshold)}))
+        self.size = 3 + 2 * len(self.thresholds)
+
+    def representatives(self):
+        """One value per bin, in bin order."""
+        values = [None, float('nan'), self.thresholds[0] - 1]
+        for low, high in zip(self.thresholds, self.thresholds[1:]):
+            values += [low, (low + high) / 2]
+        values += [self.thresholds[-1], self.thresholds[-1] + 1]
+        return values
+
+    def index(self, value):
+        if value is None:
+            return 0
+        if value != value:
+            return 1
+        thresholds = self.thresholds
+        i = bisect_left(thresholds, value)
+        return 3 + 2 * i if i < len(thresholds) and thresholds[i] == value else 2 + 2 * i
+
+class CategoryBins:
+    """Bins for a value looked up in `values`: 0 is anything else, then each value."""
+
+    def __init__(self, values, other=None):
+        self.values = tuple(sorted(set(values), key=repr))
+        self.other = other
+        self.codes = {value: i for i, value in enumerate(self.values, 1)}
+        self.size = 1 + len(self.values)
+
+    def representatives(self):
+        return [self.other, *self.values]
+
+    def index(self, value):
+        return self.codes.get(value, 0)
+
+class OutcomeTable:
+    """Read-only outcome table over `factors` (tuples of field names binned by `fields`)."""
+
+    def __init__(self, fields, factors, entries):
+        self.fields = fields
+        self.factors = factors
+        self.entries = entries  # anything indexable by int: array, memoryview or mmap-backed ndarray
+        self._array = np.asarray(entries, dtype=np.uint32)
+        # Per factor: (offset, ((field, bins, stride), ...)), row-major like itertools.product
+        self._layout = []
+        offset = 0
+        for factor in factors:
+            strides, stride = [], 1
+            for field in reversed(factor):
+                strides.append((field, fields[field], stride))
+                stride *= fields[field].size
+            self._layout.append((offset, tuple(reversed(strides))))
+            offset += stride
+        self.size = offset
+
+    def lookup(self, inputs):
+        """(level, reasons) for an object with one attribute per field."""
+        entries = self.entries
+        level, reasons = 5, 0
+        for offset, parts in self._layout:
+            index = offset
+            for field, bins, stride in parts:
+                index += bins.index(getattr(inputs, field)) * stride
+            entry = entries[index]
+            if entry & OVERRIDE:
+                return entry & LEVEL_MASK, entry >> REASON_SHIFT
+            factor_level = entry & LEVEL_MASK
+            if factor_level < level:
+                level, reasons = factor_level, entry >> REASON_SHIFT
+            elif factor_level == level:
+                reasons |= entry >> REASON_SHIFT
+        return level, reasons
+
+    def lookup_bins(self, bins, count):
+        """(levels, reasons) arrays for `count` records, given each field's bins as an int array."""
+        entries = np.empty((len(self._layout), count), dtype=np.int64)
+        for row, (offset, parts) in zip(entries, self._layout):
+            index = np.full(count, offset, dtype=np.intp)
+            for field, _, stride in parts:
+                index += bins[field] * stride
+            row[:] = self._array[index]
+        factor_levels = entries & LEVEL_MASK
+        levels = factor_levels.min(axis=0)
+        reasons = np.bitwise_or.reduce(np.where(factor_levels == levels, entries >> REASON_SHIFT, 0), axis=0)
+        # An override decides the level, whatever the other factors say
+        overridden = (entries & OVERRIDE) != 0
+        override = overridden.any(axis=0)
+        if override.any():
+            override_entries = entries[overridden.argmax(axis=0)[override], np.flatnonzero(override)]
+            levels[override] = override_entries & LEVEL_MASK
+            reasons[override] = override_entries >> REASON_SHIFT
+        return levels, reasons
+
+def build(fields, factors, evaluate, neutral, override_bits):
+    """Enumerate every bin combination of every factor through `evaluate`.
+
+    `neutral()` returns inputs where no rule fires; each combination sets its
+    factor's fields on a fresh one. `evaluate(inputs)` returns (level,
+    reasons). Returns the entries as an array of uint32.
+    """
+    if {field for factor in factors for field in factor} != set(fields):
+        raise ValueError('Every binned field must be in a factor, and every factor field binned')
+    entries = []
+    for factor in factors:
+        for combination in itertools.product(*(fields[field].representatives() for field in factor)):
+            inputs = neutral()
+            for field, value in zip(factor, combination):
+                setattr(inputs, field, value)
+            level, reasons = evaluate(inputs)
+            entries.append(level | (OVERRIDE if reasons & override_bits else 0) | reasons << REASON_SHIFT)
+    return np.array(entries, dtype=np.uint32)
+
+def write(path, digest, entries):
+    """Write a table file atomically, so workers never map a half-written file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, digest, len(entries)))
+        f.write(np.asarray(entries, dtype='<u4').tobytes())
+    os.replace(temporary, path)
+
+def load(path, digest, size):
+    """Memory-map a table file; None if it is missing, stale or the wrong size."""
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):  # ValueError: empty file
+        return None
+    if len(mapped) < HEADER.size:
+        return None
+    magic, file_digest, entries = HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or file_digest != digest or entries != size or len(mapped) != HEADER.size + 4 * size:
+        return None
+    return memoryview(mapped)[HEADER.size:].cast('I')
+
+def open_table(path, fields, factors, digest, evaluate, neutral, override_bits):
+    """Map the table at `path`, building and writing it first if it is missing or stale."""
+    layout = OutcomeTable(fields, factors, ())
+    entries = load(path, digest, layout.size)
+    if entries is None:
+        built = build(fields, factors, evaluate, neutral, override_bits)
+        try:
+            write(path, digest, built)
+        except OSError as e:
+            # Still correct, but every worker then holds its own copy
+            logger.warning('Could not write the CTAS outcome table to %s: %s', path, e)
+            return OutcomeTable(fields, factors, built)
+        entries = load(path, digest, layout.size)
+    return OutcomeTable(fields, factors, entries)
@@ -0,0 +1,101 @@
+# Synthetic triage forms for benchmark.py, loadtest.py and the check_* scripts
+# Values are the ones the professional and self-assessment forms offer, so
+# generated traffic exercises the same paths as real nurses and kiosks.
+# Kept free of app imports so the load generator can run without loading
+# the application.
+
+CHIEF_COMPLAINTS = [
+    'cardiac_arrest', 'resp_arrest', 'major_trauma', 'chest_pain_cardiac', 'resp_distress_severe',
+    'shock', 'loc_decreased', 'seizure_active', 'stroke', 'anaphylaxis', 'overdose', 'sepsis',
+    'severe_pain', 'resp_distress_moderate', 'abdominal_pain_severe', 'head_injury_moderate',
+    'vaginal_bleeding_heavy', 'fever_infant', 'psych_severe', 'minor_trauma', 'mild_pain',
+    'vomiting_diarrhea_mild', 'rash', 'other',
+]
+# Most walk-ins are low acuity
+COMMON_COMPLAINTS = ['minor_trauma', 'mild_pain', 'vomiting_diarrhea_mild', 'rash', 'other', 'severe_pain']
+
+MAIN_SYMPTOMS = [
+    'cannot_breathe', 'severe_chest_pain', 'severe_breathing_difficulty', 'severe_bleeding',
+    'not_responding', 'active_seizure', 'stroke_signs', 'severe_allergic_reaction', 'confusion_severe',
+    'severe_pain_other', 'moderate_breathing_difficulty', 'poison_overdose', 'moderate_bleeding',
+    'fever_very_high', 'severe_headache', 'severe_abdominal_pain', 'moderate_pain',
+    'mild_breathing_difficulty', 'vomiting_diarrhea', 'fever_mild_moderate', 'minor_injury',
+    'mild_pain_symptoms', 'other',
+]
+
+def professional_form(rng):
+    """A plausible professional triage form: mostly normal vitals, mostly common complaints."""
+    age = rng.choice([rng.uniform(0, 1), rng.uniform(1, 17), rng.uniform(18, 90), rng.uniform(18, 90)])
+    complaints = COMMON_COMPLAINTS if rng.random() < 0.7 else CHIEF_COMPLAINTS
+    return {
+        'patient_name': 'Patient',
+        'patient_age': f'{age:.1f}',
+        'patient_gender': rng.choice(['male', 'female']),
+        'chief_complaint': rng.choice(complaints),
+        'heart_rate': str(int(rng.gauss(85, 20))),
+        'resp_rate': str(int(rng.gauss(18, 5))),
+        'spo2': str(min(100, int(rng.gauss(96, 3)))),
+        'bp_systolic': str(int(rng.gauss(125, 20))),
+        'bp_diastolic': str(int(rng.gauss(80, 10))),
+        'temperature': f'{rng.gauss(37.2, 0.8):.1f}',
+        'gcs_score': rng.choice(['15', '15', '15', '14', '12', '8', '']),
+        'avpu': rng.choice(['A', 'A', 'A', 'V', 'P', 'U', '']),
+        'pain_score': str(rng.randint(0, 10)),
+        'respiratory_distress': rng.choice(['none', 'none', 'mild', 'moderate', 'severe']),
+        'bleeding': rng.choice(['none', 'none', 'minor', 'moderate', 'severe']),
+        'mechanism_injury': rng.choice(['none', 'none', 'minor', 'significant']),
+        'glucose': rng.choice(['', '', f'{rng.uniform(2, 30):.1f}']),
+        'dehydration': rng.choice(['none', 'none', 'mild', 'moderate', 'severe']),
+        'is_frail': rng.choice(['false', 'false', 'true']),
+        'heat_exposure': rng.choice(['no', 'no', 'no', 'yes']),
+        'has_diabetes': rng.choice(['no', 'no', 'yes']),
+        'time_waiting': str(rng.choice([0, 0, 30, 90, 150])),
+    }
+
+def malformed_form(rng):
+    """A professional form with malformed, missing and extreme values."""
+    junk = ['', ' ', 'abc', 'nan', 'inf', '-inf', '1e309', '-1', '0x1F', '٣٥', '12,5', 'x' * 200, None]
+    data = professional_form(rng)
+    for field in list(data):
+        roll = rng.random()
+        if roll < 0.3:
+            data[field] = rng.choice(junk)
+        elif roll < 0.45:
+            del data[field]
+    return data
+
+# Values a JSON body can carry that a browser form cannot, plus numbers right
+# at the CTAS thresholds and option values placed in the wrong field
+JSON_JUNK = [
+    None, True, False, 0, 1, -1, 72, 72.5, 1e309, -1e309, float('nan'), 10 ** 30, [], [1], {}, {'a': 1},
+    '8', '9', '13', '14', '15', '90', '92', '38.5', '40', ' 72 ', '7e1', '1_000', '٧٢', '1e999',
+    'true', 'false', 'yes', 'no', 'U', 'P', 'V', 'A', 'severe', 'moderate', 'mild', 'minor', 'significant',
+    'stroke', 'cardiac_arrest',
+]
+
+def adversarial_form(rng):
+    """A professional form with JSON-typed, threshold and misplaced values, as an API client might send."""
+    data = malformed_form(rng)
+    for field in list(data):
+        roll = rng.random()
+        if roll < 0.3:
+            data[field] = rng.choice(JSON_JUNK)
+        elif roll < 0.35:
+            del data[field]
+    return data
+
+def self_assessment_form(rng):
+    """A kiosk self-assessment form."""
+    return {
+        'patient_age': str(rng.randint(1, 90)),
+        'patient_gender': rng.choice(['male', 'female']),
+        'main_symptom': rng.choice(MAIN_SYMPTOMS),
+        'alertness': rng.choice(['A', 'A', 'A', 'V', 'P', 'U']),
+        'breathing_difficulty': rng.choice(['none', 'none', 'mild', 'moderate', 'severe']),
+        'pain_score': str(rng.randint(0, 10)),
+        'bleeding': rng.choice(['none', 'none', 'minor', 'moderate', 'severe']),
+        'dehydration': rng.choice(['none', 'none', 'mild', 'moderate', 'severe']),
+        'feverish': rng.choice(['no', 'no', 'yes_mild_mod', 'yes_high', 'unsure']),
+        'trauma_occurred': rng.choice(['no', 'no', 'yes_minor', 'yes_significant']),
+        'has_diabetes': rng.choice(['no', 'no', 'yes', 'unsure']),
+    }